@@ -717,9 +717,13 @@ SALT_FILES: Tuple[Union[Path, targets.AtomicTarget], ...] = (
     Path("salt/_states/metalk8s_package_manager.py"),
     Path("salt/_states/metalk8s_sysctl.py"),
     Path("salt/_states/metalk8s_volumes.py"),
+    Path("salt/_utils/cri_utils.py"),
+    Path("salt/_utils/iso_utils.py"),
     Path("salt/_utils/metalk8s_utils.py"),
+    Path("salt/_utils/netlink_utils.py"),
     Path("salt/_utils/pillar_utils.py"),
     Path("salt/_utils/volume_utils.py"),
+    Path("salt/_utils/wait_utils.py"),
     CommonStaticContainerRegistry(
         destination=Path(
             constants.ISO_ROOT,
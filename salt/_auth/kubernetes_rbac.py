@@ -1,7 +1,14 @@
+import collections
+import copy
 from functools import wraps
+import hashlib
 import logging
+import os.path
+import threading
+import time
 
-from salt.exceptions import CommandExecutionError
+import salt.cache
+from salt.exceptions import CommandExecutionError, SaltCacheError
 
 MISSING_DEPS = []
 
@@ -31,6 +38,33 @@ def __virtual__():
 
 AUTH_HANDLERS = {}
 
+# Default maximum age (in seconds) and number of cached TokenReview and
+# access review decisions, can be overridden using the `^cache_ttl` and
+# `^cache_size` options of this `external_auth` configuration
+CACHE_TTL = 10
+CACHE_SIZE = 1024
+
+# LRU cache of review decisions, keyed by (review kind, digest of the
+# username and token), storing (expiry timestamp, decision)
+_CACHE = collections.OrderedDict()
+_CACHE_LOCK = threading.Lock()
+_CACHE_STATS = {"hits": 0, "misses": 0}
+
+# Each process publishes its cache statistics in the master cache, in this
+# bank, at most every `STATS_STORE_INTERVAL` seconds, so that they can be
+# retrieved with the `metalk8s_saltutil.auth_cache_stats` runner
+STATS_CACHE_BANK = "kubernetes_rbac"
+STATS_STORE_INTERVAL = 30
+_STATS_STORED = {"time": 0}
+
+# Parsed kubeconfig and `ApiClient` objects shared between requests, rebuilt
+# if the kubeconfig file or the `external_auth` options change:
+# - `client` authenticates as configured in the kubeconfig (for TokenReviews)
+# - `user_client` holds no credentials, the user token is given per request
+#   (for access reviews)
+_CLIENT = {"key": None, "client": None, "user_client": None}
+_CLIENT_LOCK = threading.Lock()
+
 
 def _log_exceptions(f):
     def wrapped(*args, **kwargs):
@@ -64,28 +98,32 @@ def _check_auth_args(f):
     return wrapped
 
 
-def _patch_kubeconfig(kubeconfig, username, token):
-    kubeconfig.api_key = {
-        "authorization": token,
-    }
-    kubeconfig.api_key_prefix = {
-        "authorization": "Bearer",
-    }
-    kubeconfig.username = username
+def _strip_credentials(kubeconfig):
+    kubeconfig.api_key = {}
+    kubeconfig.api_key_prefix = {}
+    kubeconfig.username = None
+    kubeconfig.password = None
     kubeconfig.cert_file = None
     kubeconfig.key_file = None
+    kubeconfig.refresh_api_key_hook = None
 
 
-def _review_access(kubeconfig, resource, verb):
-    client = kubernetes.client.ApiClient(configuration=kubeconfig)
-    authz_api = kubernetes.client.AuthorizationV1Api(api_client=client)
-
+def _review_access(client, token, resource, verb):
     # NOTE: any authenticated user can use this API.
     # This comes from the fact that an authenticated user will always belong to
     # the `system:authenticated` group, and this group is bound to the
     # `system:basic-user` ClusterRole, which enables creating
     # SelfSubjectAccessReviews and SelfSubjectRulesReviews.
-    return authz_api.create_self_subject_access_review(
+    # The `client` is shared between users, so the user token is only given
+    # in the headers of this request (generated API methods do not allow it).
+    return client.call_api(
+        "/apis/authorization.k8s.io/v1/selfsubjectaccessreviews",
+        "POST",
+        header_params={
+            "Accept": "application/json",
+            "Authorization": "Bearer {}".format(token),
+            "Content-Type": "application/json",
+        },
         body=kubernetes.client.V1SelfSubjectAccessReview(
             spec=kubernetes.client.V1SelfSubjectAccessReviewSpec(
                 resource_attributes=kubernetes.client.V1ResourceAttributes(
@@ -94,12 +132,14 @@ def _review_access(kubeconfig, resource, verb):
                 ),
             ),
         ),
+        response_type="V1SelfSubjectAccessReview",
+        auth_settings=[],
+        _return_http_data_only=True,
     )
 
 
-def _review_token(kubeconfig, username, token):
+def _review_token(client, username, token):
     """Check the provided bearer token using the TokenReview API."""
-    client = kubernetes.client.ApiClient(configuration=kubeconfig)
     authn_api = kubernetes.client.AuthenticationV1Api(api_client=client)
 
     token_review = authn_api.create_token_review(
@@ -131,27 +171,99 @@ def _review_token(kubeconfig, username, token):
         return False
 
 
-def _check_node_admin(kubeconfig):
-    return _review_access(kubeconfig, "nodes", "*").status.allowed
+def _check_node_admin(client, token):
+    return _review_access(client, token, "nodes", "*").status.allowed
 
 
 AVAILABLES_GROUPS = {"node-admins": _check_node_admin}
 
 
-def _get_groups(kubeconfig, username, token):
-    _patch_kubeconfig(kubeconfig, username, token)
-
+def _get_groups(client, token):
     groups = set()
 
     for group, func in AVAILABLES_GROUPS.items():
-        if func(kubeconfig):
+        if func(client, token):
             groups.add(group)
 
     return list(groups)
 
 
+def _cache_options(opts):
+    options = opts["external_auth"][__virtualname__]
+    return (
+        options.get("^cache_ttl", CACHE_TTL),
+        options.get("^cache_size", CACHE_SIZE),
+    )
+
+
+def _cached_review(opts, kind, username, token, review):
+    """Return the cached decision of a review, or compute and cache it.
+
+    Decisions are keyed by a digest of the username and token, so that no
+    token is kept in memory.
+    """
+    ttl, size = _cache_options(opts)
+    key = (
+        kind,
+        hashlib.sha256("{}:{}".format(username, token).encode("utf-8")).hexdigest(),
+    )
+    now = time.time()
+
+    with _CACHE_LOCK:
+        entry = _CACHE.get(key)
+        if entry is not None and entry[0] > now:
+            _CACHE.move_to_end(key)
+            _CACHE_STATS["hits"] += 1
+            return entry[1]
+        _CACHE_STATS["misses"] += 1
+
+    result = review()
+
+    with _CACHE_LOCK:
+        _CACHE[key] = (now + ttl, result)
+        _CACHE.move_to_end(key)
+        while len(_CACHE) > size:
+            _CACHE.popitem(last=False)
+
+    return result
+
+
+def cache_stats():
+    """Return hits, misses and size of the review decisions cache."""
+    with _CACHE_LOCK:
+        return dict(_CACHE_STATS, size=len(_CACHE))
+
+
+def _store_cache_stats(opts):
+    """Publish the cache statistics of this process in the master cache."""
+    now = time.time()
+    with _CACHE_LOCK:
+        if now - _STATS_STORED["time"] < STATS_STORE_INTERVAL:
+            return
+        _STATS_STORED["time"] = now
+
+    stats = cache_stats()
+    log.debug("Review cache statistics: %s", stats)
+    try:
+        salt.cache.Cache(opts).store(
+            STATS_CACHE_BANK, "stats-{}".format(os.getpid()), dict(stats, time=now)
+        )
+    except SaltCacheError as exc:
+        log.warning("Unable to store review cache statistics: %s", exc)
+
+
+def clear_cache():
+    """Drop all cached review decisions and reset the cache statistics."""
+    with _CACHE_LOCK:
+        _CACHE.clear()
+        _CACHE_STATS.update(hits=0, misses=0)
+        _STATS_STORED["time"] = 0
+
+
 @_log_exceptions
 def _load_kubeconfig(opts):
+    """Return the shared `client` and `user_client`, or `None` if the
+    configuration is invalid."""
     config = {
         "kubeconfig": None,
         "context": None,
@@ -165,27 +277,52 @@ def _load_kubeconfig(opts):
         log.error("Missing configuration: kubeconfig")
         return None
 
-    kubeconfig = kubernetes.client.Configuration()
-    kubernetes.config.load_kube_config(
-        config_file=config["kubeconfig"],
-        context=config["context"],
-        client_configuration=kubeconfig,
-        persist_config=False,
-    )
+    try:
+        mtime = os.path.getmtime(config["kubeconfig"])
+    except OSError:
+        mtime = None
+    key = (config["kubeconfig"], config["context"], mtime)
+
+    with _CLIENT_LOCK:
+        if _CLIENT["key"] != key:
+            kubeconfig = kubernetes.client.Configuration()
+            kubernetes.config.load_kube_config(
+                config_file=config["kubeconfig"],
+                context=config["context"],
+                client_configuration=kubeconfig,
+                persist_config=False,
+            )
+            user_kubeconfig = copy.copy(kubeconfig)
+            _strip_credentials(user_kubeconfig)
+            # NOTE: Outdated clients are not closed, as they may still be in
+            # use by concurrent requests, they are released once unused
+            _CLIENT.update(
+                key=key,
+                client=kubernetes.client.ApiClient(configuration=kubeconfig),
+                user_client=kubernetes.client.ApiClient(configuration=user_kubeconfig),
+            )
 
-    return kubeconfig
+        return _CLIENT["client"], _CLIENT["user_client"]
 
 
 @_check_auth_args
 def auth(username, token=None, **_kwargs):
     log.info('Authentication request for "%s"', username)
 
-    kubeconfig = _load_kubeconfig(__opts__)
-    if kubeconfig is None:
+    clients = _load_kubeconfig(__opts__)
+    if clients is None:
         log.info("Failed to load Kubernetes API client configuration")
         return False
 
-    result = _review_token(kubeconfig, username, token)
+    client, _ = clients
+    result = _cached_review(
+        __opts__,
+        "token",
+        username,
+        token,
+        lambda: _review_token(client, username, token),
+    )
+    _store_cache_stats(__opts__)
     if result:
         log.info('Authentication request for "%s" succeeded', username)
     else:
@@ -200,11 +337,21 @@ def groups(
 ):  # pylint: disable=unused-argument
     log.info('Groups request for "%s"', username)
 
-    kubeconfig = _load_kubeconfig(__opts__)
-    if kubeconfig is None:
+    clients = _load_kubeconfig(__opts__)
+    if clients is None:
         log.info("Failed to load Kubernetes API client configuration")
         return []
 
-    result = _get_groups(kubeconfig, username, token)
+    _, user_client = clients
+    result = _cached_review(
+        __opts__,
+        "groups",
+        username,
+        token,
+        lambda: _get_groups(user_client, token),
+    )
+    # Do not expose the cached list
+    result = list(result)
+    _store_cache_stats(__opts__)
     log.debug('Groups for "%s": %s', username, ", ".join(result))
     return result
@@ -1,5 +1,9 @@
 """
 Various functions to interact with a CRI daemon (through :program:`crictl`).
+
+Setting `cri.backend: grpc` in the minion configuration makes the listing,
+pull and stop functions talk directly to the CRI runtime (at
+`cri.runtime_endpoint`) over gRPC, using :program:`crictl` as a fallback.
 """
 
 import logging
@@ -15,11 +19,51 @@ log = logging.getLogger(__name__)
 
 __virtualname__ = "cri"
 
+DEFAULT_RUNTIME_ENDPOINT = "unix:///run/containerd/containerd.sock"
+
+# Maximum age (in seconds) of a cached CRI snapshot section
+SNAPSHOT_TTL = 5
+
+# gRPC backend function and command used to build the "pods" and "containers"
+# snapshot sections, along with the key holding the list in the command JSON
+# output
+_SNAPSHOT_COMMANDS = {
+    "pods": ("list_pods", "crictl pods -o json", "items"),
+    "containers": ("list_containers", "crictl ps -a -o json", "containers"),
+}
+
+# Snapshot of the CRI state (images indexed by tag and digest, pods and
+# containers), each section being built with a single `crictl` call and
+# reused by all the functions of this module until it expires or is
+# invalidated
+_SNAPSHOT = {}
+
 
 def __virtual__():
     return __virtualname__
 
 
+def _grpc_call(func, *args):
+    """Call a function of the gRPC backend, if enabled.
+
+    Return `None` if the backend is disabled, unavailable or if the call
+    failed, so that the caller falls back to :command:`crictl`.
+    """
+    if __opts__.get("cri.backend", "crictl") != "grpc":
+        return None
+
+    if "cri_utils.{}".format(func) not in __utils__:
+        log.warning("CRI gRPC backend is not available, using crictl")
+        return None
+
+    endpoint = __opts__.get("cri.runtime_endpoint", DEFAULT_RUNTIME_ENDPOINT)
+    try:
+        return __utils__["cri_utils.{}".format(func)](endpoint, *args)
+    except CommandExecutionError as exc:
+        log.warning("%s, falling back to crictl", exc)
+        return None
+
+
 def list_images():
     """
     List the images stored in the CRI image cache.
@@ -30,6 +74,10 @@ def list_images():
        correctly on the system, e.g. in :file:`/etc/crictl.yaml`.
     """
     log.info("Listing CRI images")
+    images = _grpc_call("list_images")
+    if images is not None:
+        return images
+
     out = __salt__["cmd.run_all"]("crictl images -o json")
     if out["retcode"] != 0:
         log.error("Failed to list images")
@@ -38,26 +86,70 @@ def list_images():
     return salt.utils.json.loads(out["stdout"])["images"]
 
 
-def available(name):
+def _index_images(images):
+    index = {"tags": set(), "digests": set()}
+    for image in images:
+        index["tags"].update(image.get("repoTags") or [])
+        index["digests"].update(image.get("repoDigests") or [])
+    return index
+
+
+def _get_snapshot(section, refresh=False):
+    """Retrieve a section of the CRI snapshot, building it if needed.
+
+    section
+        One of "images", "pods" or "containers"
+    refresh
+        Whether to rebuild the section even if the cached one is still valid
+    """
+    entry = _SNAPSHOT.get(section)
+    if (
+        not refresh
+        and entry is not None
+        and time.time() - entry["created"] < SNAPSHOT_TTL
+    ):
+        return entry["data"]
+
+    if section == "images":
+        images = list_images()
+        if images is None:
+            raise CommandExecutionError("Failed to list images")
+        data = _index_images(images)
+    else:
+        func, cmd, key = _SNAPSHOT_COMMANDS[section]
+        data = _grpc_call(func)
+        if data is None:
+            out = __salt__["cmd.run_all"](cmd)
+            if out["retcode"] != 0:
+                raise CommandExecutionError(
+                    f"STDERR: {out['stderr']}\nSTDOUT: {out['stdout']}"
+                )
+            data = salt.utils.json.loads(out["stdout"])[key]
+
+    _SNAPSHOT[section] = {"created": time.time(), "data": data}
+    return data
+
+
+def _invalidate_snapshot(*sections):
+    for section in sections:
+        _SNAPSHOT.pop(section, None)
+
+
+def available(name, refresh=False):
     """
     Check if given image exists in the containerd namespace image list
 
     name
         Name of the container image
+    refresh
+        Whether to list images again instead of using the cached snapshot
     """
-    images = list_images()
-    available = False
-    if not images:
+    try:
+        images = _get_snapshot("images", refresh=refresh)
+    except CommandExecutionError:
         return False
 
-    for image in images:
-        if name in image.get("repoTags", []):
-            available = True
-            break
-        if name in image.get("repoDigests", []):
-            available = True
-            break
-    return available
+    return name in images["tags"] or name in images["digests"]
 
 
 _PULL_RES = {
@@ -78,6 +170,12 @@ def pull_image(image):
         Tag or digest of the image to pull
     """
     log.info('Pulling CRI image "%s"', image)
+    ret = _grpc_call("pull_image", image)
+    if ret is not None:
+        log.info('CRI image "%s" pulled', image)
+        _invalidate_snapshot("images")
+        return ret
+
     out = __salt__["cmd.run_all"]('crictl pull "{0}"'.format(image))
 
     if out["retcode"] != 0:
@@ -85,6 +183,7 @@ def pull_image(image):
         return None
 
     log.info('CRI image "%s" pulled', image)
+    _invalidate_snapshot("images")
     stdout = out["stdout"]
 
     ret = {
@@ -157,26 +256,37 @@ def wait_container(name, state, timeout=60, delay=5):
     timeout
         Maximum time in sec to wait for container to reach given state
     delay
-        Interval in sec between 2 checks
+        Maximum interval in sec between 2 checks (using an exponential backoff)
     """
     log.info('Waiting for container "%s" to be in state "%s"', name, state)
 
-    opts = '--label io.kubernetes.container.name="{0}"'.format(name)
-    if state is not None:
-        opts += " --state {0}".format(state)
+    # Without state, `crictl ps` only lists running containers
+    wanted_state = "CONTAINER_{}".format((state or "running").upper())
 
     last_error = None
-    for _ in range(0, timeout, delay):
-        out = __salt__["cmd.run_all"]("crictl ps -q {0}".format(opts))
 
-        if out["retcode"] == 0:
-            if out["stdout"]:
-                return True
-            last_error = "No container found"
-        else:
-            last_error = out["stderr"] or out["stdout"]
+    def container_found():
+        nonlocal last_error
+        try:
+            containers = _get_snapshot("containers", refresh=True)
+        except CommandExecutionError as exc:
+            last_error = str(exc)
+            return False
+
+        if any(
+            container["labels"].get("io.kubernetes.container.name") == name
+            and container["state"] == wanted_state
+            for container in containers
+        ):
+            return True
+        last_error = "No container found"
+        return False
 
-        time.sleep(delay)
+    found, _ = __utils__["wait_utils.wait_for"](
+        container_found, timeout=timeout, maximum=delay
+    )
+    if found:
+        return True
 
     error_msg = 'Failed to find container "{}"'.format(name)
     if state is not None:
@@ -195,13 +305,12 @@ def component_is_running(name):
        correctly on the system, e.g. in :file:`/etc/crictl.yaml`.
     """
     log.info("Checking if compopent %s is running", name)
-    out = __salt__["cmd.run_all"](
-        "crictl pods --label component={} --state=ready -o json".format(name)
-    )
-    if out["retcode"] != 0:
+    try:
+        pods = _get_snapshot("pods")
+    except CommandExecutionError:
         log.error("Failed to list pods")
         return False
-    return len(salt.utils.json.loads(out["stdout"])["items"]) != 0
+    return bool(_filter_pods(pods, labels={"component": name}, state="ready"))
 
 
 def ready(timeout=10, retry=5):
@@ -250,7 +359,13 @@ def stop_pod(labels):
     if not pod_ids:
         return "No pods to stop"
 
+    stopped = _grpc_call("stop_pods", pod_ids)
+    if stopped is not None:
+        _invalidate_snapshot("pods", "containers")
+        return stopped
+
     out = __salt__["cmd.run_all"](f"crictl stopp {' '.join(pod_ids)}")
+    _invalidate_snapshot("pods", "containers")
 
     if out["retcode"] != 0:
         selector = ",".join([f"{key}={value}" for key, value in labels.items()])
@@ -262,6 +377,26 @@ def stop_pod(labels):
     return out["stdout"]
 
 
+def _filter_pods(pods, name=None, labels=None, state=None):
+    """Filter pods the same way `crictl pods` does.
+
+    The `name` is a regular expression, `state` one of "ready" or "notready".
+    """
+    if name is not None:
+        name_re = re.compile(name)
+        pods = [pod for pod in pods if name_re.search(pod["metadata"]["name"])]
+    if labels is not None:
+        pods = [
+            pod
+            for pod in pods
+            if all(pod["labels"].get(key) == value for key, value in labels.items())
+        ]
+    if state is not None:
+        wanted_state = "SANDBOX_{}".format(state.upper())
+        pods = [pod for pod in pods if pod["state"] == wanted_state]
+    return pods
+
+
 def get_pod_id(
     name=None, labels=None, state=None, multiple=False, ignore_not_found=False
 ):
@@ -288,28 +423,24 @@ def get_pod_id(
     ignore_not_found (bool)
         Whether to raise if no target pod can be found
     """
-    pod_ids_cmd = "crictl pods --quiet"
     info_parts = []
     if name is not None:
-        pod_ids_cmd += f" --name {name}"
         info_parts.append(f"name '{name}'")
     if labels is not None:
         selector = ",".join([f"{key}={value}" for key, value in labels.items()])
-        pod_ids_cmd += f" --label {selector}"
         info_parts.append(f"labels '{selector}'")
     if state is not None:
-        pod_ids_cmd += f" --state {state}"
         info_parts.append(f"state '{state}'")
     info = f"with {' and '.join(info_parts)}"
 
-    pod_ids_out = __salt__["cmd.run_all"](pod_ids_cmd)
-    if pod_ids_out["retcode"] != 0:
-        raise CommandExecutionError(
-            f"Unable to get pod {info}:\n"
-            f"STDERR: {pod_ids_out['stderr']}\nSTDOUT: {pod_ids_out['stdout']}"
-        )
+    try:
+        pods = _get_snapshot("pods", refresh=True)
+    except CommandExecutionError as exc:
+        raise CommandExecutionError(f"Unable to get pod {info}:\n{exc}") from exc
 
-    pod_ids = pod_ids_out["stdout"].splitlines()
+    pod_ids = [
+        pod["id"] for pod in _filter_pods(pods, name=name, labels=labels, state=state)
+    ]
     if not pod_ids:
         if ignore_not_found:
             return None
@@ -349,26 +480,28 @@ def wait_pod(
         Number of seconds to wait before bailing out
 
     sleep (int)
-        Number of seconds to wait between two checks
+        Maximum number of seconds to wait between two checks (using an
+        exponential backoff)
 
     raise_on_timeout (bool)
         Whether to raise if the timeout period is exceeded (otherwise, return False)
     """
     start_time = time.time()
 
-    while time.time() - start_time < timeout:
+    def pod_changed():
         current_ids = get_pod_id(
             name=name,
             state=state,
             ignore_not_found=True,
             multiple=True,  # We may have two during a replacement
         )
-        if current_ids and last_id not in current_ids:
-            return True
-        remaining = timeout + start_time - time.time()
-        if remaining < sleep:  # Don't sleep if we know it's going to time out
-            break
-        time.sleep(sleep)
+        return bool(current_ids) and last_id not in current_ids
+
+    changed, _ = __utils__["wait_utils.wait_for"](
+        pod_changed, timeout=timeout, maximum=sleep
+    )
+    if changed:
+        return True
 
     if raise_on_timeout:
         verb = "updated" if last_id else "created"
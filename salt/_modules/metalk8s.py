@@ -2,15 +2,19 @@
 """
 Module for handling MetalK8s specific calls.
 """
+from concurrent.futures import ThreadPoolExecutor
+import copy
 import functools
+import hashlib
 import itertools
+import json
 import logging
 import os.path
 import re
 import socket
 import tempfile
 import textwrap
-import time
+import threading
 
 from salt.pillar import get_pillar
 from salt.ext import six
@@ -35,18 +39,18 @@ def __virtual__():
 def wait_apiserver(retry=10, interval=1, **kwargs):
     """Wait for kube-apiserver to respond.
 
-    Simple "retry" wrapper around the kubernetes.ping Salt execution function.
+    Simple "retry" wrapper around the kubernetes.ping Salt execution function,
+    with an exponential backoff between attempts capped to `interval` seconds,
+    for up to `(retry - 1) * interval` seconds.
     """
-    status = __salt__["metalk8s_kubernetes.ping"](**kwargs)
-    attempts = 1
-
-    while not status and attempts < retry:
-        time.sleep(interval)
-        status = __salt__["metalk8s_kubernetes.ping"](**kwargs)
-        attempts += 1
+    status, attempts = __utils__["wait_utils.wait_for"](
+        lambda: __salt__["metalk8s_kubernetes.ping"](**kwargs),
+        timeout=(retry - 1) * interval,
+        maximum=interval,
+    )
 
     if not status:
-        log.error("Kubernetes apiserver failed to respond after %d attempts", retry)
+        log.error("Kubernetes apiserver failed to respond after %d attempts", attempts)
 
     return status
 
@@ -218,24 +222,13 @@ def archive_info_from_iso(path):
     """
     log.debug("Reading archive version from %r", path)
 
-    cmd = " ".join(
-        [
-            "isoinfo",
-            "-x",
-            r"/PRODUCT.TXT\;1",
-            "-i",
-            '"{}"'.format(path),
-        ]
-    )
-    result = __salt__["cmd.run_all"](cmd=cmd)
-    log.debug("Result: %r", result)
-
-    if result["retcode"] != 0:
+    product_txt = __utils__["iso_utils.read_file"](path, "PRODUCT.TXT")
+    if product_txt is None:
         raise CommandExecutionError(
-            "Failed to run isoinfo: {}".format(result.get("stderr", result["stdout"]))
+            "ISO at '{}' must contain a 'PRODUCT.TXT' file".format(path)
         )
 
-    return _get_archive_info(result["stdout"])
+    return _get_archive_info(product_txt.decode("utf-8"))
 
 
 def get_mounted_archives():
@@ -365,49 +358,108 @@ def check_pillar_keys(keys, refresh=True, pillar=None, raise_error=True):
     return True
 
 
+# Maximum number of slots computed concurrently by `format_slots`
+MAX_SLOT_WORKERS = 8
+
+
+def _parse_slot(slot, slots_callers):
+    fmt = slot.split(":", 2)
+    if len(fmt) != 3:
+        log.warning(
+            "Malformed slot %s: expecting "
+            "'__slot__:<caller>:<module>.<function>(...)'",
+            slot,
+        )
+        return None
+    if fmt[1] not in slots_callers:
+        log.warning(
+            "Malformed slot '%s': invalid caller, must use one of '%s'",
+            slot,
+            "', '".join(slots_callers.keys()),
+        )
+        return None
+
+    fun, args, kwargs = salt.utils.args.parse_function(fmt[2])
+    return functools.partial(_call_slot, slots_callers[fmt[1]], fun, args, kwargs)
+
+
+def _call_slot(caller, fun, args, kwargs):
+    return caller[fun](*args, **kwargs)
+
+
+def _collect_slots(data, slots, slots_callers):
+    if isinstance(data, list):
+        for elt in data:
+            _collect_slots(elt, slots, slots_callers)
+    elif isinstance(data, dict):
+        for value in data.values():
+            _collect_slots(value, slots, slots_callers)
+    elif (
+        isinstance(data, six.string_types)
+        and data.startswith("__slot__:")
+        and data not in slots
+    ):
+        slots[data] = _parse_slot(data, slots_callers)
+
+
+def _replace_slots(data, values):
+    """Replace the computed slots in `data`, returning the new data and
+    whether it changed (sub-trees without any slot are returned as is)."""
+    if isinstance(data, list):
+        items = [_replace_slots(elt, values) for elt in data]
+        if any(changed for _, changed in items):
+            return [elt for elt, _ in items], True
+    elif isinstance(data, dict):
+        items = {key: _replace_slots(value, values) for key, value in data.items()}
+        if any(changed for _, changed in items.values()):
+            return {key: value for key, (value, _) in items.items()}, True
+    elif isinstance(data, six.string_types) and data in values:
+        # The same slot may be used several times, do not share its result
+        return copy.deepcopy(values[data]), True
+
+    return data, False
+
+
 def format_slots(data):
     """Helper to replace slots in nested dictionnary
 
     "__slots__:salt:module.function(arg1, arg2, kwarg1=abc, kwargs2=cde)
 
+    Each distinct slot is only computed once, and the slots are computed
+    concurrently. Sub-trees of `data` without any slot are not copied.
+
     Arguments:
         data: Data structure to format
     """
     slots_callers = {"salt": __salt__}
 
-    if isinstance(data, list):
-        return [format_slots(elt) for elt in data]
-
-    if isinstance(data, dict):
-        return {key: format_slots(value) for key, value in data.items()}
-
-    if isinstance(data, six.string_types) and data.startswith("__slot__:"):
-        fmt = data.split(":", 2)
-        if len(fmt) != 3:
-            log.warning(
-                "Malformed slot %s: expecting "
-                "'__slot__:<caller>:<module>.<function>(...)'",
-                data,
-            )
-            return data
-        if fmt[1] not in slots_callers:
-            log.warning(
-                "Malformed slot '%s': invalid caller, must use one of '%s'",
-                data,
-                "', '".join(slots_callers.keys()),
-            )
-            return data
+    slots = {}
+    _collect_slots(data, slots, slots_callers)
+    calls = {slot: call for slot, call in slots.items() if call is not None}
+    if not calls:
+        return data
 
-        fun, args, kwargs = salt.utils.args.parse_function(fmt[2])
+    if len(calls) == 1:
+        # No need for a thread to compute a single slot
+        results = dict(calls)
+    else:
+        with ThreadPoolExecutor(
+            max_workers=min(MAX_SLOT_WORKERS, len(calls))
+        ) as executor:
+            results = {
+                slot: executor.submit(call).result for slot, call in calls.items()
+            }
 
+    values = {}
+    for slot, result in results.items():
         try:
-            return slots_callers[fmt[1]][fun](*args, **kwargs)
+            values[slot] = result()
         except Exception as exc:
             raise CommandExecutionError(
-                "Unable to compute slot '{}'".format(data)
+                "Unable to compute slot '{}'".format(slot)
             ) from exc
 
-    return data
+    return _replace_slots(data, values)[0]
 
 
 def cmp_sorted(*args, **kwargs):
@@ -634,7 +686,81 @@ def manage_static_pod_manifest(
     return ret
 
 
-def get_from_map(value, saltenv=None):
+MAP_PATH = "metalk8s/map.jinja"
+# Files imported by `map.jinja`, any change to those invalidates the cache
+MAP_DEPENDENCIES = ["metalk8s/defaults.yaml", "metalk8s/versions.json"]
+
+# Values exported by `map.jinja` (i.e. its top-level `set` statements)
+_MAP_EXPORT_RE = re.compile(r"^{%-?\s*set\s+(\w+)\s*=", re.MULTILINE)
+
+# Rendered `map.jinja` values, keyed by saltenv
+_MAP_CACHE = {}
+_MAP_CACHE_LOCK = threading.Lock()
+
+
+def _cached_map_file(path, saltenv):
+    try:
+        return __salt__["cp.is_cached"]("salt://{}".format(path), saltenv=saltenv)
+    except Exception as exc:  # pylint: disable=broad-except
+        log.debug("Unable to find %s in the file cache: %s", path, exc)
+        return ""
+
+
+def _map_cache_key(saltenv):
+    stamps = []
+    for path in [MAP_PATH] + MAP_DEPENDENCIES:
+        try:
+            stamps.append(os.stat(_cached_map_file(path, saltenv)).st_mtime_ns)
+        except OSError:
+            stamps.append(None)
+
+    pillar_hash = hashlib.sha256(
+        json.dumps(__pillar__, sort_keys=True, default=repr).encode()
+    ).hexdigest()
+
+    return pillar_hash, tuple(stamps)
+
+
+def _map_exported_names(saltenv):
+    cached = _cached_map_file(MAP_PATH, saltenv)
+    if not cached:
+        return []
+
+    try:
+        with salt.utils.files.fopen(cached, "r") as fd:
+            return sorted(set(_MAP_EXPORT_RE.findall(fd.read())))
+    except IOError:
+        return []
+
+
+def _render_map(names, saltenv):
+    if len(names) == 1:
+        expression = names[0]
+    else:
+        expression = "{{{}}}".format(
+            ", ".join('"{0}": {0}'.format(name) for name in names)
+        )
+
+    tmplstr = textwrap.dedent(
+        """\
+        {{% from "{path}" import {names} with context %}}
+        {{{{ {expression} | tojson }}}}
+        """.format(
+            path=MAP_PATH, names=", ".join(names), expression=expression
+        )
+    )
+    return salt.template.compile_template(
+        ":string:",
+        salt.loader.render(__opts__, __salt__),
+        __opts__["renderer"],
+        __opts__["renderer_blacklist"],
+        __opts__["renderer_whitelist"],
+        input_data=tmplstr,
+        saltenv=saltenv,
+    )
+
+
+def get_from_map(value, saltenv=None, use_cache=True):
     """Get a value from map.jinja so that we have an up to date value
     computed from defaults.yaml and pillar.
 
@@ -643,9 +769,15 @@ def get_from_map(value, saltenv=None):
 
     Also add logic to retrieve the saltenv using version in the pillar.
 
+    All the values exported by map.jinja are rendered at once and kept for
+    the lifetime of the process, until the pillar, map.jinja or one of the
+    files it imports changes.
+
     Arguments:
 
         value (str): Name of the value to retrieve
+        use_cache (bool): Set to False to render map.jinja again, ignoring
+            (and not updating) the cached values
 
     CLI Example:
 
@@ -658,7 +790,6 @@ def get_from_map(value, saltenv=None):
         # Retrieve `metalk8s` from a specific saltenv
         salt '*' metalk8s.get_from_map meltak8s saltenv=my-salt-env
     """
-    path = "metalk8s/map.jinja"
     if not saltenv:
         current_version = (
             __pillar__.get("metalk8s", {})
@@ -674,23 +805,34 @@ def get_from_map(value, saltenv=None):
         else:
             saltenv = "metalk8s-{}".format(current_version)
 
-    tmplstr = textwrap.dedent(
-        """\
-        {{% from "{path}" import {value} with context %}}
-        {{{{ {value} | tojson }}}}
-        """.format(
-            path=path, value=value
-        )
-    )
-    return salt.template.compile_template(
-        ":string:",
-        salt.loader.render(__opts__, __salt__),
-        __opts__["renderer"],
-        __opts__["renderer_blacklist"],
-        __opts__["renderer_whitelist"],
-        input_data=tmplstr,
-        saltenv=saltenv,
-    )
+    if not use_cache:
+        return _render_map([value], saltenv)
+
+    with _MAP_CACHE_LOCK:
+        key = _map_cache_key(saltenv)
+        cached_key, values = _MAP_CACHE.get(saltenv, (None, {}))
+        if cached_key != key:
+            values = {}
+
+        if value not in values:
+            names = _map_exported_names(saltenv)
+            rendered = None
+            if value in names and not values:
+                try:
+                    rendered = _render_map(names, saltenv)
+                except Exception as exc:  # pylint: disable=broad-except
+                    log.debug("Unable to render all values from map: %s", exc)
+
+            if isinstance(rendered, dict):
+                values = rendered
+            else:
+                values = dict(values)
+                values[value] = _render_map([value], saltenv)
+
+            # The first render may have fetched map.jinja and its imports
+            _MAP_CACHE[saltenv] = (_map_cache_key(saltenv), values)
+
+        return copy.deepcopy(values[value])
 
 
 def _read_bootstrap_config():
@@ -3,25 +3,41 @@
 Execution module for handling MetalK8s checks.
 """
 
+from concurrent.futures import ThreadPoolExecutor, wait
+import functools
 import ipaddress
+import logging
 import os
 import re
+import time
 
 from salt.exceptions import CheckError, CommandExecutionError
 
+log = logging.getLogger(__name__)
+
 __virtualname__ = "metalk8s_checks"
 
+# Time (in seconds) given to all the `node` checks to complete
+NODE_CHECKS_TIMEOUT = 120
+
 
 def __virtual__():
     return __virtualname__
 
 
-def node(raises=True, **kwargs):
+def node(raises=True, timeout=NODE_CHECKS_TIMEOUT, timings=False, **kwargs):
     """Check if the current Salt-minion match some requirements so that it can
     be used as a MetalK8s node.
 
+    The independent checks are run concurrently, and must all complete
+    before a shared deadline.
+
     Arguments:
         raises (bool): the method will raise if there is any problem.
+        timeout (int): the time (in seconds) given to all the checks to
+            complete, a check still running at the deadline is an error.
+        timings (bool): return a dict with the `result` of the checks and the
+            `timings` (in seconds) of each check, instead of the result only.
 
     Optional arguments:
         service_cidr (str): the network CIDR for Service Cluster IPs (for
@@ -30,52 +46,47 @@ def node(raises=True, **kwargs):
     """
     errors = []
 
-    # Run `packages` check
-    pkg_ret = __salt__["metalk8s_checks.packages"](raises=False, **kwargs)
-    if pkg_ret is not True:
-        errors.append(pkg_ret)
-
-    # Run `services` check
-    svc_ret = __salt__["metalk8s_checks.services"](raises=False, **kwargs)
-    if svc_ret is not True:
-        errors.append(svc_ret)
-
-    # Run `ports` check
-    ports_ret = __salt__["metalk8s_checks.ports"](raises=False, **kwargs)
-    if ports_ret is not True:
-        errors.append(ports_ret)
-
-    # Run `containerd filesystem` checks
-    fs_checks = __salt__["metalk8s_checks.containerd_filesystem"](
-        raises=False, **kwargs
-    )
-    if fs_checks is not True:
-        errors.append(fs_checks)
-
-    # Run `route_exists` check for the Service Cluster IPs
     service_cidr = kwargs.pop(
         "service_cidr", __pillar__.get("networks", {}).get("service", None)
     )
+
+    checks = {
+        name: functools.partial(
+            __salt__["metalk8s_checks.{}".format(name)], raises=False, **kwargs
+        )
+        for name in ["packages", "services", "ports", "containerd_filesystem"]
+    }
+    # Run `route_exists` check for the Service Cluster IPs
     if service_cidr is not None:
-        service_route_ret = route_exists(destination=service_cidr, raises=False)
-        if service_route_ret is not True:
-            errors.append(
-                (
-                    "Invalid networks:service CIDR - {}. Please make sure to "
-                    "have either a default route or a dummy interface and route "
-                    "for this range (for details, see "
-                    "https://github.com/kubernetes/kubernetes/issues/57534#issuecomment-527653412)."
-                ).format(service_route_ret)
+        checks["service_route"] = functools.partial(_check_service_route, service_cidr)
+
+    check_results, check_timings = _run_concurrently(checks, timeout)
+
+    for ret in check_results.values():
+        if ret is not True:
+            errors.append(ret)
+
+    log.debug(
+        "Node checks timings: %s",
+        ", ".join(
+            "{}={}".format(
+                name, "timeout" if duration is None else "{:.3f}s".format(duration)
             )
+            for name, duration in check_timings.items()
+        ),
+    )
 
     # Compute return of the function
+    result = True
     if errors:
-        error_msg = "Node {}: {}".format(__grains__["id"], "\n".join(errors))
+        result = "Node {}: {}".format(__grains__["id"], "\n".join(errors))
         if raises:
-            raise CheckError(error_msg)
-        return error_msg
+            raise CheckError(result)
 
-    return True
+    if timings:
+        return {"result": result, "timings": check_timings}
+
+    return result
 
 
 def packages(conflicting_packages=None, raises=True, **kwargs):
@@ -161,16 +172,22 @@ def services(conflicting_services=None, raises=True, **kwargs):
         conflicting_services = [conflicting_services]
     errors = []
 
+    services_state = _get_services_state(conflicting_services)
+
     for service_name in conflicting_services:
-        # `service.status`:
-        #   True = service started
-        #   False = service not available or stopped
-        # `service.disabled`:
-        #   True = service disabled or not available
-        #   False = service not disabled
-        if __salt__["service.status"](service_name) or not __salt__["service.disabled"](
-            service_name
-        ):
+        if services_state is not None:
+            running, enabled = services_state[service_name]
+        else:
+            # `service.status`:
+            #   True = service started
+            #   False = service not available or stopped
+            # `service.disabled`:
+            #   True = service disabled or not available
+            #   False = service not disabled
+            running = __salt__["service.status"](service_name)
+            enabled = not __salt__["service.disabled"](service_name)
+
+        if running or enabled:
             errors.append(
                 "Service {} conflicts with MetalK8s installation, "
                 "please stop and disable it.".format(service_name)
@@ -472,6 +489,106 @@ def containerd_filesystem(raises=True, **_kwargs):
 
 
 # Helpers {{{
+def _check_service_route(service_cidr):
+    service_route_ret = route_exists(destination=service_cidr, raises=False)
+    if service_route_ret is not True:
+        return (
+            "Invalid networks:service CIDR - {}. Please make sure to "
+            "have either a default route or a dummy interface and route "
+            "for this range (for details, see "
+            "https://github.com/kubernetes/kubernetes/issues/57534#issuecomment-527653412)."
+        ).format(service_route_ret)
+    return True
+
+
+def _run_concurrently(checks, timeout):
+    """Run all the `checks` in parallel, until the `timeout` deadline.
+
+    Returns the result and duration (in seconds) of each check, in the order
+    of `checks`. A check which did not complete before the deadline results
+    in an error message.
+    """
+
+    def _timed(check):
+        start = time.monotonic()
+        result = check()
+        return result, time.monotonic() - start
+
+    results = {}
+    timings = {}
+    executor = ThreadPoolExecutor(max_workers=len(checks))
+    try:
+        futures = {
+            name: executor.submit(_timed, check) for name, check in checks.items()
+        }
+        wait(futures.values(), timeout=timeout)
+        for name, future in futures.items():
+            if future.done():
+                results[name], timings[name] = future.result()
+            else:
+                results[name] = "Check {} did not complete within {} seconds.".format(
+                    name, timeout
+                )
+                timings[name] = None
+    finally:
+        # Do not wait for checks still running after the deadline
+        executor.shutdown(wait=False)
+
+    return results, timings
+
+
+# Same as the states for which `systemctl is-active` and `systemctl is-enabled`
+# succeed
+_ACTIVE_STATES = {"active", "reloading"}
+_ENABLED_STATES = {
+    "enabled",
+    "enabled-runtime",
+    "alias",
+    "static",
+    "indirect",
+    "generated",
+    "transient",
+}
+
+
+def _get_services_state(names):
+    """Retrieve whether each service is running and enabled, using a single
+    `systemctl show` call.
+
+    Returns `None` if systemd cannot be queried, so that the caller can fall
+    back to the `service` execution module.
+    """
+    if not names:
+        return {}
+
+    res = __salt__["cmd.run_all"](
+        ["systemctl", "show", "--property=ActiveState,UnitFileState", "--"]
+        + list(names),
+        python_shell=False,
+    )
+    if res["retcode"] != 0:
+        log.debug("Unable to query services state: %s", res["stderr"])
+        return None
+
+    # One block of properties per unit, in the order of the command line
+    blocks = res["stdout"].strip().split("\n\n")
+    if len(blocks) != len(names):
+        log.debug("Unexpected output from systemctl show: %s", res["stdout"])
+        return None
+
+    states = {}
+    for name, block in zip(names, blocks):
+        properties = dict(
+            line.partition("=")[::2] for line in block.splitlines() if "=" in line
+        )
+        states[name] = (
+            properties.get("ActiveState") in _ACTIVE_STATES,
+            properties.get("UnitFileState") in _ENABLED_STATES,
+        )
+
+    return states
+
+
 def _is_subnet_of(left, right):
     """Implementation of `subnet_of` method in Python 3.7+ for networks.
 
@@ -8,6 +8,7 @@ This module's functions are merged into the `metalk8s_kubernetes`
 module when called by salt by virtue of its `__virtualname__` attribute.
 """
 
+from concurrent.futures import ThreadPoolExecutor
 import json
 import logging
 import operator
@@ -134,6 +135,12 @@ class Drain(object):
 
     # According to `kubectl` code, this value should be 1 second by default
     KUBECTL_INTERVAL = 1
+    # Maximum duration of a single watch when waiting for pods deletion
+    WATCH_TIMEOUT = 10
+    # Delay before retrying a refused eviction (kubectl waits 5 seconds),
+    # doubled on each new refusal for the same pod, up to the maximum
+    EVICTION_BACKOFF_INITIAL = 5
+    EVICTION_BACKOFF_MAX = 60
     WARNING_MSG = {
         "daemonset": "Ignoring DaemonSet-managed pods",
         "localStorage": "Deleting pods with local storage",
@@ -163,6 +170,7 @@ class Drain(object):
         timeout=0,
         delete_local_data=False,
         best_effort=False,
+        max_concurrency=10,
         **kwargs
     ):
         self._node_name = node_name
@@ -174,7 +182,15 @@ class Drain(object):
         self._timeout = timeout or 3600
         self._delete_local_data = delete_local_data
         self._best_effort = best_effort
+        self._max_concurrency = max(1, int(max_concurrency))
         self._kwargs = kwargs
+        # Eviction outcome per pod ("<namespace>/<name>")
+        self._evictions = {}
+        # Controllers retrieved during this drain, indexed by
+        # (apiVersion, kind, namespace, name), and the
+        # (apiVersion, kind, namespace) groups fully listed
+        self._controllers = {}
+        self._listed_controllers = set()
 
     node_name = property(operator.attrgetter("_node_name"))
     force = property(operator.attrgetter("_force"))
@@ -183,6 +199,8 @@ class Drain(object):
     ignore_pending = property(operator.attrgetter("_ignore_pending"))
     timeout = property(operator.attrgetter("_timeout"))
     delete_local_data = property(operator.attrgetter("_delete_local_data"))
+    max_concurrency = property(operator.attrgetter("_max_concurrency"))
+    evictions = property(operator.attrgetter("_evictions"))
 
     def localstorage_filter(self, pod):
         """Compute eviction status for the pod according to local storage.
@@ -224,9 +242,61 @@ class Drain(object):
             return True, ""
         return True, self.WARNING_MSG["unmanaged"]
 
+    def prefetch_controllers(self, pods):
+        """Retrieve the controllers of all pods passed.
+
+        Controllers are listed once per (apiVersion, kind, namespace), so
+        that filters do not need to query the API for each pod. If a kind
+        cannot be listed, its controllers will be retrieved one by one by
+        `get_controller`.
+
+        Args:
+          - pods: the pods for which we want the controllers
+        Returns: None
+        """
+        groups = set()
+        for pod in pods:
+            controller_ref = _get_controller_of(pod)
+            if controller_ref is not None:
+                groups.add(
+                    (
+                        controller_ref["apiVersion"],
+                        controller_ref["kind"],
+                        pod["metadata"]["namespace"],
+                    )
+                )
+
+        for group in sorted(groups - self._listed_controllers):
+            api_version, kind, namespace = group
+            try:
+                controllers = __salt__["metalk8s_kubernetes.list_objects"](
+                    kind=kind,
+                    apiVersion=api_version,
+                    namespace=namespace,
+                    **self._kwargs
+                )
+            except CommandExecutionError as exc:
+                log.debug(
+                    "Unable to list %s/%s in namespace %s: %s",
+                    api_version,
+                    kind,
+                    namespace,
+                    exc,
+                )
+                continue
+
+            for controller in controllers:
+                self._controllers[
+                    group + (controller["metadata"]["name"],)
+                ] = controller
+            self._listed_controllers.add(group)
+
     def get_controller(self, namespace, controller_ref):
         """Get the controller object from a reference to it
 
+        Controllers already retrieved during this drain (see
+        `prefetch_controllers`) are not queried again.
+
         Args:
           - namespace: the queried controller's namespace
           - controller_ref: the queried controller's reference
@@ -235,6 +305,17 @@ class Drain(object):
           - None if not found
         Raises: CommandExecutionError if API fails
         """
+        group = (controller_ref["apiVersion"], controller_ref["kind"], namespace)
+        key = group + (controller_ref["name"],)
+        if key in self._controllers:
+            return self._controllers[key]
+        if group in self._listed_controllers:
+            return None
+
+        self._controllers[key] = self._get_controller(namespace, controller_ref)
+        return self._controllers[key]
+
+    def _get_controller(self, namespace, controller_ref):
         try:
             return __salt__["metalk8s_kubernetes.get_object"](
                 name=controller_ref["name"],
@@ -336,6 +417,7 @@ class Drain(object):
             field_selector="spec.nodeName={0}".format(self.node_name),
             **self._kwargs
         )
+        self.prefetch_controllers(all_pods)
 
         for pod in all_pods:
             is_deletable = True
@@ -415,11 +497,27 @@ class Drain(object):
                 "{0} List of remaining pods to follow".format(exc.message),
                 [pod["metadata"]["name"] for pod in remaining_pods],
             )
-        return "Eviction complete."
+        return "\n".join(
+            ["Eviction complete."]
+            + [
+                "- {}: {} ({} attempt{})".format(
+                    pod,
+                    "evicted" if outcome["evicted"] else "not evicted",
+                    outcome["attempts"],
+                    "s" if outcome["attempts"] > 1 else "",
+                )
+                for pod, outcome in sorted(self.evictions.items())
+            ]
+        )
 
     def evict_pods(self, pods):
         """Trigger the eviction process for all pods passed.
 
+        Evictions are created concurrently (at most `max_concurrency` at a
+        time). A refused eviction (e.g. because of a PodDisruptionBudget) is
+        retried with an exponential backoff, without delaying the eviction
+        of other pods. The outcome for each pod is stored in `evictions`.
+
         Args:
           - pods: list of Kubernetes API pods to evict
         Returns: None
@@ -428,27 +526,70 @@ class Drain(object):
         """
         self.start_timer()
         evicted_pods = []
-        for pod in pods:
-            while self.check_timer():
-                evicted = evict_pod(
-                    name=pod["metadata"]["name"],
-                    namespace=pod["metadata"]["namespace"],
-                    grace_period=self.grace_period,
-                    **self._kwargs
+        queue = [{"pod": pod, "attempts": 0, "next_attempt": 0} for pod in pods]
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            while queue:
+                self.check_timer()
+                now = time.time()
+                ready = [entry for entry in queue if entry["next_attempt"] <= now]
+                results = executor.map(
+                    lambda entry: evict_pod(
+                        name=entry["pod"]["metadata"]["name"],
+                        namespace=entry["pod"]["metadata"]["namespace"],
+                        grace_period=self.grace_period,
+                        **self._kwargs
+                    ),
+                    ready,
                 )
-                if evicted:
-                    evicted_pods.append(pod)
-                    break
 
-                if self._best_effort:
-                    break
-                time.sleep(5)  # kubectl waits 5 seconds
+                for entry, evicted in zip(ready, results):
+                    entry["attempts"] += 1
+                    key = "{}/{}".format(
+                        entry["pod"]["metadata"]["namespace"],
+                        entry["pod"]["metadata"]["name"],
+                    )
+                    if evicted or self._best_effort:
+                        self._evictions[key] = {
+                            "evicted": bool(evicted),
+                            "attempts": entry["attempts"],
+                        }
+                        queue.remove(entry)
+                        if evicted:
+                            evicted_pods.append(entry["pod"])
+                    else:
+                        entry["next_attempt"] = now + min(
+                            self.EVICTION_BACKOFF_MAX,
+                            self.EVICTION_BACKOFF_INITIAL
+                            * 2 ** (entry["attempts"] - 1),
+                        )
+
+                if queue:
+                    next_attempt = min(entry["next_attempt"] for entry in queue)
+                    deadline = self._start + self.timeout
+                    if next_attempt > deadline:
+                        # No retry can happen before the drain deadline, do
+                        # not wait (nor leave the executor) beyond it
+                        time.sleep(max(0, deadline - time.time()))
+                        raise DrainTimeoutException(
+                            "Drain did not complete within {0} seconds".format(
+                                self.timeout
+                            )
+                        )
+                    time.sleep(max(0, next_attempt - time.time()))
+                    self.check_timer()
 
         self.wait_for_eviction(evicted_pods)
 
     def wait_for_eviction(self, pods):
         """Wait for pods deletion.
 
+        Deletions are tracked using a single watch on the Pods of the node,
+        matching DELETED events on the Pod UID. The pending pods are checked
+        with a single list call before each watch, which then starts from the
+        `resourceVersion` of this list. If the watch fails, we fall back to
+        one list call per tick.
+
         Args:
           - pods: the list of pods on which eviction was triggered, for which
                   we wait until they are no longer present in API queries.
@@ -456,34 +597,105 @@ class Drain(object):
         Raises: DrainTimeoutException if the eviction process is not complete
                 after the specified timeout value
         """
+        pending = {pod["metadata"]["uid"]: pod for pod in pods}
+        use_watch = True
+
         while self.check_timer():
-            self.tick(self.KUBECTL_INTERVAL)
-            pending = []
-            for pod in pods:
-                response = __salt__["metalk8s_kubernetes.get_object"](
-                    kind="Pod",
-                    apiVersion="v1",
-                    name=pod["metadata"]["name"],
-                    namespace=pod["metadata"]["namespace"],
-                    **self._kwargs
+            resource_version = self.check_evicted_pods(pending)
+            if not pending:
+                break
+
+            if use_watch:
+                try:
+                    self.watch_evicted_pods(pending, resource_version)
+                except CommandExecutionError as exc:
+                    log.warning(
+                        "Unable to watch Pods of Node %s, falling back to "
+                        "polling: %s",
+                        self.node_name,
+                        exc,
+                    )
+                    use_watch = False
+            else:
+                self.tick(self.KUBECTL_INTERVAL)
+
+    def check_evicted_pods(self, pending):
+        """Remove pods no longer present on the node from `pending`.
+
+        Args:
+          - pending: dict of pods waiting for deletion, indexed by UID
+        Returns: the `resourceVersion` of the Pods list
+        """
+        pods, resource_version = __salt__["metalk8s_kubernetes.list_objects"](
+            kind="Pod",
+            apiVersion="v1",
+            all_namespaces=True,
+            field_selector="spec.nodeName={0}".format(self.node_name),
+            with_resource_version=True,
+            **self._kwargs
+        )
+        current_uids = set(pod["metadata"]["uid"] for pod in pods)
+
+        for uid, pod in list(pending.items()):
+            if uid in current_uids:
+                log.debug(
+                    "Waiting for eviction of Pod %s (current status: %s)",
+                    pod["metadata"]["name"],
+                    pod.get("status", {}).get("phase"),
                 )
-                if (
-                    not response
-                    or response["metadata"]["uid"] != pod["metadata"]["uid"]
-                ):
+            else:
+                log.info("%s evicted", pod["metadata"]["name"])
+                del pending[uid]
+
+        return resource_version
+
+    def watch_evicted_pods(self, pending, resource_version):
+        """Consume DELETED events on the Pods of the node.
+
+        The watch starts from the `resource_version` of the last Pods list, so
+        no deletion happening in between is missed. It stops once all pods
+        from `pending` are deleted, after `WATCH_TIMEOUT` seconds, or if this
+        `resource_version` is too old (the Pods will be listed again).
+
+        Args:
+          - pending: dict of pods waiting for deletion, indexed by UID
+          - resource_version: the `resourceVersion` to start the watch from
+        Returns: None
+        Raises: CommandExecutionError if the watch fails
+                DrainTimeoutException if the eviction process is not complete
+                after the specified timeout value
+        """
+        remaining = self.timeout - (time.time() - self._start)
+        events = __salt__["metalk8s_kubernetes.watch_objects"](
+            kind="Pod",
+            apiVersion="v1",
+            all_namespaces=True,
+            field_selector="spec.nodeName={0}".format(self.node_name),
+            resource_version=resource_version,
+            timeout=max(1, int(min(self.WATCH_TIMEOUT, remaining))),
+            **self._kwargs
+        )
+
+        for event in events:
+            if event["type"] == "ERROR" and event["object"].get("code") == 410:
+                # 410 Gone: the resource version was compacted
+                log.debug("Pods watch expired, listing them again")
+                return
+
+            if event["type"] == "ERROR":
+                raise CommandExecutionError(
+                    "Error event received: {}".format(event["object"])
+                )
+
+            if event["type"] == "DELETED":
+                pod = pending.pop(event["object"]["metadata"]["uid"], None)
+                if pod is not None:
                     log.info("%s evicted", pod["metadata"]["name"])
-                else:
-                    log.debug(
-                        "Waiting for eviction of Pod %s (current status: %s)",
-                        pod["metadata"]["name"],
-                        pod.get("status", {}).get("phase"),
-                    )
-                    pending.append(pod)
 
             if not pending:
                 break
 
-            pods = pending
+            self.check_timer()
 
     def start_timer(self):
         self._start = time.time()
@@ -520,29 +732,21 @@ def evict_pod(name, namespace="default", grace_period=1, **kwargs):
 
     object_meta = V1ObjectMeta(name=name, namespace=namespace)
 
-    kubeconfig, context = __salt__["metalk8s_kubernetes.get_kubeconfig"](**kwargs)
-
-    client = kubernetes.dynamic.DynamicClient(
-        kubernetes.config.new_client_from_config(kubeconfig, context)
-    )
-
-    # DynamicClient does not handle Pod eviction, so compute the path manually
-    path = (
-        client.resources.get(api_version="v1", kind="Pod").path(
-            name=name, namespace=namespace
-        )
-        + "/eviction"
-    )
-
     try:
-        client.request(
-            "post",
-            path,
+        # Use the cached client, not to run API discovery for each eviction
+        __salt__["metalk8s_kubernetes.create_subresource"](
+            kind="Pod",
+            apiVersion="v1",
+            name=name,
+            namespace=namespace,
+            subresource="eviction",
             body=V1beta1Eviction(delete_options=delete_options, metadata=object_meta),
+            **kwargs
         )
-    except (ApiException, HTTPError) as exc:
-        if isinstance(exc, ApiException):
-            if exc.status == 404:
+    except CommandExecutionError as exc:
+        api_exc = exc.__cause__
+        if isinstance(api_exc, ApiException):
+            if api_exc.status == 404:
                 # Seems to be ignored in kubectl, let's do the same
                 log.debug(
                     "Received '404 Not Found' when creating Eviction for %s, "
@@ -550,10 +754,10 @@ def evict_pod(name, namespace="default", grace_period=1, **kwargs):
                     name,
                 )
                 return True
-            if exc.status == 429:
+            if api_exc.status == 429:
                 # Too Many Requests: the eviction is rejected, but indicates
                 # we should retry later (probably due to a disruption budget)
-                status = json.loads(exc.body, encoding="utf-8")
+                status = json.loads(api_exc.body, encoding="utf-8")
                 log.info(
                     "Cannot evict %s at the moment: %s",
                     name,
@@ -579,6 +783,7 @@ def node_drain(
     delete_local_data=False,
     best_effort=False,
     dry_run=False,
+    max_concurrency=10,
     **kwargs
 ):
     """Trigger the drain process for a node.
@@ -593,10 +798,11 @@ def node_drain(
       - best_effort       : try to drain the node as much as possible but do not
                             retry/fail if unable to evict some pods
       - dry_run           : only run pod selection process, not eviction
+      - max_concurrency   : maximum number of evictions created concurrently
 
     Keyword args: connection parameters, passed through to connection utility
                   module.
-    Returns: None
+    Returns: string message, with the eviction outcome for each pod
     Raises: CommandExecutionError if the drain process was unsuccessful/
     """
 
@@ -609,6 +815,7 @@ def node_drain(
         timeout=timeout,
         delete_local_data=delete_local_data,
         best_effort=best_effort,
+        max_concurrency=max_concurrency,
         **kwargs
     )
     __salt__["metalk8s_kubernetes.cordon_node"](node_name, **kwargs)
@@ -2,7 +2,9 @@
 """
 Module for handling etcd client specific calls.
 """
+from concurrent.futures import ThreadPoolExecutor, wait
 import logging
+import time
 
 from salt.ext.six.moves.urllib.parse import urlparse
 from salt.exceptions import CommandExecutionError
@@ -18,6 +20,9 @@ except ImportError:
 # Timeout when connection to etcd server
 TIMEOUT = 30
 
+# Maximum number of etcd members probed concurrently
+MAX_PROBES = 10
+
 
 log = logging.getLogger(__name__)
 
@@ -119,6 +124,45 @@ def urls_exist_in_cluster(
     return set(peer_urls).issubset(all_urls)
 
 
+def _probe_member(member, ca_cert, cert_key, cert_cert):
+    """Retrieve the status of a single etcd member."""
+    etcd_url = urlparse(member.client_urls[0])
+    result = {
+        "id": member.id,
+        "endpoint": member.client_urls[0],
+        "healthy": False,
+    }
+
+    start = time.time()
+    try:
+        with etcd3.client(
+            host=etcd_url.hostname,
+            port=etcd_url.port,
+            ca_cert=ca_cert,
+            cert_key=cert_key,
+            cert_cert=cert_cert,
+            timeout=TIMEOUT,
+        ) as etcd:
+            status = etcd.status()
+    except Exception as exc:  # pylint: disable=broad-except
+        log.debug("failed to check the health of member %s: %s", member.name, exc)
+        result["error"] = str(exc)
+    else:
+        result.update(
+            {
+                "healthy": True,
+                "leader": status.leader is not None and status.leader.id == member.id,
+                "raft_index": status.raft_index,
+                "raft_term": status.raft_term,
+                "db_size": status.db_size,
+                "version": status.version,
+            }
+        )
+    result["latency"] = round(time.time() - start, 3)
+
+    return result
+
+
 def check_etcd_health(
     minion_id=None,
     ca_cert="/etc/kubernetes/pki/etcd/ca.crt",
@@ -127,10 +171,18 @@ def check_etcd_health(
 ):
     """Check cluster-health of the `etcd` cluster.
 
+    All members are probed concurrently, within a single `TIMEOUT` window.
+
     This module is only runnable from the salt-master on the bootstrap node.
 
     Arguments:
         minion_id (str): minion id of an etcd node
+
+    Returns:
+        dict: the cluster `status` and, for each member name, its `id`,
+              `endpoint`, `healthy` flag and probe `latency` (in seconds),
+              along with its `leader` flag, `raft_index`, `raft_term`,
+              `db_size` and `version` if healthy or the `error` otherwise
     """
     # Get host ip from the minion id
     if minion_id:
@@ -151,30 +203,46 @@ def check_etcd_health(
     ) as etcd:
         etcd_members = list(etcd.members)
 
-    unhealthy_member = 0
-    for member in etcd_members:
-        etcd_url = urlparse(member.client_urls[0])
-        try:
-            with etcd3.client(
-                host=etcd_url.hostname,
-                port=etcd_url.port,
-                ca_cert=ca_cert,
-                cert_key=cert_key,
-                cert_cert=cert_cert,
-                timeout=TIMEOUT,
-            ) as etcd:
-                etcd.status()
-        except Exception:  # pylint: disable=broad-except
-            log.debug("failed to check the health of member %s", member.name)
-            unhealthy_member += 1
+    members = {}
+    if etcd_members:
+        executor = ThreadPoolExecutor(max_workers=min(MAX_PROBES, len(etcd_members)))
+        futures = {
+            executor.submit(_probe_member, member, ca_cert, cert_key, cert_cert): member
+            for member in etcd_members
+        }
+        # Do not wait for probes stuck after the deadline
+        wait(futures, timeout=TIMEOUT)
+        executor.shutdown(wait=False)
+
+        for future, member in futures.items():
+            # Members not started yet do not have a name
+            name = member.name or str(member.id)
+            if future.done():
+                members[name] = future.result()
+            else:
+                members[name] = {
+                    "id": member.id,
+                    "endpoint": member.client_urls[0],
+                    "healthy": False,
+                    "error": "timed out after {} seconds".format(TIMEOUT),
+                    "latency": TIMEOUT,
+                }
+
+    errors = [
+        "{}: {}".format(name, member["error"])
+        for name, member in sorted(members.items())
+        if not member["healthy"]
+    ]
+
+    details = " ({})".format(", ".join(errors)) if errors else ""
 
     # Raise on error as this function will be called by module.run in sls file
-    if unhealthy_member == len(etcd_members):
-        raise CommandExecutionError("cluster is unavailable")
-    elif unhealthy_member > 0:
-        raise CommandExecutionError("cluster is degraded")
+    if len(errors) == len(etcd_members):
+        raise CommandExecutionError("cluster is unavailable" + details)
+    elif errors:
+        raise CommandExecutionError("cluster is degraded" + details)
     else:
-        return "cluster is healthy"
+        return {"status": "cluster is healthy", "members": members}
 
 
 def get_etcd_member_list(
@@ -4,17 +4,21 @@ This module relies on the `metalk8s_kubernetes` custom Salt utils module for
 parsing K8s object manifests, and providing direct bindings to the Python
 `kubernetes.client` models and APIs.
 
-Core methods (create_, get_, remove_, and replace_object) are defined in this
-module, while other methods can be found in `metalk8s_kubernetes_utils.py`,
+Core methods (create_, get_, remove_, replace_ and apply_object) are defined
+in this module, while other methods can be found in `metalk8s_kubernetes_utils.py`,
 `metalk8s_drain.py` and `metalk8s_cordon.py`.
 """
 
 from datetime import datetime
 import json
 import logging
+import os
 import re
+import threading
+import time
 
-from salt.exceptions import CommandExecutionError
+import salt.cache
+from salt.exceptions import CommandExecutionError, SaltCacheError
 from salt.utils import yaml
 import salt.utils.data
 
@@ -37,6 +41,26 @@ log = logging.getLogger(__name__)
 
 __virtualname__ = "metalk8s_kubernetes"
 
+# Annotation storing the digest of the manifest last applied by Salt
+LAST_APPLIED_DIGEST_ANNOTATION = "metalk8s.scality.com/last-applied-digest"
+
+# Maximum age (in seconds) of a cached `DynamicClient` before API discovery
+# is run again
+CLIENT_CACHE_TTL = 300
+
+# Process-wide cache of `DynamicClient` objects, keyed by
+# (kubeconfig path, context, kubeconfig mtime), so that API discovery and the
+# underlying connection pool are shared between calls
+_CLIENT_CACHE = {}
+_CLIENT_CACHE_LOCK = threading.Lock()
+_CLIENT_CACHE_STATS = {"hits": 0, "misses": 0}
+
+# Master cache bank and key of the `metalk8s_nodes` ext_pillar snapshot
+# invalidation marker, the snapshots built before the last Node write are
+# not used anymore (see `salt/_pillar/metalk8s_nodes.py`)
+NODES_SNAPSHOT_CACHE_BANK = "metalk8s_nodes"
+NODES_CHANGED_CACHE_KEY = "nodes-changed"
+
 
 def __virtual__():
     if MISSING_DEPS:
@@ -64,6 +88,138 @@ def _handle_error(exception, action):
         raise CommandExecutionError(base_msg) from exception
 
 
+def _get_digest(obj, checksum="sha256"):
+    if isinstance(obj, dict):
+        obj = json.dumps(obj, sort_keys=True)
+
+    return __salt__.hashutil.digest(str(obj), checksum=checksum)
+
+
+def _client_cache_key(kubeconfig, context):
+    try:
+        mtime = os.path.getmtime(kubeconfig)
+    except (OSError, TypeError):
+        mtime = None
+
+    return (kubeconfig, context, mtime)
+
+
+def _get_client(kubeconfig, context):
+    """Retrieve a cached `DynamicClient` entry, or build a new one.
+
+    The entry is a dict holding the `client`, its `created` timestamp and
+    the memoized discovery `resources`.
+    A new client is built (thus running API discovery again) if none is
+    cached for this kubeconfig and context, if the kubeconfig file changed
+    or if the cached one is older than `CLIENT_CACHE_TTL`.
+    """
+    key = _client_cache_key(kubeconfig, context)
+    now = time.time()
+
+    with _CLIENT_CACHE_LOCK:
+        entry = _CLIENT_CACHE.get(key)
+        if entry is not None and now - entry["created"] < CLIENT_CACHE_TTL:
+            _CLIENT_CACHE_STATS["hits"] += 1
+            return entry
+
+        _CLIENT_CACHE_STATS["misses"] += 1
+        # Drop any outdated client for this kubeconfig and context
+        for outdated in [k for k in _CLIENT_CACHE if k[:2] == key[:2]]:
+            del _CLIENT_CACHE[outdated]
+
+        entry = {
+            "client": kubernetes.dynamic.DynamicClient(
+                kubernetes.config.new_client_from_config(kubeconfig, context)
+            ),
+            "created": now,
+            "resources": {},
+        }
+        _CLIENT_CACHE[key] = entry
+
+    return entry
+
+
+def _invalidate_client(kubeconfig, context):
+    with _CLIENT_CACHE_LOCK:
+        _CLIENT_CACHE.pop(_client_cache_key(kubeconfig, context), None)
+
+
+def _get_api(kind, apiVersion, **kwargs):
+    """Retrieve the dynamic API resource for a kind and apiVersion.
+
+    Discovery results are memoized along with the cached client. If the
+    resource is unknown, the cached client is invalidated (a CRD may have
+    been added since discovery ran) and discovery is attempted once more.
+    """
+    kubeconfig, context = __salt__["metalk8s_kubernetes.get_kubeconfig"](**kwargs)
+
+    for attempt in range(2):
+        entry = _get_client(kubeconfig, context)
+        api = entry["resources"].get((apiVersion, kind))
+        if api is not None:
+            return api
+
+        try:
+            api = entry["client"].resources.get(api_version=apiVersion, kind=kind)
+        except ResourceNotFoundError as exc:
+            _invalidate_client(kubeconfig, context)
+            if attempt:
+                raise CommandExecutionError(
+                    "Kind '{}' from apiVersion '{}' is unknown".format(kind, apiVersion)
+                ) from exc
+        else:
+            entry["resources"][(apiVersion, kind)] = api
+            return api
+
+
+def client_cache_stats():
+    """Return the hits and misses counters of the Kubernetes client cache.
+
+    CLI Examples:
+
+    .. code-block:: bash
+
+        salt-call metalk8s_kubernetes.client_cache_stats
+    """
+    with _CLIENT_CACHE_LOCK:
+        return dict(_CLIENT_CACHE_STATS, size=len(_CLIENT_CACHE))
+
+
+def clear_client_cache():
+    """Drop all cached Kubernetes clients and reset the cache counters.
+
+    API discovery will run again on the next call.
+
+    CLI Examples:
+
+    .. code-block:: bash
+
+        salt-call metalk8s_kubernetes.clear_client_cache
+    """
+    with _CLIENT_CACHE_LOCK:
+        _CLIENT_CACHE.clear()
+        _CLIENT_CACHE_STATS.update(hits=0, misses=0)
+
+    return True
+
+
+def _mark_nodes_changed():
+    """Record that a Node was written, in the master cache.
+
+    Only done on the master (e.g. from an orchestrate), where the
+    `metalk8s_nodes` ext_pillar keeps its cluster snapshot.
+    """
+    if __opts__.get("__role") != "master":
+        return
+
+    try:
+        salt.cache.Cache(__opts__).store(
+            NODES_SNAPSHOT_CACHE_BANK, NODES_CHANGED_CACHE_KEY, {"time": time.time()}
+        )
+    except SaltCacheError as exc:
+        log.warning("Unable to invalidate the cluster snapshot: %s", exc)
+
+
 def _object_manipulation_function(action):
     """Generate an execution function based on a CRUD method to use."""
     assert action in (
@@ -72,6 +228,7 @@ def _object_manipulation_function(action):
         "replace",
         "delete",
         "patch",
+        "apply",
     ), 'Method "{}" is not supported'.format(action)
 
     def method(
@@ -135,42 +292,54 @@ def _object_manipulation_function(action):
 
         # Format slots on the manifest
         manifest = __salt__.metalk8s.format_slots(manifest)
+        # Sub-trees without slots are not copied by `format_slots`, so copy
+        # the parts modified below, the given manifest must be left untouched
+        manifest = dict(manifest)
+        if "metadata" in manifest:
+            manifest["metadata"] = dict(manifest["metadata"])
 
         # Adding label containing metalk8s version (retrieved from saltenv)
-        if action in ["create", "replace"]:
+        if action in ["create", "replace", "apply"]:
             match = re.search(r"^metalk8s-(?P<version>.+)$", saltenv)
-            manifest.setdefault("metadata", {}).setdefault("labels", {})[
-                "metalk8s.scality.com/version"
-            ] = (match.group("version") if match else "unknown")
-            manifest["metadata"]["labels"]["app.kubernetes.io/managed-by"] = "salt"
-            manifest["metadata"]["labels"]["heritage"] = "salt"
+            metadata = manifest.setdefault("metadata", {})
+            metadata["labels"] = dict(metadata.get("labels") or {})
+            metadata["labels"]["metalk8s.scality.com/version"] = (
+                match.group("version") if match else "unknown"
+            )
+            metadata["labels"]["app.kubernetes.io/managed-by"] = "salt"
+            metadata["labels"]["heritage"] = "salt"
 
-        log.debug("%sing object with manifest: %s", action[:-1].capitalize(), manifest)
+            # Store the digest of the manifest (without this annotation) so
+            # that we can tell whether an existing object needs to be replaced
+            annotations = metadata["annotations"] = dict(
+                metadata.get("annotations") or {}
+            )
+            annotations.pop(LAST_APPLIED_DIGEST_ANNOTATION, None)
+            digest = _get_digest(manifest)
+            annotations[LAST_APPLIED_DIGEST_ANNOTATION] = digest
 
-        kubeconfig, context = __salt__["metalk8s_kubernetes.get_kubeconfig"](**kwargs)
+            if action == "replace" and old_object:
+                old_annotations = old_object["metadata"].get("annotations") or {}
+                if old_annotations.get(LAST_APPLIED_DIGEST_ANNOTATION) == digest:
+                    log.debug("Manifest unchanged since last apply, skipping replace")
+                    return old_object
 
-        client = kubernetes.dynamic.DynamicClient(
-            kubernetes.config.new_client_from_config(kubeconfig, context)
-        )
+        log.debug("%sing object with manifest: %s", action[:-1].capitalize(), manifest)
 
-        try:
-            api = client.resources.get(
-                api_version=manifest["apiVersion"], kind=manifest["kind"]
-            )
-        except ResourceNotFoundError as exc:
-            raise CommandExecutionError(
-                "Kind '{}' from apiVersion '{}' is unknown".format(
-                    manifest["kind"], manifest["apiVersion"]
-                )
-            ) from exc
+        api = _get_api(
+            apiVersion=manifest["apiVersion"], kind=manifest["kind"], **kwargs
+        )
 
-        method_func = getattr(api, action)
+        # Server-side apply is a PATCH with a dedicated content type
+        method_func = getattr(api, "patch" if action == "apply" else action)
 
         call_kwargs = {}
         if action != "create":
             call_kwargs["name"] = manifest["metadata"]["name"]
         if api.namespaced:
             call_kwargs["namespace"] = manifest["metadata"].get("namespace")
+            if action == "apply" and not call_kwargs["namespace"]:
+                call_kwargs["namespace"] = namespace
         if action == "delete":
             call_kwargs["body"] = k8s_client.V1DeleteOptions(
                 propagation_policy="Foreground"
@@ -186,6 +355,15 @@ def _object_manipulation_function(action):
                 call_kwargs["body"]["metadata"].pop("name")
                 # Namespace may be empty so add a default to not failing
                 call_kwargs["body"]["metadata"].pop("namespace", None)
+        elif action == "apply":
+            # The `kubernetes` client only serializes JSON content types,
+            # so send the manifest already serialized (JSON is valid YAML)
+            call_kwargs["body"] = json.dumps(manifest)
+            call_kwargs["content_type"] = "application/apply-patch+yaml"
+            call_kwargs["query_params"] = [
+                ("fieldManager", "salt"),
+                ("force", "true"),
+            ]
         elif action != "get":
             call_kwargs["body"] = manifest
 
@@ -198,6 +376,8 @@ def _object_manipulation_function(action):
                 ]["resourceVersion"]
             # Keep `clusterIP` and `healthCheckNodePort` if not present in the body
             if api.api_version == "v1" and api.kind == "Service":
+                # Copy the spec as it may be shared with the given manifest
+                call_kwargs["body"]["spec"] = dict(call_kwargs["body"]["spec"])
                 if not call_kwargs["body"]["spec"].get("clusterIP"):
                     call_kwargs["body"]["spec"]["clusterIP"] = old_object["spec"].get(
                         "clusterIP"
@@ -218,6 +398,9 @@ def _object_manipulation_function(action):
         except (ApiException, HTTPError) as exc:
             return _handle_error(exc, action)
 
+        if action != "get" and api.kind == "Node":
+            _mark_nodes_changed()
+
         # NOTE: result is always either a standard `kubernetes.client` model,
         return result.to_dict()
 
@@ -229,7 +412,21 @@ def _object_manipulation_function(action):
         verb=action.capitalize()
     )
 
-    if action in ["create", "replace"]:
+    if action == "apply":
+        base_doc += """
+
+    The object is created or updated using server-side apply, with "salt"
+    as field manager (conflicts with other managers are forced)."""
+
+    if action == "replace":
+        base_doc += """
+
+    If the `old_object` already carries the digest of this manifest in its
+    last-applied digest annotation, nothing is sent to the API and
+    `old_object` is returned as is (remove the annotation to force a
+    replace)."""
+
+    if action in ["create", "replace", "apply"]:
         method.__doc__ = """{base_doc}
 
     CLI Examples:
@@ -314,6 +511,7 @@ delete_object = _object_manipulation_function("delete")
 replace_object = _object_manipulation_function("replace")
 get_object = _object_manipulation_function("get")
 update_object = _object_manipulation_function("patch")
+apply_object = _object_manipulation_function("apply")
 
 
 # Check if a specific object exists
@@ -364,11 +562,16 @@ def list_objects(
     all_namespaces=False,
     field_selector=None,
     label_selector=None,
+    with_resource_version=False,
     **kwargs
 ):
     """
     List all objects of a type using some object description.
 
+    If `with_resource_version` is True, return a tuple of the objects and the
+    `resourceVersion` of the list, to start a watch from (see `watch_objects`)
+    without missing nor replaying any event.
+
     CLI Examples:
 
     .. code-block:: bash
@@ -377,18 +580,7 @@ def list_objects(
         salt-call metalk8s_kubernetes.list_objects kind="Pod" apiVersion="v1" namespace="kube-system"
         salt-call metalk8s_kubernetes.list_objects kind="Pod" apiVersion="v1" all_namespaces=True field_selector="spec.nodeName=bootstrap"
     """
-    kubeconfig, context = __salt__["metalk8s_kubernetes.get_kubeconfig"](**kwargs)
-
-    client = kubernetes.dynamic.DynamicClient(
-        kubernetes.config.new_client_from_config(kubeconfig, context)
-    )
-    try:
-        api = client.resources.get(api_version=apiVersion, kind=kind)
-    except ResourceNotFoundError as exc:
-        raise CommandExecutionError(
-            "Kind '{}' from apiVersion '{}' is unknown".format(kind, apiVersion)
-        ) from exc
-    api = client.resources.get(api_version=apiVersion, kind=kind)
+    api = _get_api(kind, apiVersion, **kwargs)
 
     call_kwargs = {}
     if all_namespaces:
@@ -408,7 +600,93 @@ def list_objects(
             base_msg += ' in namespace "{}"'.format(namespace)
         raise CommandExecutionError(base_msg) from exc
 
-    return result.to_dict()["items"]
+    result = result.to_dict()
+    if with_resource_version:
+        return result["items"], result["metadata"]["resourceVersion"]
+    return result["items"]
+
+
+def watch_objects(
+    kind,
+    apiVersion,
+    namespace="default",
+    all_namespaces=False,
+    field_selector=None,
+    label_selector=None,
+    resource_version=None,
+    timeout=None,
+    **kwargs
+):
+    """
+    Watch all objects of a type using some object description.
+
+    This function is a generator, yielding events as dicts with a `type`
+    ("ADDED", "MODIFIED", "DELETED" or "ERROR") and the related `object`,
+    until `timeout` (in seconds) expires.
+
+    CLI Examples:
+
+    .. code-block:: bash
+
+        salt-call metalk8s_kubernetes.watch_objects kind="Pod" apiVersion="v1" all_namespaces=True field_selector="spec.nodeName=bootstrap" timeout=30
+    """
+    api = _get_api(kind, apiVersion, **kwargs)
+
+    call_kwargs = {}
+    if api.namespaced and not all_namespaces:
+        call_kwargs["namespace"] = namespace
+    if field_selector:
+        call_kwargs["field_selector"] = field_selector
+    if label_selector:
+        call_kwargs["label_selector"] = label_selector
+    if resource_version:
+        call_kwargs["resource_version"] = resource_version
+    if timeout:
+        call_kwargs["timeout"] = timeout
+
+    try:
+        for event in api.watch(**call_kwargs):
+            yield {"type": event["type"], "object": event["raw_object"]}
+    except (ApiException, HTTPError) as exc:
+        base_msg = 'Failed to watch resources "{}/{}"'.format(apiVersion, kind)
+        if "namespace" in call_kwargs:
+            base_msg += ' in namespace "{}"'.format(namespace)
+        raise CommandExecutionError(base_msg) from exc
+
+
+def create_subresource(
+    kind, apiVersion, name, subresource, body, namespace="default", **kwargs
+):
+    """
+    Create a subresource of an object (e.g. the `eviction` of a Pod).
+
+    The API error, if any, is kept as the cause of the raised
+    `CommandExecutionError`, so callers can handle specific status codes.
+
+    CLI Examples:
+
+    .. code-block:: bash
+
+        salt-call metalk8s_kubernetes.create_subresource kind="Pod" apiVersion="v1" name="my-pod" namespace="my-namespace" subresource="eviction" body='{"apiVersion": "policy/v1beta1", "kind": "Eviction", "metadata": {"name": "my-pod", "namespace": "my-namespace"}}'
+    """
+    api = _get_api(kind, apiVersion, **kwargs)
+
+    # DynamicClient does not handle all subresources (e.g. Pod eviction),
+    # so compute the path manually
+    path = "{}/{}".format(
+        api.path(name=name, namespace=namespace if api.namespaced else None),
+        subresource,
+    )
+
+    try:
+        result = api.client.request("post", path, body=body)
+    except (ApiException, HTTPError) as exc:
+        base_msg = 'Failed to create "{}" for {} "{}"'.format(subresource, kind, name)
+        if api.namespaced:
+            base_msg += ' in namespace "{}"'.format(namespace)
+        raise CommandExecutionError(base_msg) from exc
+
+    return result.to_dict()
 
 
 def get_object_digest(path=None, checksum="sha256", *args, **kwargs):
@@ -437,7 +715,4 @@ def get_object_digest(path=None, checksum="sha256", *args, **kwargs):
                 'Unable to find key "{}" in the object'.format(path)
             )
 
-    if isinstance(obj, dict):
-        obj = json.dumps(obj, sort_keys=True)
-
-    return __salt__.hashutil.digest(str(obj), checksum=checksum)
+    return _get_digest(obj, checksum=checksum)
@@ -128,6 +128,28 @@ def get_mtu_from_ip(ip):
     return int(__salt__["file.read"]("/sys/class/net/{}/mtu".format(iface)))
 
 
+def _listening_sockets():
+    """Return the address, port and owner PID of all the listening sockets.
+
+    Sockets are listed through netlink, falling back to `psutil` (which
+    parses `/proc/net/*`) if it is not available.
+    """
+    try:
+        sockets = __utils__["netlink_utils.dump_listening_sockets"]()
+        owners = __utils__["netlink_utils.socket_owners"](
+            {sock["inode"] for sock in sockets}
+        )
+    except Exception as exc:  # pylint: disable=broad-except
+        log.debug("Unable to list sockets through netlink, using psutil: %s", exc)
+        return [
+            (sconn.laddr[0], sconn.laddr[1], sconn.pid)
+            for sconn in psutil.net_connections("inet")
+            if sconn.status == psutil.CONN_LISTEN
+        ]
+
+    return [(sock["ip"], sock["port"], owners.get(sock["inode"])) for sock in sockets]
+
+
 def get_listening_processes():
     """
     Get all the listening processes on the local node
@@ -145,11 +167,9 @@ def get_listening_processes():
     ```
     """
     all_listen_connections = {}
-    for sconn in psutil.net_connections("inet"):
-        if sconn.status != psutil.CONN_LISTEN:
-            continue
-
-        ip, port = sconn.laddr
+    # A process often listens on several sockets, only get its name once
+    process_names = {}
+    for ip, port, pid in _listening_sockets():
         # If `<ip>` is `::1` replace with `127.0.0.1` so that we consider only IPv4
         if ip == "::1":
             ip = "127.0.0.1"
@@ -157,11 +177,21 @@ def get_listening_processes():
         elif ip == "::":
             ip = "0.0.0.0"
 
+        if pid is None:
+            # Owner unknown (e.g. not enough permissions)
+            process_names[pid] = None
+        elif pid not in process_names:
+            try:
+                process_names[pid] = psutil.Process(pid).name()
+            except psutil.Error:
+                # The process exited in the meantime
+                process_names[pid] = None
+
         all_listen_connections.setdefault(str(port), {}).update(
             {
                 ip: {
-                    "pid": sconn.pid,
-                    "name": psutil.Process(sconn.pid).name(),
+                    "pid": pid,
+                    "name": process_names[pid],
                 }
             }
         )
@@ -173,12 +203,58 @@ def routes():
     """
     Return currently configured IPv4 routes from routing table
 
+    Routes are read from the kernel through netlink, falling back to parsing
+    the output of `ip route` if it is not available.
+
     CLI Example:
 
     .. code-block:: bash
 
         salt '*' metalk8s_network.routes
     """
+    try:
+        main_routes = __utils__["netlink_utils.dump_routes"]()
+    except Exception as exc:  # pylint: disable=broad-except
+        log.debug("Unable to dump routes through netlink, using `ip`: %s", exc)
+        return _routes_from_ip()
+
+    ret = []
+    for route in main_routes:
+        # Skip "unreachable", "blackhole" and other special routes
+        if route["type"] != "unicast":
+            continue
+
+        if route["prefixlen"] == 0:
+            ret.append(
+                {
+                    "addr_family": "inet",
+                    "destination": "0.0.0.0",
+                    "gateway": route["gateway"] or "0.0.0.0",
+                    "netmask": "0.0.0.0",
+                    "flags": "UG",
+                    "interface": route["interface"],
+                }
+            )
+        else:
+            network = ipaddress.IPv4Network(
+                "{}/{}".format(route["destination"], route["prefixlen"]),
+                strict=False,
+            )
+            ret.append(
+                {
+                    "addr_family": "inet",
+                    "destination": str(network.network_address),
+                    "gateway": "0.0.0.0",
+                    "netmask": str(network.netmask),
+                    "flags": "U",
+                    "interface": route["interface"],
+                }
+            )
+
+    return ret
+
+
+def _routes_from_ip():
     ret = []
     cmd = "ip -4 route show table main"
     out = __salt__["cmd.run"](cmd)
@@ -5,9 +5,11 @@ for the K8s operations in the virtual `metalk8s_solutions` module.
 """
 import collections
 import errno
+import json
 import os
 import logging
 import re
+import tempfile
 import yaml
 
 import salt
@@ -275,24 +277,8 @@ def manifest_from_iso(path):
     """
     log.debug("Reading Solution archive version from %r", path)
 
-    cmd = " ".join(
-        [
-            "isoinfo",
-            "-x",
-            r"/{}\;1".format(SOLUTION_MANIFEST.upper()),
-            "-i",
-            '"{}"'.format(path),
-        ]
-    )
-    result = __salt__["cmd.run_all"](cmd=cmd)
-    log.debug("Result: %r", result)
-
-    if result["retcode"] != 0:
-        raise CommandExecutionError(
-            "Failed to run isoinfo: {}".format(result.get("stderr", result["stdout"]))
-        )
-
-    if not result["stdout"]:
+    manifest = __utils__["iso_utils.read_file"](path, SOLUTION_MANIFEST)
+    if not manifest:
         raise CommandExecutionError(
             "Solution ISO at '{}' must contain a '{}' file".format(
                 path, SOLUTION_MANIFEST
@@ -300,7 +286,7 @@ def manifest_from_iso(path):
         )
 
     try:
-        manifest = yaml.safe_load(result["stdout"])
+        manifest = yaml.safe_load(manifest)
     except yaml.YAMLError as exc:
         raise CommandExecutionError(
             "Failed to load YAML from Solution manifest {}".format(path)
@@ -309,15 +295,74 @@ def manifest_from_iso(path):
     return _archive_info_from_manifest(manifest)
 
 
-def list_available():
+# Index of the Solutions found in the mounted archives, persisted between
+# calls so that unchanged archives are not read again
+SOLUTIONS_INDEX = "metalk8s_solutions_index.json"
+SOLUTIONS_INDEX_VERSION = 1
+
+
+def _index_path():
+    return os.path.join(
+        __opts__.get("cachedir", "/var/cache/salt/minion"), SOLUTIONS_INDEX
+    )
+
+
+def _load_index():
+    try:
+        with salt.utils.files.fopen(_index_path(), "r") as fd:
+            index = json.load(fd)
+    except (IOError, ValueError) as exc:
+        log.debug("Ignoring Solutions index: %s", exc)
+        return {}
+
+    if not isinstance(index, dict) or index.get("version") != SOLUTIONS_INDEX_VERSION:
+        return {}
+
+    return index.get("mounts", {})
+
+
+def _write_index(mounts):
+    path = _index_path()
+    try:
+        data = json.dumps({"version": SOLUTIONS_INDEX_VERSION, "mounts": mounts})
+        # Write atomically, concurrent calls may read the index meanwhile
+        with tempfile.NamedTemporaryFile(
+            "w", dir=os.path.dirname(path), prefix=".solutions-", delete=False
+        ) as fd:
+            fd.write(data)
+        os.replace(fd.name, path)
+    except (OSError, TypeError, ValueError) as exc:
+        log.warning("Failed to write Solutions index to %s: %s", path, exc)
+
+
+def _mount_key(mountpoint, mount_info):
+    """Identify a mounted archive, so that a new or changed archive mounted
+    at the same place is not mistaken for the indexed one."""
+    key = [mount_info.get("device"), mount_info.get("alt_device")]
+    for path in [mountpoint, mount_info.get("alt_device")]:
+        try:
+            stat = os.stat(path)
+        except (OSError, TypeError):
+            key.extend([None, None, None])
+        else:
+            key.extend([stat.st_dev, stat.st_ino, stat.st_mtime_ns])
+    return key
+
+
+def list_available(refresh=False):
     """Get a view of mounted Solution archives.
 
     Result is in the shape of a dict, with Solution names as keys, and lists
     of mounted archives (each being a dict of various info) as values.
+
+    Manifests are only read from archives which were not already indexed by
+    a previous call (or were re-mounted since), unless `refresh` is set.
     """
     result = collections.defaultdict(list)
 
     active_mounts = __salt__["mount.active"]()
+    index = {} if refresh else _load_index()
+    new_index = {}
 
     for mountpoint, mount_info in active_mounts.items():
         # Skip mountpoint not in `/srv/scality`
@@ -332,17 +377,26 @@ def list_available():
         if mount_info["fstype"] != "iso9660":
             continue
 
-        try:
-            manifest, info = read_solution_manifest(mountpoint)
-        except CommandExecutionError as exc:
+        key = _mount_key(mountpoint, mount_info)
+        entry = index.get(mountpoint)
+        if entry is None or entry.get("key") != key:
+            entry = {"key": key}
+            try:
+                entry["manifest"], entry["info"] = read_solution_manifest(mountpoint)
+            except CommandExecutionError as exc:
+                entry["error"] = str(exc)
+        new_index[mountpoint] = entry
+
+        if "error" in entry:
             log.info(
                 "Skipping %s: not a Solution (failed to read/parse %s): %s",
                 mountpoint,
                 SOLUTION_MANIFEST,
-                exc,
+                entry["error"],
             )
             continue
 
+        info = entry["info"]
         result[info["name"]].append(
             {
                 "name": info["display_name"],
@@ -350,10 +404,13 @@ def list_available():
                 "mountpoint": mountpoint,
                 "archive": mount_info["alt_device"],
                 "version": info["version"],
-                "manifest": manifest,
+                "manifest": entry["manifest"],
             }
         )
 
+    if new_index != index:
+        _write_index(new_index)
+
     return dict(result)
 
 
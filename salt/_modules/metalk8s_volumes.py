@@ -2,6 +2,7 @@
 """Metalk8s volumes module."""
 
 import abc
+from concurrent.futures import ThreadPoolExecutor
 import contextlib
 import errno
 import functools
@@ -23,6 +24,9 @@ log = logging.getLogger(__name__)
 
 __virtualname__ = "metalk8s_volumes"
 
+# Maximum number of physical devices handled concurrently by `prepare_volumes`
+MAX_WORKERS = 8
+
 
 def __virtual__():
     return __virtualname__
@@ -91,7 +95,11 @@ def prepare(name):
 
         salt '<NODE_NAME>' metalk8s_volumes.prepare example-volume
     """
-    _get_volume(name).prepare()
+    volume = _get_volume(name)
+    try:
+        volume.prepare()
+    finally:
+        _invalidate_caches(volume)
 
 
 def is_cleaned_up(name):
@@ -124,7 +132,86 @@ def clean_up(name):
 
         salt '<NODE_NAME>' metalk8s_volumes.clean_up example-volume
     """
-    _get_volume(name).clean_up()
+    volume = _get_volume(name)
+    try:
+        volume.clean_up()
+    finally:
+        _invalidate_caches(volume)
+
+
+def prepare_volumes(names=None, max_workers=MAX_WORKERS):
+    """Create and prepare the backing storage of several volumes at once.
+
+    Volumes sharing the same physical device (partitions of a disk, LVM
+    LogicalVolumes of a VolumeGroup) are handled one after the other, while
+    distinct devices are handled concurrently. Udev is settled only once,
+    after all the volumes were handled.
+
+    Args:
+        names       (list): volume names (all the volumes from the pillar if
+                            not specified)
+        max_workers (int):  maximum number of devices handled concurrently
+
+    Returns:
+        dict: for each volume, whether its backing storage was `created`
+              and/or `prepared`, and the `error` which occurred, if any
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt '<NODE_NAME>' metalk8s_volumes.prepare_volumes
+        salt '<NODE_NAME>' metalk8s_volumes.prepare_volumes '["volume-1", "volume-2"]'
+    """
+    if names is None:
+        names = list(__pillar__["metalk8s"]["volumes"])
+
+    results = {}
+    groups = {}
+    for name in names:
+        results[name] = {"created": False, "prepared": False, "error": None}
+        try:
+            volume = _get_volume(name)
+            group = volume.device_group
+        except Exception as exn:  # pylint: disable=broad-except
+            results[name]["error"] = str(exn)
+        else:
+            groups.setdefault(group, []).append((name, volume))
+
+    if groups:
+        with ThreadPoolExecutor(
+            max_workers=min(int(max_workers), len(groups))
+        ) as executor:
+            for group_results in executor.map(_prepare_group, groups.values()):
+                results.update(group_results)
+
+    if any(result["prepared"] for result in results.values()):
+        try:
+            _run_cmd("udevadm settle --timeout=360")
+        except CommandExecutionError as exn:
+            log.warning("Failed to wait for udev events: %s", exn)
+
+    return results
+
+
+def _prepare_group(volumes):
+    """Create and prepare volumes sharing the same device, one after the other."""
+    results = {}
+    for name, volume in volumes:
+        result = results[name] = {"created": False, "prepared": False, "error": None}
+        try:
+            if not volume.exists:
+                volume.create()
+                result["created"] = True
+            if not volume.is_prepared:
+                try:
+                    volume.prepare()
+                finally:
+                    _invalidate_caches(volume)
+                result["prepared"] = True
+        except Exception as exn:  # pylint: disable=broad-except
+            result["error"] = str(exn)
+    return results
 
 
 def device_name(path):
@@ -142,8 +229,11 @@ def device_name(path):
 
         salt '<NODE_NAME>' metalk8s_volumes.device_name /dev/disk/by-uuid/668efc89-be5b-4b13-b3d1-1294e829f33b
     """
-    # Have some retry logic, because some device manipulations may lead to
-    # transient absence.
+    device = __utils__["metalk8s_volumes.lookup_device"](path)
+    if device is not None:
+        return {"success": True, "result": device["name"]}
+    # Not (yet) in the device inventory, have some retry logic, because some
+    # device manipulations may lead to transient absence.
     for _ in range(10):
         # TOCTTOU, but `realpath` doesn't return error on non-existing path…
         if os.path.exists(path):
@@ -213,6 +303,7 @@ class Volume:
 
     def device_info(self):
         """Return size and path of the underlying block device"""
+        refresh = False
         if not os.path.exists(self.persistent_path) and self.is_prepared:
             if __salt__["file.is_blkdev"](self.path):
                 filter = self.path
@@ -228,11 +319,18 @@ class Volume:
             _run_cmd(
                 f"udevadm settle --timeout=360 --exit-if-exists={self.persistent_path}"
             )
+            refresh = True
         if not os.path.exists(self.persistent_path):
             raise CommandExecutionError(
                 f"Error '{self.get('metadata.name')}' volume path '{self.persistent_path}' does not exists"
             )
-        size = __salt__["disk.dump"](self.persistent_path)["getsize64"]
+        device = __utils__["metalk8s_volumes.lookup_device"](
+            self.persistent_path, refresh=refresh
+        )
+        if device is not None and device["size"] is not None:
+            size = device["size"]
+        else:
+            size = __salt__["disk.dump"](self.persistent_path)["getsize64"]
         return {"size": size, "path": self.persistent_path}
 
     @property
@@ -245,6 +343,14 @@ class Volume:
     def uuid(self):
         return self.get("metadata.uid").lower()
 
+    @property
+    def device_group(self):
+        """Identifier of the physical device backing this volume.
+
+        Volumes in the same group cannot be prepared concurrently.
+        """
+        return self.path
+
     @property
     def persistent_path(self):
         """Return a persistent path to the backing device."""
@@ -262,7 +368,7 @@ class Volume:
         """
         # Check that the backing device is not already formatted.
         # Bail out if it is: we don't want data loss because of a typo…
-        device_info = _get_from_blkid(self.path)
+        device_info = _get_from_blkid(self.path, refresh=True)
         if device_info.fstype:
             raise Exception("backing device `{}` already formatted".format(self.path))
         if device_info.has_partition:
@@ -372,6 +478,11 @@ class RawBlockDevice(Volume):
     def path(self):
         return self.get("spec.rawBlockDevice.devicePath")
 
+    @property
+    def device_group(self):
+        # Partitions of a same disk share its partition table.
+        return _get_parent_device(_device_name(self.path))
+
     def prepare(self, force=False):
         # We format an entire device, not just a partition: we need force=True.
         super(RawBlockDevice, self).prepare(force=True)
@@ -407,6 +518,9 @@ class RawBlockDeviceBlock(RawBlockDevice):
     def device_path(self):
         path = self.path
         if self._kind == DeviceType.PARTITION:
+            device = __utils__["metalk8s_volumes.lookup_device"](path)
+            if device is not None and device["parent"]:
+                return "/dev/{}".format(device["parent"])
             path = path.rstrip(self._partition)
         return path
 
@@ -477,6 +591,11 @@ class LVMLogicalVolume(RawBlockDevice):
     def path(self):
         return "/dev/{}/{}".format(self.vg_name, self.lv_name)
 
+    @property
+    def device_group(self):
+        # LogicalVolumes are created in their VolumeGroup.
+        return "lvm:{}".format(self.vg_name)
+
     @property
     def exists(self):
         lv_info = __salt__["lvm.lvdisplay"](lvname=self.path, quiet=True)
@@ -560,6 +679,12 @@ def _get_volume(name):
         raise ValueError("unsupported Volume type for Volume {}".format(name))
 
 
+def _invalidate_caches(volume):
+    """Forget the cached information about the volume backing device."""
+    __utils__["metalk8s_volumes.invalidate_probe_cache"](volume.path)
+    __utils__["metalk8s_volumes.invalidate_device_inventory"]()
+
+
 def _device_name(path):
     """Return the device name from the path, raise on error."""
     res = device_name(path)
@@ -568,6 +693,17 @@ def _device_name(path):
     raise CommandExecutionError(message=res["result"])
 
 
+def _get_parent_device(name):
+    """Return the name of the disk holding the `name` partition.
+
+    If `name` is not a partition, it is returned as is.
+    """
+    sys_path = os.path.realpath(os.path.join("/sys/class/block", name))
+    if os.path.exists(os.path.join(sys_path, "partition")):
+        return os.path.basename(os.path.dirname(sys_path))
+    return name
+
+
 def _run_cmd(cmd):
     """Execute the given `cmd` command and return its result.
 
@@ -630,6 +766,9 @@ def _get_lvm_path(path):
 
     If the backing storage device is not an LVM volume, return None.
     """
+    device = __utils__["metalk8s_volumes.lookup_device"](path)
+    if device is not None:
+        return device["lvm_path"]
     name = _device_name(path)
     for symlink in glob.glob("/dev/disk/by-id/dm-uuid-LVM-*"):
         realpath = os.path.realpath(symlink)
@@ -659,15 +798,18 @@ def _open_fd(*args, **kwargs):
 #     returns "devtmpfs       devtmpfs   1932084     0   1932084   0% /dev"
 #
 # So yeah, let's not rely on this…
-def _get_from_blkid(path):
+#
+# Probe results are cached (see `volume_utils.probe_device`), use `refresh`
+# to get up-to-date information before writing to the device.
+def _get_from_blkid(path, refresh=False):
     flags = __utils__["metalk8s_volumes.get_superblock_flags"]("UUID", "TYPE")
-    kwargs = {
-        "use_superblocks": True,
-        "superblocks_flags": flags,
-        "use_partitions": True,
-    }
-    with __utils__["metalk8s_volumes.get_blkid_probe"](path, **kwargs) as probe:
-        return probe.probe()
+    return __utils__["metalk8s_volumes.probe_device"](
+        path,
+        use_superblocks=True,
+        superblocks_flags=flags,
+        use_partitions=True,
+        refresh=refresh,
+    )
 
 
 def _mkfs(path, fs_type, uuid, force=False, options=None):
@@ -1,12 +1,40 @@
+import copy
+import hashlib
 import os.path
 import logging
+import re
+import time
 
-from salt.exceptions import CommandExecutionError
+import salt.cache
+from salt.exceptions import CommandExecutionError, SaltCacheError
 
 
 VERSION_LABEL = "metalk8s.scality.com/version"
 ROLE_LABEL_PREFIX = "node-role.kubernetes.io/"
 
+# Maximum age (in seconds) of the cluster snapshot shared between all minions
+# pillar renders, can be overridden with `metalk8s_nodes_snapshot_ttl` in the
+# master configuration
+SNAPSHOT_TTL = 10
+
+# Label set by the storage-operator on Volumes, holding their `spec.nodeName`
+VOLUME_NODE_LABEL = "storage.metalk8s.scality.com/node"
+
+# Valid label values (see `k8s.io/apimachinery/pkg/util/validation`), the
+# storage-operator does not set `VOLUME_NODE_LABEL` for other Node names
+LABEL_VALUE_MAX_LENGTH = 63
+LABEL_VALUE_RE = re.compile(r"^(([A-Za-z0-9][-A-Za-z0-9_.]*)?[A-Za-z0-9])?$")
+
+# Cluster snapshots (Nodes, cluster version, StorageClasses and unlabelled
+# Volumes indexed by Node name) are stored in the master cache, in this bank,
+# since this module is reloaded for every pillar compilation
+SNAPSHOT_CACHE_BANK = "metalk8s_nodes"
+
+# Key holding the time of the last Node write made through the
+# `metalk8s_kubernetes` execution module on the master, snapshots built
+# before it are outdated (e.g. a Node version or roles were just changed)
+NODES_CHANGED_CACHE_KEY = "nodes-changed"
+
 
 log = logging.getLogger(__name__)
 
@@ -75,18 +103,24 @@ def get_storage_classes(kubeconfig=None):
     return storage_classes
 
 
-def list_volumes(minion_id, kubeconfig=None):
-    try:
-        storage_classes = get_storage_classes(kubeconfig=kubeconfig)
-    except CommandExecutionError as exc:
-        return __utils__["pillar_utils.errors_to_dict"](
-            ["Unable to retrieve list of storage class: {}".format(exc)]
-        )
+def _set_storage_class(volume, storage_classes):
+    volume["spec"]["storageClass"] = storage_classes.get(
+        volume["spec"]["storageClassName"], volume["spec"]["storageClassName"]
+    )
+
 
+def index_volumes(storage_classes, kubeconfig=None):
+    """Retrieve Volumes missing the node label, indexed by their Node name.
+
+    The storage-operator sets `VOLUME_NODE_LABEL` on every Volume it
+    reconciles, this index is only a fallback for the ones it did not label
+    (yet), so that they can still be found without listing all Volumes.
+    """
     try:
         volumes = __salt__["metalk8s_kubernetes.list_objects"](
             kind="Volume",
             apiVersion="storage.metalk8s.scality.com/v1alpha1",
+            label_selector="!{}".format(VOLUME_NODE_LABEL),
             kubeconfig=kubeconfig,
         )
     except CommandExecutionError as exc:
@@ -94,22 +128,127 @@ def list_volumes(minion_id, kubeconfig=None):
             ["Unable to retrieve list of Volumes: {}".format(exc)]
         )
 
-    results = {}
-    local_volumes = (
-        volume for volume in volumes if volume["spec"]["nodeName"] == minion_id
-    )
-    for volume in local_volumes:
-        name = volume["metadata"]["name"]
-        storageclass = storage_classes.get(
-            volume["spec"]["storageClassName"], volume["spec"]["storageClassName"]
-        )
-        volume["spec"]["storageClass"] = storageclass
+    index = {}
+    for volume in volumes:
+        _set_storage_class(volume, storage_classes)
         name = volume["metadata"]["name"]
-        results[name] = volume
+        index.setdefault(volume["spec"]["nodeName"], {})[name] = volume
+
+    return index
+
+
+def _is_valid_label_value(value):
+    return len(value) <= LABEL_VALUE_MAX_LENGTH and bool(LABEL_VALUE_RE.match(value))
+
+
+def list_volumes(minion_id, kubeconfig=None, snapshot=None):
+    if snapshot is None:
+        snapshot = _get_snapshot(kubeconfig)
+
+    for key in ["storage_classes", "volumes"]:
+        if "_errors" in snapshot[key]:
+            return snapshot[key]
+
+    # Volumes of a Node whose name is not a valid label value are never
+    # labelled, they are all part of the unlabelled Volumes index
+    volumes = []
+    if _is_valid_label_value(minion_id):
+        try:
+            volumes = __salt__["metalk8s_kubernetes.list_objects"](
+                kind="Volume",
+                apiVersion="storage.metalk8s.scality.com/v1alpha1",
+                label_selector="{}={}".format(VOLUME_NODE_LABEL, minion_id),
+                kubeconfig=kubeconfig,
+            )
+        except CommandExecutionError as exc:
+            return __utils__["pillar_utils.errors_to_dict"](
+                ["Unable to retrieve list of Volumes: {}".format(exc)]
+            )
+
+    # Unlabelled Volumes are shared between all minions, do not expose the
+    # cached objects
+    results = copy.deepcopy(snapshot["volumes"].get(minion_id, {}))
+    for volume in volumes:
+        if volume["spec"]["nodeName"] != minion_id:
+            continue
+        _set_storage_class(volume, snapshot["storage_classes"])
+        results[volume["metadata"]["name"]] = volume
 
     return results
 
 
+def _build_snapshot(kubeconfig):
+    snapshot = {"created": time.time()}
+
+    try:
+        snapshot["nodes"] = __salt__["metalk8s_kubernetes.list_objects"](
+            kind="Node", apiVersion="v1", kubeconfig=kubeconfig
+        )
+    except CommandExecutionError as exc:
+        log.exception("Failed to retrieve nodes for ext_pillar", exc_info=exc)
+        snapshot["nodes"] = __utils__["pillar_utils.errors_to_dict"](
+            ["Failed to retrieve NodeList: {!s}".format(exc)]
+        )
+    else:
+        log.debug("Successfully retrieved nodes for ext_pillar")
+
+    snapshot["cluster_version"] = get_cluster_version(kubeconfig=kubeconfig)
+
+    try:
+        snapshot["storage_classes"] = get_storage_classes(kubeconfig=kubeconfig)
+    except CommandExecutionError as exc:
+        snapshot["storage_classes"] = __utils__["pillar_utils.errors_to_dict"](
+            ["Unable to retrieve list of storage class: {}".format(exc)]
+        )
+        snapshot["volumes"] = snapshot["storage_classes"]
+    else:
+        snapshot["volumes"] = index_volumes(
+            snapshot["storage_classes"], kubeconfig=kubeconfig
+        )
+
+    return snapshot
+
+
+def _get_snapshot(kubeconfig):
+    """Retrieve the cluster snapshot shared by all minions, or build it.
+
+    The snapshot is rebuilt once it is older than `SNAPSHOT_TTL` or than the
+    last Node write, and is only kept in cache if all its parts were
+    successfully retrieved.
+    """
+    ttl = __opts__.get("metalk8s_nodes_snapshot_ttl", SNAPSHOT_TTL)
+    cache = salt.cache.Cache(__opts__)
+    key = "snapshot-{}".format(hashlib.sha256(kubeconfig.encode()).hexdigest())
+
+    try:
+        snapshot = cache.fetch(SNAPSHOT_CACHE_BANK, key)
+        nodes_changed = cache.fetch(SNAPSHOT_CACHE_BANK, NODES_CHANGED_CACHE_KEY)
+    except SaltCacheError as exc:
+        log.warning("Unable to read cluster snapshot from cache: %s", exc)
+        snapshot = None
+    if (
+        snapshot
+        and time.time() - snapshot["created"] < ttl
+        # A snapshot started before the last Node write may not include it
+        and snapshot["created"] > (nodes_changed or {}).get("time", 0)
+    ):
+        return snapshot
+
+    snapshot = _build_snapshot(kubeconfig)
+    try:
+        if any(
+            isinstance(snapshot[part], dict) and "_errors" in snapshot[part]
+            for part in ["nodes", "cluster_version", "storage_classes", "volumes"]
+        ):
+            cache.flush(SNAPSHOT_CACHE_BANK, key)
+        else:
+            cache.store(SNAPSHOT_CACHE_BANK, key, snapshot)
+    except SaltCacheError as exc:
+        log.warning("Unable to store cluster snapshot in cache: %s", exc)
+
+    return snapshot
+
+
 def ext_pillar(minion_id, pillar, kubeconfig):
     if not os.path.isfile(kubeconfig):
         error_tplt = "{}: kubeconfig not found at {}"
@@ -125,24 +264,20 @@ def ext_pillar(minion_id, pillar, kubeconfig):
             if "ca" in pillar["metalk8s"]:
                 ca_minion = pillar["metalk8s"]["ca"].get("minion", None)
 
-        try:
-            node_list = __salt__["metalk8s_kubernetes.list_objects"](
-                kind="Node", apiVersion="v1", kubeconfig=kubeconfig
-            )
-        except CommandExecutionError as exc:
-            log.exception("Failed to retrieve nodes for ext_pillar", exc_info=exc)
-            pillar_nodes = __utils__["pillar_utils.errors_to_dict"](
-                ["Failed to retrieve NodeList: {!s}".format(exc)]
-            )
+        snapshot = _get_snapshot(kubeconfig)
+
+        if "_errors" in snapshot["nodes"]:
+            pillar_nodes = snapshot["nodes"]
         else:
-            log.debug("Successfully retrieved nodes for ext_pillar")
             pillar_nodes = dict(
                 (node["metadata"]["name"], node_info(node, ca_minion))
-                for node in node_list
+                for node in snapshot["nodes"]
             )
 
-        cluster_version = get_cluster_version(kubeconfig=kubeconfig)
-        volume_information = list_volumes(minion_id, kubeconfig=kubeconfig)
+        cluster_version = snapshot["cluster_version"]
+        volume_information = list_volumes(
+            minion_id, kubeconfig=kubeconfig, snapshot=snapshot
+        )
 
     result = {
         "metalk8s": {
@@ -19,11 +19,17 @@ The supported options are:
   salt-master configuration
 - `absent`, a boolean to toggle which state function variant (`object_present`
   or `object_absent`) to use (defaults to False)
+- `batch`, a boolean to render all objects as a single `objects_present`
+  state, applying them with server-side apply (defaults to False, cannot be
+  used with `absent`)
+- `max_workers`, the maximum number of objects applied concurrently in
+  `batch` mode (defaults to 10)
 """
 import yaml
 
 from salt.exceptions import SaltRenderError
 from salt.ext import six
+import salt.utils.data
 from salt.utils.yaml import SaltYamlSafeLoader
 from salt.utils.odict import OrderedDict
 
@@ -70,6 +76,22 @@ def _step(manifest, kubeconfig=None, context=None, absent=False):
     return step_name, {state_func: state_args}
 
 
+def _batch_step(manifests, sls, kubeconfig=None, context=None, max_workers=10):
+    """Render all Kubernetes objects into a single `objects_present` step."""
+    step_name = "Apply {} objects from '{}'".format(len(manifests), sls)
+    state_args = [
+        {"name": step_name},
+        {"kubeconfig": kubeconfig},
+        {"context": context},
+        {"manifests": manifests},
+        {"max_workers": max_workers},
+    ]
+
+    return OrderedDict(
+        [(step_name, {"metalk8s_kubernetes.objects_present": state_args})]
+    )
+
+
 def render(
     source, saltenv="", sls="", argline="", **_kwargs
 ):  # pylint: disable=unused-argument
@@ -78,6 +100,11 @@ def render(
     kubeconfig = args.get("kubeconfig", [None])[0]
     context = args.get("context", [None])[0]
     absent = args.get("absent", [False])[0]
+    batch = salt.utils.data.is_true(args.get("batch", [False])[0])
+    max_workers = int(args.get("max_workers", [10])[0])
+
+    if batch and absent:
+        raise SaltRenderError("Option `batch` cannot be used with `absent`.")
 
     if not isinstance(source, six.string_types):
         # Assume it is a file handle
@@ -85,6 +112,19 @@ def render(
 
     data = yaml.load_all(source, Loader=SaltYamlSafeLoader)
 
+    if batch:
+        manifests = [manifest for manifest in data if manifest]
+        for manifest in manifests:
+            # Validate manifests as early as possible
+            _step_name(manifest)
+        return _batch_step(
+            manifests,
+            sls,
+            kubeconfig=kubeconfig,
+            context=context,
+            max_workers=max_workers,
+        )
+
     return OrderedDict(
         _step(manifest, kubeconfig=kubeconfig, context=context, absent=absent)
         for manifest in data
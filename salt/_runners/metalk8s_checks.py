@@ -3,10 +3,20 @@
 Runner module handling MetalK8s cluster checks.
 """
 
+import logging
+import time
+
 from salt.exceptions import CheckError
 
+log = logging.getLogger(__name__)
+
 __virtualname__ = "metalk8s_checks"
 
+# Time (in seconds) given to the `metalk8s_checks.node` checks to complete on
+# every minion, the Salt job itself is given some extra time to return
+NODE_CHECKS_TIMEOUT = 120
+NODE_CHECKS_JOB_MARGIN = 30
+
 
 def __virtual__():
     return __virtualname__
@@ -46,14 +56,18 @@ def nodes(node_list=None, raises=True):
     if node_list is None:
         node_list = __pillar__["metalk8s"]["nodes"].keys()
 
+    # Retrieve all the Nodes at once, instead of one API call per node
+    node_objs = __salt__["salt.cmd"](
+        fun="metalk8s_kubernetes.list_objects", kind="Node", apiVersion="v1"
+    )
+    nodes_by_name = {node_obj["metadata"]["name"]: node_obj for node_obj in node_objs}
+
     not_ready_nodes = {}
     for node_name in node_list:
-        node_obj = __salt__["salt.cmd"](
-            fun="metalk8s_kubernetes.get_object",
-            kind="Node",
-            apiVersion="v1",
-            name=node_name,
-        )
+        node_obj = nodes_by_name.get(node_name)
+        if node_obj is None:
+            not_ready_nodes.setdefault("NotFound", []).append(node_name)
+            continue
 
         condition = next(
             cond for cond in node_obj["status"]["conditions"] if cond["type"] == "Ready"
@@ -107,6 +121,69 @@ def minions(minion_list=None, raises=True):
     return _handle_errors(errors, raises)
 
 
+def node_checks(
+    minion_list=None, raises=True, timeout=NODE_CHECKS_TIMEOUT, timings=False
+):
+    """Run the `metalk8s_checks.node` checks on all Salt minions at once
+
+    The checks are dispatched to all the minions in a single Salt job, so
+    that they run concurrently on every minion.
+
+    Args:
+        minion_list (list, optional): List of Salt minion to check. Defaults to `pillar.metalk8s.nodes`.
+        raises (bool, optional): Whether or not this function should raise. Defaults to True.
+        timeout (int, optional): Time (in seconds) given to the checks to complete on each minion.
+        timings (bool, optional): Return a dict with the `result` of the checks, the
+            total `duration` and the `timings` of each check per minion. Defaults to False.
+
+    Raises:
+        CheckError: If 'raises' is True and some Salt minions checks failed
+
+    Returns:
+        dict or True: An error message or True if everything OK
+    """
+    errors = []
+
+    if minion_list is None:
+        minion_list = __pillar__["metalk8s"]["nodes"].keys()
+    minion_list = list(minion_list)
+
+    start = time.time()
+    ret = __salt__["salt.execute"](
+        ",".join(minion_list),
+        "metalk8s_checks.node",
+        tgt_type="list",
+        timeout=timeout + NODE_CHECKS_JOB_MARGIN,
+        kwarg={"raises": False, "timeout": timeout, "timings": True},
+    )
+    duration = time.time() - start
+
+    minions_timings = {}
+    for minion in minion_list:
+        if minion not in ret:
+            errors.append("Salt minion '{}' did not answer".format(minion))
+            continue
+
+        minion_ret = ret[minion]
+        # NOTE: Minions running an older `metalk8s_checks` module only return
+        # the result of the checks
+        if isinstance(minion_ret, dict) and "result" in minion_ret:
+            minions_timings[minion] = minion_ret.get("timings")
+            minion_ret = minion_ret["result"]
+
+        if minion_ret is not True:
+            errors.append(str(minion_ret))
+
+    log.debug("Node checks on %d minions took %.3fs", len(minion_list), duration)
+
+    result = _handle_errors(errors, raises)
+
+    if timings:
+        return {"result": result, "duration": duration, "timings": minions_timings}
+
+    return result
+
+
 def upgrade(dest_version, saltenv, raises=True):
     """Check that we can start MetalK8s cluster upgrade
 
@@ -163,6 +240,13 @@ def upgrade(dest_version, saltenv, raises=True):
     minions_ready = minions(minion_list=metalk8s_pillar["nodes"].keys(), raises=False)
     if minions_ready is not True:
         errors.extend(minions_ready["errors"])
+    else:
+        # Only run the node checks once we know all the minions answer
+        node_checks_ret = node_checks(
+            minion_list=metalk8s_pillar["nodes"].keys(), raises=False
+        )
+        if node_checks_ret is not True:
+            errors.extend(node_checks_ret["errors"])
 
     return _handle_errors(errors, raises)
 
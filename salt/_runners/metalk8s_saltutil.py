@@ -1,13 +1,18 @@
 from __future__ import absolute_import, print_function, unicode_literals
 import logging
-import time
 
-from salt.exceptions import CommandExecutionError
+from salt.exceptions import CommandExecutionError, SaltCacheError
+import salt.cache
 import salt.client
 import salt.utils.extmods
+import salt.utils.process
 
 log = logging.getLogger(__name__)
 
+# Master cache bank where each master process using the `kubernetes_rbac`
+# eauth module publishes its review cache statistics (as `stats-<pid>`)
+AUTH_CACHE_STATS_BANK = "kubernetes_rbac"
+
 
 def sync_auth(saltenv="base", extmod_whitelist=None, extmod_blacklist=None):
     return salt.utils.extmods.sync(
@@ -19,6 +24,33 @@ def sync_auth(saltenv="base", extmod_whitelist=None, extmod_blacklist=None):
     )[0]
 
 
+def auth_cache_stats():
+    """Return the review cache statistics of the `kubernetes_rbac` eauth
+    module, summed over all the running master processes.
+
+    Statistics of processes which are not running anymore are dropped.
+    """
+    cache = salt.cache.Cache(__opts__)
+    result = {"hits": 0, "misses": 0, "size": 0, "processes": 0}
+
+    try:
+        for key in cache.list(AUTH_CACHE_STATS_BANK):
+            if not salt.utils.process.os_is_running(int(key[len("stats-") :])):
+                cache.flush(AUTH_CACHE_STATS_BANK, key)
+                continue
+
+            stats = cache.fetch(AUTH_CACHE_STATS_BANK, key)
+            for counter in ["hits", "misses", "size"]:
+                result[counter] += stats.get(counter, 0)
+            result["processes"] += 1
+    except SaltCacheError as exc:
+        raise CommandExecutionError(
+            "Unable to read review cache statistics: {}".format(exc)
+        ) from exc
+
+    return result
+
+
 def wait_minions(tgt="*", retry=10):
     client = salt.client.get_local_client(__opts__["conf_file"])
 
@@ -65,16 +97,23 @@ def wait_minions(tgt="*", retry=10):
         log.error(error_message)
         raise CommandExecutionError(error_message)
 
-    # Waiting for running states to complete
-    state_running = client.cmd(tgt, "saltutil.is_running", arg=["state.*"])
-    attempts = 1
+    # Waiting for running states to complete (for up to 5 seconds per retry),
+    # checking again with an exponential backoff (capped to 5 seconds)
+    state_running = {}
+    attempts = 0
+
+    def no_state_running():
+        nonlocal state_running, attempts
+        state_running = client.cmd(tgt, "saltutil.is_running", arg=["state.*"])
 
-    # If we got only empty result then no state running
-    while attempts <= retry and any(state_running.values()):
+        # If we got only empty result then no state running
+        if not any(state_running.values()):
+            return True
+
+        attempts += 1
         log.info(
-            "[Attempt %d/%d] Waiting for running jobs to complete: %s",
+            "[Attempt %d] Waiting for running jobs to complete: %s",
             attempts,
-            retry,
             " - ".join(
                 'State on minion "{minion}": {states}'.format(
                     minion=minion,
@@ -87,9 +126,9 @@ def wait_minions(tgt="*", retry=10):
                 if running_states
             ),
         )
-        time.sleep(5)
-        state_running = client.cmd(tgt, "saltutil.is_running", arg=["state.*"])
-        attempts += 1
+        return False
+
+    __utils__["wait_utils.wait_for"](no_state_running, timeout=retry * 5, maximum=5)
 
     if any(state_running.values()):
         error_message = (
@@ -2,8 +2,10 @@
 States to manage the :program:`containerd` CRI runtime.
 """
 
+from concurrent.futures import ThreadPoolExecutor
 import logging
 import os
+import time
 
 log = logging.getLogger(__name__)
 
@@ -67,7 +69,7 @@ def image_managed(name, archive_path=None):
             path=real_archive_path, fullname=name
         )
         # ctr can fail to load the image and exit silently
-        if result["retcode"] == 0 and __salt__["cri.available"](name):
+        if result["retcode"] == 0 and __salt__["cri.available"](name, refresh=True):
             ret["changes"].update(
                 {
                     name: {
@@ -116,3 +118,133 @@ def image_managed(name, archive_path=None):
             ret["comment"] = "Failed to pull image"
 
     return ret
+
+
+def _import_or_pull(name, archive_path=None, cached_archive_path=None):
+    """Import or pull an image, returning (changes, error, duration)."""
+    start = time.time()
+    if archive_path and not cached_archive_path:
+        # Never fall back to a pull, it would hide the actual error
+        changes = None
+        error = "Failed to cache archive {}".format(archive_path)
+    elif archive_path:
+        result = __salt__["containerd.load_cri_image"](
+            path=cached_archive_path, fullname=name
+        )
+        if result["retcode"] == 0:
+            changes, error = os.path.basename(archive_path), None
+        else:
+            changes = None
+            error = "Failed to import archive: {}".format(
+                result["stderr"] or result["stdout"]
+            )
+    else:
+        changes = __salt__["cri.pull_image"](name)
+        error = None if changes else "Failed to pull image"
+
+    return changes, error, time.time() - start
+
+
+def images_managed(name, images, max_workers=4):
+    """
+    Pull or load several images in the CRI image cache.
+
+    Missing images are computed from a single image listing, then imported
+    or pulled concurrently.
+
+    name
+        Name of the state
+    images
+        List of images, each being either the tag or digest of an image to
+        pull, or a dict with the image `name` and the optional `archive_path`
+        of a local Docker archive to load it from (see `image_managed`)
+    max_workers : 4
+        Maximum number of images imported or pulled concurrently
+    """
+    ret = {
+        "name": name,
+        "result": False,
+        "changes": {},
+        "pchanges": {},
+        "comment": "",
+    }
+
+    images = [
+        dict(image) if isinstance(image, dict) else {"name": image} for image in images
+    ]
+
+    # Only the first check lists images, others use the CRI snapshot
+    missing = [
+        image
+        for index, image in enumerate(images)
+        if not __salt__["cri.available"](image["name"], refresh=index == 0)
+    ]
+
+    if not missing:
+        ret["comment"] = "All images already available"
+        ret["result"] = True
+        return ret
+
+    if __opts__["test"]:
+        ret["comment"] = "Will import or pull {} image(s)".format(len(missing))
+        ret["result"] = None
+        ret["pchanges"].update(
+            {
+                image["name"]: {
+                    "old": {},
+                    "new": {
+                        "name": image["name"],
+                        "digests": {},
+                    },
+                }
+                for image in missing
+            }
+        )
+        return ret
+
+    # Fetching files is not thread-safe, retrieve all archives beforehand
+    for image in missing:
+        if image.get("archive_path"):
+            image["real_archive_path"] = __salt__["cp.cache_file"](
+                image["archive_path"], __env__
+            )
+
+    with ThreadPoolExecutor(max_workers=int(max_workers)) as executor:
+        results = list(
+            executor.map(
+                lambda image: _import_or_pull(
+                    image["name"],
+                    image.get("archive_path"),
+                    image.get("real_archive_path"),
+                ),
+                missing,
+            )
+        )
+
+    errors = []
+    lines = []
+    refresh = True
+    for image, (changes, error, duration) in zip(missing, results):
+        # ctr can fail to load the image and exit silently
+        if error is None:
+            if not __salt__["cri.available"](image["name"], refresh=refresh):
+                error = "Image not available after import"
+            refresh = False
+
+        if error is None:
+            ret["changes"][image["name"]] = {"old": {}, "new": changes}
+            lines.append("- {}: done in {:.1f}s".format(image["name"], duration))
+        else:
+            errors.append(image["name"])
+            lines.append(
+                "- {}: {} (after {:.1f}s)".format(image["name"], error, duration)
+            )
+
+    if errors:
+        ret["comment"] = "Failed to import or pull {} image(s):\n".format(len(errors))
+    else:
+        ret["comment"] = "Imported or pulled {} image(s):\n".format(len(missing))
+        ret["result"] = True
+    ret["comment"] += "\n".join(lines)
+
+    return ret
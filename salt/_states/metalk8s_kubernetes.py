@@ -1,14 +1,23 @@
 """Management of Kubernetes objects as Salt states.
 
-This module defines three state functions: `object_present`, `object_absent`
-and `object_updated`.
+This module defines four state functions: `object_present`, `object_absent`,
+`object_updated` and `objects_present`.
 Those will then simply delegate all the logic to the `metalk8s_kubernetes`
 execution module, only managing simple dicts in this state module.
 """
+from concurrent.futures import ThreadPoolExecutor
 import time
 
 __virtualname__ = "metalk8s_kubernetes"
 
+# Kinds applied before any other object in `objects_present`, as other
+# objects may depend on them
+PRIORITY_KINDS = ("Namespace", "CustomResourceDefinition")
+
+# Time (in seconds) given to the CustomResourceDefinitions applied by
+# `objects_present` to be established, before applying the other objects
+CRD_ESTABLISHED_TIMEOUT = 60
+
 
 def __virtual__():
     if "metalk8s_kubernetes.create_object" not in __salt__:
@@ -26,7 +35,9 @@ def object_absent(name, manifest=None, wait=None, **kwargs):
         wait (int): Number of retry to wait for object deletion (default: 5)
         wait (dict): Dict with number of retry to wait and time to sleep
             between each check of object deletion
-            (default: 5 attempts and sleep 5 seconds)
+            (default: 5 attempts and sleep 5 seconds), the object being
+            watched so that its deletion is noticed right away, within an
+            overall deadline of `attempts * sleep` seconds
     """
     ret = {"name": name, "changes": {}, "result": True, "comment": ""}
 
@@ -68,21 +79,43 @@ def object_absent(name, manifest=None, wait=None, **kwargs):
         return ret
 
     if wait:
-        attempts = 1
-        while attempts <= wait["attempts"]:
-            obj = __salt__["metalk8s_kubernetes.get_object"](
+        metadata = obj["metadata"]
+        last_seen = {"resource_version": metadata.get("resourceVersion")}
+        kubeconfig_kwargs = {
+            key: kwargs[key] for key in ("kubeconfig", "context") if key in kwargs
+        }
+
+        def _is_absent():
+            current = __salt__["metalk8s_kubernetes.get_object"](
                 name=name_arg, manifest=manifest, saltenv=__env__, **kwargs
             )
-            if obj is None:
-                break
-            time.sleep(wait["sleep"])
-            attempts += 1
-        if attempts > wait["attempts"]:
+            if current is None:
+                return True
+            last_seen["resource_version"] = current["metadata"].get("resourceVersion")
+            return False
+
+        def _watch(timeout):
+            # Watch from the last seen version, so the deletion cannot be missed
+            return __salt__["metalk8s_kubernetes.watch_objects"](
+                kind=obj["kind"],
+                apiVersion=obj["apiVersion"],
+                namespace=metadata.get("namespace") or "default",
+                field_selector="metadata.name={}".format(metadata["name"]),
+                resource_version=last_seen["resource_version"],
+                timeout=timeout,
+                **kubeconfig_kwargs
+            )
+
+        absent, attempts = __utils__["wait_utils.wait_for"](
+            _is_absent,
+            timeout=wait["attempts"] * wait["sleep"],
+            watch=_watch,
+            maximum=wait["sleep"],
+        )
+        if not absent:
             ret[
                 "comment"
-            ] = "The object is still present after {} check attempts".format(
-                wait["attempts"]
-            )
+            ] = "The object is still present after {} check attempts".format(attempts)
             ret["result"] = False
             return ret
         ret[
@@ -154,15 +187,17 @@ def object_present(name, manifest=None, **kwargs):
 
         return ret
 
-    # TODO: Attempt to handle idempotency as much as possible here, we don't
-    #       want to always replace if nothing changed. Currently though, we
-    #       don't know how to achieve this, since some fields may be set by
-    #       api-server or by the user without us being able to distinguish
-    #       them.
+    # NOTE: The replace is skipped by the execution module if the object
+    #       carries the digest of this same manifest (from a previous
+    #       create or replace), in which case we get the object unchanged.
     new = __salt__["metalk8s_kubernetes.replace_object"](
         name=name_arg, manifest=manifest, old_object=obj, saltenv=__env__, **kwargs
     )
     diff = __utils__["dictdiffer.recursive_diff"](obj, new)
+    if not diff.diffs:
+        ret["comment"] = "The object is already up-to-date, no change"
+        return ret
+
     ret["changes"] = diff.diffs
     ret["comment"] = "The object was replaced"
 
@@ -219,3 +254,157 @@ def object_updated(name, manifest=None, **kwargs):
     ret["comment"] = "The object was updated"
 
     return ret
+
+
+def _object_description(manifest):
+    metadata = manifest.get("metadata", {})
+    name = metadata.get("name")
+    if metadata.get("namespace"):
+        name = "{}/{}".format(metadata["namespace"], name)
+
+    return "{}/{} '{}'".format(manifest.get("apiVersion"), manifest.get("kind"), name)
+
+
+def _error_message(exc):
+    if exc.__cause__ is not None:
+        return "{}: {}".format(exc, exc.__cause__)
+    return str(exc) or repr(exc)
+
+
+def _is_established(crd):
+    return any(
+        condition.get("type") == "Established" and condition.get("status") == "True"
+        for condition in ((crd or {}).get("status") or {}).get("conditions") or []
+    )
+
+
+def _applied_change(obj, since):
+    """Return the change made by a server-side apply started at `since`.
+
+    The API server does not write the object if an apply changes nothing, so
+    the object is only created, or the time of the "salt" field manager entry
+    only updated, if something changed.
+    Timestamps have a one second precision, `since` must be rounded down, and
+    the clocks of the master and the API server are expected to be in sync.
+    """
+    metadata = obj.get("metadata") or {}
+    if (metadata.get("creationTimestamp") or "") >= since:
+        return "created"
+    for entry in metadata.get("managedFields") or []:
+        if (
+            entry.get("manager") == "salt"
+            and entry.get("operation") == "Apply"
+            and (entry.get("time") or "") >= since
+        ):
+            return "updated"
+    return None
+
+
+def objects_present(name, manifests, max_workers=10, **kwargs):
+    """Ensure that several objects are present, using server-side apply.
+
+    Objects of kinds listed in `PRIORITY_KINDS` (Namespaces and CRDs) are
+    applied first, then all the others once the CRDs are established. Within
+    each of these groups, objects are applied concurrently.
+    Only the objects created or changed by the apply are reported in the
+    changes.
+
+    Arguments:
+        name (str): A name for this batch of objects
+        manifests (list): Manifests content
+        max_workers (int): Maximum number of objects applied concurrently
+    """
+    ret = {"name": name, "changes": {}, "result": True, "comment": ""}
+
+    manifests = [manifest for manifest in manifests if manifest]
+    waves = [
+        [m for m in manifests if m.get("kind") in PRIORITY_KINDS],
+        [m for m in manifests if m.get("kind") not in PRIORITY_KINDS],
+    ]
+
+    if __opts__["test"]:
+        ret["result"] = None
+        ret["comment"] = "{} object(s) are going to be applied".format(len(manifests))
+        return ret
+
+    def _apply(manifest):
+        """Apply the object, return it, the change made (if any) and the
+        error."""
+        since = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        try:
+            obj = __salt__["metalk8s_kubernetes.apply_object"](
+                manifest=manifest, saltenv=__env__, **kwargs
+            )
+        except Exception as exc:  # pylint: disable=broad-except
+            return None, None, _error_message(exc)
+
+        return obj, _applied_change(obj, since), None
+
+    def _wait_established(crds):
+        """Wait for the CRDs to be established, return the errors."""
+        pending = list(crds)
+
+        def _all_established():
+            pending[:] = [
+                crd
+                for crd in pending
+                if not _is_established(
+                    __salt__["metalk8s_kubernetes.get_object"](
+                        manifest=crd, saltenv=__env__, **kwargs
+                    )
+                )
+            ]
+            return not pending
+
+        try:
+            __utils__["wait_utils.wait_for"](
+                _all_established, timeout=CRD_ESTABLISHED_TIMEOUT
+            )
+        except Exception as exc:  # pylint: disable=broad-except
+            error = _error_message(exc)
+        else:
+            error = "Not established after {} seconds".format(CRD_ESTABLISHED_TIMEOUT)
+
+        return {_object_description(crd): error for crd in pending}
+
+    applied = 0
+    errors = {}
+    with ThreadPoolExecutor(max_workers=int(max_workers)) as executor:
+        for index, wave in enumerate(waves):
+            crds = []
+            for manifest, (obj, change, error) in zip(wave, executor.map(_apply, wave)):
+                description = _object_description(manifest)
+                if error is not None:
+                    errors[description] = error
+                    continue
+                applied += 1
+                if change is not None:
+                    ret["changes"][description] = change
+                if manifest.get(
+                    "kind"
+                ) == "CustomResourceDefinition" and not _is_established(obj):
+                    crds.append(manifest)
+
+            # Custom resources cannot be applied before their CRD is
+            # established
+            if crds and not errors and any(waves[index + 1 :]):
+                errors.update(_wait_established(crds))
+
+            if errors:
+                # Do not apply objects which may depend on failed ones
+                break
+
+    ret["comment"] = "{} object(s) applied, {} changed".format(
+        applied, len(ret["changes"])
+    )
+    if errors:
+        ret["result"] = False
+        ret["comment"] += ", {} failed:\n{}".format(
+            len(errors),
+            "\n".join(
+                "- {}: {}".format(description, error)
+                for description, error in errors.items()
+            ),
+        )
+
+    return ret
@@ -8,6 +8,10 @@ log = logging.getLogger(__name__)
 
 __virtualname__ = "metalk8s_volumes"
 
+# Key of the `__context__` holding the per-volume results of
+# `volumes_prepared`, read by `batch_prepared` in the same state run
+BATCH_RESULTS_KEY = "metalk8s_volumes.batch_results"
+
 
 def __virtual__():
     return __virtualname__
@@ -81,6 +85,106 @@ def prepared(name):
     return ret
 
 
+def volumes_prepared(name, volumes=None, max_workers=None, fail_on_errors=True):
+    """Ensure that the backing storage of several volumes exists and is prepared.
+
+    Volumes backed by distinct physical devices are handled concurrently.
+    The result of each volume is kept for the `batch_prepared` states of the
+    same run.
+
+    Args:
+        name           (str):  state name
+        volumes        (list): volume names (all the volumes from the pillar
+                               if not specified)
+        max_workers    (int):  maximum number of devices handled concurrently
+        fail_on_errors (bool): whether this state fails if some volumes
+                               failed, otherwise errors are only reported by
+                               the `batch_prepared` state of each volume
+
+    Returns:
+        dict: state return value
+    """
+    ret = {"name": name, "changes": {}, "result": True, "comment": ""}
+    if volumes is None:
+        volumes = list(__pillar__["metalk8s"]["volumes"])
+    comments = []
+    # Dry-run.
+    if __opts__["test"]:
+        for volume in volumes:
+            try:
+                if not __salt__["metalk8s_volumes.exists"](volume):
+                    comments.append(
+                        "Storage for volume {} is going to be created.".format(volume)
+                    )
+                elif __salt__["metalk8s_volumes.is_prepared"](volume):
+                    continue
+            except Exception as exn:  # pylint: disable=broad-except
+                ret["result"] = False
+                comments.append("Cannot check volume {}: {}.".format(volume, exn))
+                continue
+            ret["changes"][volume] = "Prepared"
+            comments.append("Volume {} is going to be prepared.".format(volume))
+        if ret["result"] and ret["changes"]:
+            ret["result"] = None
+        ret["comment"] = "\n".join(comments) or "All volumes already prepared."
+        return ret
+    # Let's go for real.
+    kwargs = {}
+    if max_workers is not None:
+        kwargs["max_workers"] = max_workers
+    results = __salt__["metalk8s_volumes.prepare_volumes"](volumes, **kwargs)
+    __context__.setdefault(BATCH_RESULTS_KEY, {}).update(results)
+    for volume in volumes:
+        result = results[volume]
+        if result["created"]:
+            ret["changes"][volume] = "Present"
+            comments.append("Storage for volume {} created.".format(volume))
+        if result["prepared"]:
+            ret["changes"][volume] = "Prepared"
+            comments.append("Volume {} prepared.".format(volume))
+        if result["error"]:
+            if fail_on_errors:
+                ret["result"] = False
+            comments.append(
+                "Failed to prepare volume {}: {}.".format(volume, result["error"])
+            )
+    ret["comment"] = "\n".join(comments) or "All volumes already prepared."
+    return ret
+
+
+def batch_prepared(name):
+    """Check the result of a previous `volumes_prepared` state for one volume.
+
+    The volume is prepared on its own if it was not handled by a
+    `volumes_prepared` state of the same run.
+
+    Args:
+        name (str): Volume name
+
+    Returns:
+        dict: state return value
+    """
+    result = __context__.get(BATCH_RESULTS_KEY, {}).get(name)
+    if result is None:
+        ret = present(name)
+        if ret["result"] is not True:
+            return ret
+        prepared_ret = prepared(name)
+        prepared_ret["changes"] = dict(ret["changes"], **prepared_ret["changes"])
+        prepared_ret["comment"] = "\n".join([ret["comment"], prepared_ret["comment"]])
+        return prepared_ret
+
+    ret = {"name": name, "changes": {}, "result": True, "comment": ""}
+    if result["error"]:
+        ret["result"] = False
+        ret["comment"] = "Failed to prepare volume {}: {}.".format(
+            name, result["error"]
+        )
+    else:
+        ret["comment"] = "Volume {} prepared.".format(name)
+    return ret
+
+
 def removed(name):
     """Remove and cleanup the given volume.
 
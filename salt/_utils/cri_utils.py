@@ -0,0 +1,293 @@
+# coding: utf-8
+"""Utility module to talk to a CRI runtime over gRPC.
+
+This is an alternative to shelling out to :command:`crictl`, which costs a
+process spawn and a new gRPC connection for every call. A single channel is
+kept per runtime endpoint and reused across calls.
+
+Message classes for the subset of the `runtime.v1` CRI API used by MetalK8s
+are built at import time from an embedded descriptor, so that no generated
+code has to be shipped. Field numbers match the upstream `api.proto` (they
+are the same in `runtime.v1alpha2`), unused fields are simply skipped when
+parsing.
+"""
+
+import re
+import threading
+
+from salt.exceptions import CommandExecutionError
+
+MISSING_DEPS = []
+
+try:
+    import grpc
+except ImportError:
+    MISSING_DEPS.append("grpcio")
+
+try:
+    from google.protobuf import descriptor_pb2
+    from google.protobuf import json_format
+    from google.protobuf import message_factory
+except ImportError:
+    MISSING_DEPS.append("protobuf")
+
+
+def __virtual__():
+    if MISSING_DEPS:
+        return False, "Missing dependencies: {}".format(", ".join(MISSING_DEPS))
+
+    return True
+
+
+# Timeout (in seconds) of the CRI calls, except for image pulls
+TIMEOUT = 30
+
+PACKAGE = "runtime.v1"
+
+# CRI API descriptor {{{
+
+_ENUMS = {
+    "PodSandboxState": ["SANDBOX_READY", "SANDBOX_NOTREADY"],
+    "ContainerState": [
+        "CONTAINER_CREATED",
+        "CONTAINER_RUNNING",
+        "CONTAINER_EXITED",
+        "CONTAINER_UNKNOWN",
+    ],
+}
+
+# Message name => list of (field name, field number, type), where type is
+# either a scalar type, "map" (for `map<string, string>`), "repeated <type>"
+# or the name of another message or enum of the package
+_MESSAGES = {
+    "ImageSpec": [("image", 1, "string")],
+    "ImageFilter": [("image", 1, "ImageSpec")],
+    "ListImagesRequest": [("filter", 1, "ImageFilter")],
+    "Image": [
+        ("id", 1, "string"),
+        ("repo_tags", 2, "repeated string"),
+        ("repo_digests", 3, "repeated string"),
+        ("size", 4, "uint64"),
+        ("username", 6, "string"),
+    ],
+    "ListImagesResponse": [("images", 1, "repeated Image")],
+    "PullImageRequest": [("image", 1, "ImageSpec")],
+    "PullImageResponse": [("image_ref", 1, "string")],
+    "PodSandboxMetadata": [
+        ("name", 1, "string"),
+        ("uid", 2, "string"),
+        ("namespace", 3, "string"),
+        ("attempt", 4, "uint32"),
+    ],
+    "PodSandbox": [
+        ("id", 1, "string"),
+        ("metadata", 2, "PodSandboxMetadata"),
+        ("state", 3, "PodSandboxState"),
+        ("created_at", 4, "int64"),
+        ("labels", 5, "map"),
+        ("annotations", 6, "map"),
+    ],
+    "ListPodSandboxRequest": [],
+    "ListPodSandboxResponse": [("items", 1, "repeated PodSandbox")],
+    "StopPodSandboxRequest": [("pod_sandbox_id", 1, "string")],
+    "StopPodSandboxResponse": [],
+    "ContainerMetadata": [("name", 1, "string"), ("attempt", 2, "uint32")],
+    "Container": [
+        ("id", 1, "string"),
+        ("pod_sandbox_id", 2, "string"),
+        ("metadata", 3, "ContainerMetadata"),
+        ("image", 4, "ImageSpec"),
+        ("image_ref", 5, "string"),
+        ("state", 6, "ContainerState"),
+        ("created_at", 7, "int64"),
+        ("labels", 8, "map"),
+        ("annotations", 9, "map"),
+    ],
+    "ListContainersRequest": [],
+    "ListContainersResponse": [("containers", 1, "repeated Container")],
+}
+
+# Method name => (service, request message, response message)
+_METHODS = {
+    "ListImages": ("ImageService", "ListImagesRequest", "ListImagesResponse"),
+    "PullImage": ("ImageService", "PullImageRequest", "PullImageResponse"),
+    "ListPodSandbox": (
+        "RuntimeService",
+        "ListPodSandboxRequest",
+        "ListPodSandboxResponse",
+    ),
+    "StopPodSandbox": (
+        "RuntimeService",
+        "StopPodSandboxRequest",
+        "StopPodSandboxResponse",
+    ),
+    "ListContainers": (
+        "RuntimeService",
+        "ListContainersRequest",
+        "ListContainersResponse",
+    ),
+}
+
+
+def _build_file_descriptor():
+    fdp = descriptor_pb2.FieldDescriptorProto
+    scalar_types = {
+        "string": fdp.TYPE_STRING,
+        "int64": fdp.TYPE_INT64,
+        "uint32": fdp.TYPE_UINT32,
+        "uint64": fdp.TYPE_UINT64,
+    }
+
+    file_proto = descriptor_pb2.FileDescriptorProto(
+        name="metalk8s/cri/{}.proto".format(PACKAGE),
+        package=PACKAGE,
+        syntax="proto3",
+    )
+
+    for name, values in _ENUMS.items():
+        enum_proto = file_proto.enum_type.add(name=name)
+        for number, value in enumerate(values):
+            enum_proto.value.add(name=value, number=number)
+
+    for name, fields in _MESSAGES.items():
+        message_proto = file_proto.message_type.add(name=name)
+        for field_name, number, field_type in fields:
+            field = message_proto.field.add(
+                name=field_name, number=number, label=fdp.LABEL_OPTIONAL
+            )
+            if field_type.startswith("repeated "):
+                field.label = fdp.LABEL_REPEATED
+                field_type = field_type[len("repeated ") :]
+
+            if field_type == "map":
+                entry_name = "".join(
+                    part.capitalize() for part in field_name.split("_")
+                )
+                entry = message_proto.nested_type.add(name=entry_name + "Entry")
+                entry.options.map_entry = True
+                entry.field.add(
+                    name="key", number=1, label=fdp.LABEL_OPTIONAL, type=fdp.TYPE_STRING
+                )
+                entry.field.add(
+                    name="value",
+                    number=2,
+                    label=fdp.LABEL_OPTIONAL,
+                    type=fdp.TYPE_STRING,
+                )
+                field.label = fdp.LABEL_REPEATED
+                field.type = fdp.TYPE_MESSAGE
+                field.type_name = ".{}.{}.{}".format(PACKAGE, name, entry.name)
+            elif field_type in scalar_types:
+                field.type = scalar_types[field_type]
+            elif field_type in _ENUMS:
+                field.type = fdp.TYPE_ENUM
+                field.type_name = ".{}.{}".format(PACKAGE, field_type)
+            else:
+                field.type = fdp.TYPE_MESSAGE
+                field.type_name = ".{}.{}".format(PACKAGE, field_type)
+
+    return file_proto
+
+
+if not MISSING_DEPS:
+    MESSAGES = {
+        full_name[len(PACKAGE) + 1 :]: message_class
+        for full_name, message_class in message_factory.GetMessages(
+            [_build_file_descriptor()]
+        ).items()
+    }
+
+# }}}
+
+# Persistent channels, keyed by runtime endpoint
+_CHANNELS = {}
+_CHANNELS_LOCK = threading.Lock()
+
+
+def _get_channel(endpoint):
+    with _CHANNELS_LOCK:
+        channel = _CHANNELS.get(endpoint)
+        if channel is None:
+            channel = _CHANNELS[endpoint] = grpc.insecure_channel(endpoint)
+        return channel
+
+
+def close_channels():
+    """Close all the persistent gRPC channels."""
+    with _CHANNELS_LOCK:
+        for channel in _CHANNELS.values():
+            channel.close()
+        _CHANNELS.clear()
+
+
+def _call(endpoint, method, timeout=TIMEOUT, **kwargs):
+    service, request_name, response_name = _METHODS[method]
+    stub = _get_channel(endpoint).unary_unary(
+        "/{}.{}/{}".format(PACKAGE, service, method),
+        request_serializer=MESSAGES[request_name].SerializeToString,
+        response_deserializer=MESSAGES[response_name].FromString,
+    )
+
+    try:
+        return stub(MESSAGES[request_name](**kwargs), timeout=timeout)
+    except grpc.RpcError as exc:
+        raise CommandExecutionError(
+            "CRI call {} on {} failed: {}".format(method, endpoint, exc.details())
+        ) from exc
+
+
+def _to_dict(message):
+    # Same format as the JSON output of `crictl`
+    return json_format.MessageToDict(message, including_default_value_fields=True)
+
+
+def list_images(endpoint):
+    """List images, in the same format as `crictl images -o json`."""
+    response = _call(endpoint, "ListImages")
+    return [_to_dict(image) for image in response.images]
+
+
+_IMAGE_REF_RE = re.compile(r"^sha256:(?P<digest>[a-fA-F0-9]{64})$")
+
+
+def pull_image(endpoint, image):
+    """Pull an image, returning its digests (as `cri.pull_image`)."""
+    response = _call(
+        endpoint,
+        "PullImage",
+        timeout=None,
+        image=MESSAGES["ImageSpec"](image=image),
+    )
+
+    ret = {"digests": {}}
+    match = _IMAGE_REF_RE.match(response.image_ref)
+    if match:
+        ret["digests"]["sha256"] = match.group("digest")
+
+    return ret
+
+
+def list_pods(endpoint):
+    """List pods, in the same format as `crictl pods -o json`."""
+    response = _call(endpoint, "ListPodSandbox")
+    # Like `crictl`, list the most recent pods first
+    pods = sorted(response.items, key=lambda pod: pod.created_at, reverse=True)
+    return [_to_dict(pod) for pod in pods]
+
+
+def list_containers(endpoint):
+    """List all containers, in the same format as `crictl ps -a -o json`."""
+    response = _call(endpoint, "ListContainers")
+    # Like `crictl`, list the most recent containers first
+    containers = sorted(
+        response.containers, key=lambda container: container.created_at, reverse=True
+    )
+    return [_to_dict(container) for container in containers]
+
+
+def stop_pods(endpoint, pod_ids):
+    """Stop pods, returning the same output as `crictl stopp`."""
+    for pod_id in pod_ids:
+        _call(endpoint, "StopPodSandbox", pod_sandbox_id=pod_id)
+
+    return "\n".join("Stopped sandbox {}".format(pod_id) for pod_id in pod_ids)
@@ -0,0 +1,196 @@
+# coding: utf-8
+"""Utility module to read files from ISO9660 images.
+
+This is an alternative to forking :command:`isoinfo -x`: the image is mapped
+in memory and its directory tree walked directly, using the Joliet names
+when available (and the plain ISO9660 ones otherwise). Rock Ridge extensions
+are ignored.
+
+Extracted files are cached, keyed by the size and mtime of the image.
+
+See ECMA-119 (ISO9660) and the Joliet specification for details about the
+structures used here.
+"""
+
+import contextlib
+import mmap
+import os
+import struct
+import threading
+
+from salt.exceptions import CommandExecutionError
+
+
+def __virtual__():
+    return True
+
+
+SYSTEM_AREA_SECTORS = 16
+SECTOR_SIZE = 2048
+
+# Volume descriptor types
+VD_PRIMARY = 1
+VD_SUPPLEMENTARY = 2
+VD_TERMINATOR = 255
+
+VD_IDENTIFIER = b"CD001"
+JOLIET_ESCAPE_SEQUENCES = [b"%/@", b"%/C", b"%/E"]
+
+# File flags
+FLAG_DIRECTORY = 0x02
+FLAG_MULTI_EXTENT = 0x80
+
+# struct directory record (up to the file identifier length), only using
+# the little-endian part of both-endian fields
+_DIR_RECORD = struct.Struct("<BBI4xI4x7sBBB4xB")
+
+_FILES_CACHE = {}
+_FILES_CACHE_LOCK = threading.Lock()
+
+
+def _parse_records(image, extent, size, block_size, joliet):
+    """Yield the (name, flags, extent, size) of the entries of a directory."""
+    offset = extent * block_size
+    end = offset + size
+    while offset < end:
+        length = image[offset]
+        if length == 0:
+            # Records never cross sectors, the rest of this one is padding
+            offset = (offset // block_size + 1) * block_size
+            continue
+        if length < _DIR_RECORD.size:
+            raise ValueError("Malformed directory record at {}".format(offset))
+
+        (
+            _,
+            _,
+            entry_extent,
+            entry_size,
+            _,
+            flags,
+            _,
+            _,
+            name_len,
+        ) = _DIR_RECORD.unpack_from(image, offset)
+        raw_name = image[
+            offset + _DIR_RECORD.size : offset + _DIR_RECORD.size + name_len
+        ]
+        offset += length
+
+        # Skip the `.` and `..` entries
+        if raw_name in (b"\x00", b"\x01"):
+            continue
+
+        name = raw_name.decode("utf-16-be" if joliet else "ascii", "replace")
+        # Strip the version number and the trailing dot of extension-less names
+        name = name.split(";", 1)[0]
+        if not flags & FLAG_DIRECTORY:
+            name = name.rstrip(".")
+        yield name, flags, entry_extent, entry_size
+
+
+def _root_directories(image):
+    """Return the root directory records of the image, Joliet one first."""
+    roots = []
+    sector = SYSTEM_AREA_SECTORS
+    while True:
+        offset = sector * SECTOR_SIZE
+        if offset + SECTOR_SIZE > len(image):
+            raise ValueError("No volume descriptor set terminator found")
+        vd_type = image[offset]
+        if image[offset + 1 : offset + 6] != VD_IDENTIFIER:
+            raise ValueError("Not an ISO9660 image")
+        if vd_type == VD_TERMINATOR:
+            break
+
+        joliet = (
+            vd_type == VD_SUPPLEMENTARY
+            and image[offset + 88 : offset + 91] in JOLIET_ESCAPE_SEQUENCES
+        )
+        if vd_type == VD_PRIMARY or joliet:
+            (block_size,) = struct.unpack_from("<H", image, offset + 128)
+            (_, _, extent, size, _, _, _, _, _) = _DIR_RECORD.unpack_from(
+                image, offset + 156
+            )
+            root = (extent, size, block_size, joliet)
+            if joliet:
+                roots.insert(0, root)
+            else:
+                roots.append(root)
+        sector += 1
+
+    if not roots:
+        raise ValueError("No primary volume descriptor found")
+
+    return roots
+
+
+def _find_file(image, path, extent, size, block_size, joliet):
+    """Return the content of the file at `path`, `None` if not found."""
+    *dirnames, filename = [part for part in path.split("/") if part]
+
+    # Joliet names keep their case, plain ISO9660 ones are upper-case
+    def _matches(name, expected):
+        return name == expected if joliet else name.upper() == expected.upper()
+
+    for dirname in dirnames:
+        for name, flags, entry_extent, entry_size in _parse_records(
+            image, extent, size, block_size, joliet
+        ):
+            if flags & FLAG_DIRECTORY and _matches(name, dirname):
+                extent, size = entry_extent, entry_size
+                break
+        else:
+            return None
+
+    chunks = []
+    for name, flags, entry_extent, entry_size in _parse_records(
+        image, extent, size, block_size, joliet
+    ):
+        if chunks or (not flags & FLAG_DIRECTORY and _matches(name, filename)):
+            start = entry_extent * block_size
+            chunks.append(image[start : start + entry_size])
+            # Large files are split in several consecutive records
+            if not flags & FLAG_MULTI_EXTENT:
+                return b"".join(chunks)
+
+    return None
+
+
+def _read_file(iso_path, path):
+    with open(iso_path, "rb") as fd:
+        with contextlib.closing(
+            mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+        ) as image:
+            for root in _root_directories(image):
+                content = _find_file(image, path, *root)
+                if content is not None:
+                    return content
+    return None
+
+
+def read_file(iso_path, path):
+    """Return the content (as bytes) of the file at `path` in the ISO image
+    `iso_path`, or `None` if the image does not contain such a file.
+
+    Results are cached until the image size or mtime changes.
+    """
+    try:
+        stat = os.stat(iso_path)
+        key = (os.path.realpath(iso_path), path)
+        stamp = (stat.st_size, stat.st_mtime_ns)
+        with _FILES_CACHE_LOCK:
+            cached = _FILES_CACHE.get(key)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+
+        content = _read_file(iso_path, path)
+    except (OSError, ValueError, IndexError, struct.error) as exc:
+        raise CommandExecutionError(
+            "Failed to read {} from ISO {}: {}".format(path, iso_path, exc)
+        ) from exc
+
+    with _FILES_CACHE_LOCK:
+        _FILES_CACHE[key] = (stamp, content)
+
+    return content
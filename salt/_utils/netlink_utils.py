@@ -0,0 +1,237 @@
+# coding: utf-8
+"""Utility module to query the Linux kernel through netlink.
+
+This is an alternative to forking :command:`ip` or :command:`ss` and parsing
+their output: routes are dumped through `rtnetlink`, and listening sockets
+through `sock_diag`, using plain sockets from the standard library.
+
+See `rtnetlink(7)`, `sock_diag(7)` and `/usr/include/linux/*.h` for details
+about the structures used here.
+"""
+
+import os
+import socket
+import struct
+
+
+def __virtual__():
+    if not hasattr(socket, "AF_NETLINK"):
+        return False, "Netlink is only available on Linux"
+
+    return True
+
+
+NETLINK_ROUTE = 0
+NETLINK_SOCK_DIAG = 4
+
+# Message types
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+RTM_GETROUTE = 26
+SOCK_DIAG_BY_FAMILY = 20
+
+# Message flags
+NLM_F_REQUEST = 0x1
+NLM_F_DUMP = 0x300
+
+# Route attributes
+RTA_DST = 1
+RTA_OIF = 4
+RTA_GATEWAY = 5
+RTA_TABLE = 15
+
+RT_TABLE_MAIN = 254
+
+# Route types
+ROUTE_TYPES = {
+    0: "unspec",
+    1: "unicast",
+    2: "local",
+    3: "broadcast",
+    4: "anycast",
+    5: "multicast",
+    6: "blackhole",
+    7: "unreachable",
+    8: "prohibit",
+    9: "throw",
+    10: "nat",
+    11: "xresolve",
+}
+
+TCP_LISTEN = 10
+
+# struct nlmsghdr
+_NLMSGHDR = struct.Struct("=LHHLL")
+# struct rtmsg
+_RTMSG = struct.Struct("=BBBBBBBBI")
+# struct rtattr
+_RTATTR = struct.Struct("=HH")
+# struct inet_diag_req_v2 (including its struct inet_diag_sockid)
+_INET_DIAG_REQ = struct.Struct("=BBBBI4s16s16sI8s")
+# struct inet_diag_msg (including its struct inet_diag_sockid)
+_INET_DIAG_MSG = struct.Struct("=BBBB2s2s16s16sI8sIIIII")
+
+_RECV_SIZE = 65536
+
+
+def _align(length):
+    return (length + 3) & ~3
+
+
+def _dump(protocol, msg_type, payload):
+    """Send a dump request and return the payloads of all the replies."""
+    with socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, protocol) as sock:
+        sock.bind((0, 0))
+        header = _NLMSGHDR.pack(
+            _NLMSGHDR.size + len(payload),
+            msg_type,
+            NLM_F_REQUEST | NLM_F_DUMP,
+            1,
+            0,
+        )
+        sock.sendall(header + payload)
+
+        messages = []
+        while True:
+            data = sock.recv(_RECV_SIZE)
+            offset = 0
+            while offset + _NLMSGHDR.size <= len(data):
+                length, reply_type, _, _, _ = _NLMSGHDR.unpack_from(data, offset)
+                if length < _NLMSGHDR.size:
+                    raise OSError("Malformed netlink message")
+                body = data[offset + _NLMSGHDR.size : offset + length]
+                if reply_type == NLMSG_DONE:
+                    return messages
+                if reply_type == NLMSG_ERROR:
+                    (error,) = struct.unpack_from("=i", body)
+                    if error:
+                        raise OSError(-error, os.strerror(-error))
+                else:
+                    messages.append(body)
+                offset += _align(length)
+
+
+def _parse_attributes(data, offset):
+    attributes = {}
+    while offset + _RTATTR.size <= len(data):
+        length, attr_type = _RTATTR.unpack_from(data, offset)
+        if length < _RTATTR.size:
+            break
+        attributes[attr_type] = data[offset + _RTATTR.size : offset + length]
+        offset += _align(length)
+    return attributes
+
+
+def _interface_name(index):
+    try:
+        return socket.if_indextoname(index)
+    except OSError:
+        return ""
+
+
+def dump_routes(family=socket.AF_INET, table=RT_TABLE_MAIN):
+    """Return the routes of a routing table, as `ip route show table` does.
+
+    Each route is a dict with its `type` (e.g. "unicast" or "blackhole"),
+    `destination` address and `prefixlen`, `gateway` (None if the route is
+    direct) and output `interface` name.
+    """
+    addr_len = 4 if family == socket.AF_INET else 16
+    routes = []
+    for body in _dump(NETLINK_ROUTE, RTM_GETROUTE, _RTMSG.pack(family, *[0] * 8)):
+        (
+            route_family,
+            dst_len,
+            _,
+            _,
+            route_table,
+            _,
+            _,
+            route_type,
+            _,
+        ) = _RTMSG.unpack_from(body)
+        attributes = _parse_attributes(body, _RTMSG.size)
+        if RTA_TABLE in attributes:
+            (route_table,) = struct.unpack("=I", attributes[RTA_TABLE][:4])
+        if route_family != family or route_table != table:
+            continue
+
+        destination = attributes.get(RTA_DST, bytes(addr_len))
+        gateway = attributes.get(RTA_GATEWAY)
+        oif = attributes.get(RTA_OIF)
+        routes.append(
+            {
+                "type": ROUTE_TYPES.get(route_type, str(route_type)),
+                "destination": socket.inet_ntop(family, destination),
+                "prefixlen": dst_len,
+                "gateway": socket.inet_ntop(family, gateway) if gateway else None,
+                "interface": _interface_name(struct.unpack("=I", oif[:4])[0])
+                if oif
+                else "",
+            }
+        )
+    return routes
+
+
+def dump_listening_sockets(families=(socket.AF_INET, socket.AF_INET6)):
+    """Return the listening TCP sockets, as `ss -ltn` does.
+
+    Each socket is a dict with its `family`, local `ip` and `port`, and its
+    `inode` (see `socket_owners`).
+    """
+    sockets = []
+    for family in families:
+        request = _INET_DIAG_REQ.pack(
+            family,
+            socket.IPPROTO_TCP,
+            0,
+            0,
+            1 << TCP_LISTEN,
+            bytes(4),
+            bytes(16),
+            bytes(16),
+            0,
+            bytes(8),
+        )
+        for body in _dump(NETLINK_SOCK_DIAG, SOCK_DIAG_BY_FAMILY, request):
+            fields = _INET_DIAG_MSG.unpack_from(body)
+            msg_family, sport, src, inode = fields[0], fields[4], fields[6], fields[14]
+            addr_len = 4 if msg_family == socket.AF_INET else 16
+            sockets.append(
+                {
+                    "family": msg_family,
+                    "ip": socket.inet_ntop(msg_family, src[:addr_len]),
+                    "port": struct.unpack("!H", sport)[0],
+                    "inode": inode,
+                }
+            )
+    return sockets
+
+
+def socket_owners(inodes, proc="/proc"):
+    """Map socket inodes to the PID of the (first) process holding them.
+
+    Processes are scanned in PID order, and the scan stops as soon as all the
+    sockets were found. Sockets owned by processes which cannot be inspected
+    are not part of the result.
+    """
+    wanted = {"socket:[{}]".format(inode): inode for inode in inodes}
+    owners = {}
+    pids = sorted(int(entry) for entry in os.listdir(proc) if entry.isdigit())
+    for pid in pids:
+        fd_dir = os.path.join(proc, str(pid), "fd")
+        try:
+            fds = os.listdir(fd_dir)
+        except OSError:
+            continue
+        for fd in fds:
+            try:
+                target = os.readlink(os.path.join(fd_dir, fd))
+            except OSError:
+                continue
+            inode = wanted.pop(target, None)
+            if inode is not None:
+                owners[inode] = pid
+        if not wanted:
+            break
+    return owners
@@ -6,6 +6,9 @@ import contextlib
 import ctypes
 import ctypes.util
 import functools
+import os
+import threading
+import time
 
 
 __virtualname__ = "metalk8s_volumes"
@@ -361,6 +364,63 @@ def get_blkid_probe(
         free_probe(c_probe)
 
 
+# Probe results, keyed by device (real path, device number, modification time
+# and size) and probe configuration
+_PROBE_CACHE = {}
+_PROBE_CACHE_LOCK = threading.Lock()
+
+
+def _probe_cache_key(filepath, config):
+    realpath = os.path.realpath(filepath)
+    stat = os.stat(realpath)
+    return (realpath, stat.st_rdev, stat.st_mtime_ns, stat.st_size, config)
+
+
+def probe_device(
+    filepath,
+    use_superblocks=True,
+    superblocks_flags=SuperblockFlags.DEFAULT,
+    use_partitions=False,
+    partitions_flags=0,
+    refresh=False,
+):
+    """Probe the specified device and return the information gathered.
+
+    Results are cached until the device changes (as seen from its `stat`)
+    or the cache is invalidated with `invalidate_probe_cache`, which must be
+    done after writing to the device: formatting a block device does not
+    update its device node. Use `refresh` to always probe the device.
+    """
+    config = ProbeConfig(
+        use_superblocks, superblocks_flags, use_partitions, partitions_flags
+    )
+    try:
+        key = _probe_cache_key(filepath, config)
+    except OSError:
+        # Let libblkid report the error
+        key = None
+    if not refresh and key is not None:
+        with _PROBE_CACHE_LOCK:
+            info = _PROBE_CACHE.get(key)
+        if info is not None:
+            return info
+    with get_blkid_probe(filepath, *config) as probe:
+        info = probe.probe()
+    if key is not None:
+        with _PROBE_CACHE_LOCK:
+            _PROBE_CACHE[key] = info
+    return info
+
+
+def invalidate_probe_cache(filepath=None):
+    """Forget the cached probe results for a device (or for all devices)."""
+    realpath = None if filepath is None else os.path.realpath(filepath)
+    with _PROBE_CACHE_LOCK:
+        for key in list(_PROBE_CACHE):
+            if realpath is None or key[0] == realpath:
+                del _PROBE_CACHE[key]
+
+
 def get_superblock_flags(*args):
     return _get_flags(SuperblockFlags, "superblocks", SuperblockFlags.DEFAULT, *args)
 
@@ -371,3 +431,114 @@ def get_partition_flags(*args):
 
 # }}}
 # }}}
+# Device inventory {{{
+
+# Rather than resolving devices one by one (and spawning processes to do so),
+# index all the block devices of the host at once, from the kernel view
+# (`/sys/class/block`) and the udev symlinks (`/dev/disk/by-*`).
+
+SYS_CLASS_BLOCK = "/sys/class/block"
+DEV_DISK_BY_UUID = "/dev/disk/by-uuid"
+DEV_DISK_BY_PARTUUID = "/dev/disk/by-partuuid"
+
+# Maximum age (in seconds) of the device inventory
+INVENTORY_TTL = 60
+
+_INVENTORY = {}
+_INVENTORY_LOCK = threading.Lock()
+
+
+def _read_sys_file(*parts):
+    try:
+        with open(os.path.join(*parts)) as fd:
+            return fd.read().strip()
+    except OSError:
+        return None
+
+
+def _list_dir(path):
+    try:
+        return sorted(os.listdir(path))
+    except OSError:
+        return []
+
+
+def _index_links(directory):
+    """Map the symlinks of `directory` to the name of the device they target."""
+    return {
+        link: os.path.basename(os.path.realpath(os.path.join(directory, link)))
+        for link in _list_dir(directory)
+    }
+
+
+def _build_device_inventory():
+    devices = {}
+    for name in _list_dir(SYS_CLASS_BLOCK):
+        sys_path = os.path.realpath(os.path.join(SYS_CLASS_BLOCK, name))
+        size = _read_sys_file(sys_path, "size")
+        partition = _read_sys_file(sys_path, "partition")
+        dm_uuid = _read_sys_file(sys_path, "dm", "uuid")
+        devices[name] = {
+            "name": name,
+            # Sizes are always expressed in 512-byte sectors in sysfs.
+            "size": int(size) * 512 if size else None,
+            "partition": partition,
+            "parent": os.path.basename(os.path.dirname(sys_path))
+            if partition
+            else None,
+            "dm_name": _read_sys_file(sys_path, "dm", "name"),
+            "lvm_path": "/dev/disk/by-id/dm-uuid-{}".format(dm_uuid)
+            if dm_uuid and dm_uuid.startswith("LVM-")
+            else None,
+            "holders": _list_dir(os.path.join(sys_path, "holders")),
+        }
+    return {
+        "devices": devices,
+        "by_uuid": _index_links(DEV_DISK_BY_UUID),
+        "by_partuuid": _index_links(DEV_DISK_BY_PARTUUID),
+    }
+
+
+def get_device_inventory(refresh=False):
+    """Return an index of the block devices of the host.
+
+    The index holds the `devices` (by name, with their size in bytes,
+    partition number and parent disk, device-mapper name, persistent LVM path
+    and holders), and the device names by filesystem UUID (`by_uuid`) and
+    partition UUID (`by_partuuid`).
+
+    It is built once and reused until it expires or is invalidated with
+    `invalidate_device_inventory`, use `refresh` to rebuild it.
+    """
+    with _INVENTORY_LOCK:
+        if (
+            refresh
+            or not _INVENTORY
+            or time.time() - _INVENTORY["timestamp"] > INVENTORY_TTL
+        ):
+            # Never update an inventory in place, it may be in use
+            _INVENTORY["inventory"] = _build_device_inventory()
+            _INVENTORY["timestamp"] = time.time()
+        return _INVENTORY["inventory"]
+
+
+def invalidate_device_inventory():
+    """Forget the device inventory, so that it is rebuilt on next use."""
+    with _INVENTORY_LOCK:
+        _INVENTORY.clear()
+
+
+def lookup_device(path, refresh=False):
+    """Return the inventory entry of the device at `path` (None if unknown)."""
+    inventory = get_device_inventory(refresh=refresh)
+    directory, link = os.path.split(path)
+    if directory == DEV_DISK_BY_UUID:
+        name = inventory["by_uuid"].get(link)
+    elif directory == DEV_DISK_BY_PARTUUID:
+        name = inventory["by_partuuid"].get(link)
+    else:
+        name = os.path.basename(os.path.realpath(path))
+    return inventory["devices"].get(name)
+
+
+# }}}
@@ -0,0 +1,109 @@
+# coding: utf-8
+"""Utility functions to wait for a condition to be reached.
+
+Instead of sleeping for a fixed interval between two checks, the condition is
+checked again after exponentially growing delays (with some random jitter, so
+that concurrent waiters do not synchronize), until an overall deadline.
+
+When an event source is available (e.g. a Kubernetes watch started from the
+`resourceVersion` of the last observed object), the condition is checked
+again as soon as an event is received, falling back to polling if the watch
+fails.
+"""
+
+import logging
+import random
+import time
+
+log = logging.getLogger(__name__)
+
+# Default backoff parameters (in seconds)
+INITIAL_DELAY = 0.2
+MAXIMUM_DELAY = 5
+FACTOR = 2
+JITTER = 0.1
+
+
+def __virtual__():
+    return True
+
+
+def backoff(initial=INITIAL_DELAY, maximum=MAXIMUM_DELAY, factor=FACTOR, jitter=JITTER):
+    """Generate exponentially growing delays, capped to `maximum`.
+
+    Each delay is randomly spread by +/- `jitter` (as a ratio of the delay).
+    """
+    delay = min(initial, maximum)
+    while True:
+        yield max(0, delay * (1 + random.uniform(-jitter, jitter)))
+        delay = min(delay * factor, maximum)
+
+
+def _wait_event(watch, timeout):
+    # Consume the first event of the watch (if any), then stop it
+    events = iter(watch(timeout=max(1, int(timeout))))
+    try:
+        return next(events, None)
+    finally:
+        close = getattr(events, "close", None)
+        if close is not None:
+            close()
+
+
+def wait_for(
+    condition,
+    timeout=None,
+    attempts=None,
+    watch=None,
+    initial=INITIAL_DELAY,
+    maximum=MAXIMUM_DELAY,
+    factor=FACTOR,
+    jitter=JITTER,
+):
+    """Wait until `condition()` returns a truthy value.
+
+    The condition is checked right away, then again after each backoff delay,
+    until it is reached, the `timeout` deadline (in seconds) expires or
+    `attempts` checks were made (no limit if `None`).
+
+    If `watch` is provided, it must be a callable taking a `timeout` keyword
+    argument and returning an iterable of events: instead of sleeping, the
+    condition is checked again as soon as an event is received (or when the
+    watch times out). Any error raised by the watch makes the wait fall back
+    to polling with backoff.
+
+    Returns:
+        tuple: the last value returned by `condition` and the number of
+            checks made
+    """
+    deadline = None if timeout is None else time.time() + timeout
+    delays = backoff(initial=initial, maximum=maximum, factor=factor, jitter=jitter)
+    count = 0
+
+    while True:
+        count += 1
+        result = condition()
+        if result or (attempts is not None and count >= attempts):
+            return result, count
+
+        delay = next(delays)
+        if deadline is not None:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return result, count
+            delay = min(delay, remaining)
+
+        if watch is not None:
+            start = time.time()
+            try:
+                event = _wait_event(watch, maximum if deadline is None else remaining)
+            except Exception as exc:  # pylint: disable=broad-except
+                log.debug("Watch failed, falling back to polling: %s", exc)
+                watch = None
+            else:
+                if event is None:
+                    # Do not spin if the watch ends early without any event
+                    time.sleep(max(0, delay - (time.time() - start)))
+                continue
+
+        time.sleep(delay)
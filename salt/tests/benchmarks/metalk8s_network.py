@@ -0,0 +1,81 @@
+"""Micro-benchmark of the `metalk8s_network` netlink backed functions.
+
+Compare `routes` and `get_listening_processes`, reading from netlink, with
+their fallback implementations (forking `ip` and using `psutil`), checking
+that both return the same result.
+
+Run it on a Linux host, from the `salt/` directory:
+
+    python -m tests.benchmarks.metalk8s_network [--number 100]
+"""
+
+import argparse
+import ipaddress
+import subprocess
+import timeit
+from unittest.mock import patch
+
+from _modules import metalk8s_network
+from _utils import netlink_utils
+
+
+def _cmd_run(cmd):
+    # Much lighter than the Salt `cmd.run`, so the comparison is conservative
+    return subprocess.run(
+        cmd.split(),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        check=True,
+        universal_newlines=True,
+    ).stdout
+
+
+def _convert_cidr(cidr):
+    # Same as the Salt `network.convert_cidr`, without its loader dependencies
+    network = ipaddress.ip_network(cidr, strict=False)
+    return {
+        "network": str(network.network_address),
+        "netmask": str(network.netmask),
+        "broadcast": str(network.broadcast_address),
+    }
+
+
+SALT = {"cmd.run": _cmd_run, "network.convert_cidr": _convert_cidr}
+
+NETLINK_UTILS = {
+    "netlink_utils.{}".format(func): getattr(netlink_utils, func)
+    for func in ["dump_routes", "dump_listening_sockets", "socket_owners"]
+}
+
+
+def _bench(func, utils, number):
+    with patch.object(metalk8s_network, "__salt__", SALT, create=True), patch.object(
+        metalk8s_network, "__utils__", utils, create=True
+    ):
+        result = func()
+        duration = timeit.timeit(func, number=number)
+    return result, duration / number
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=100, help="runs per function")
+    args = parser.parse_args()
+
+    for func in [metalk8s_network.routes, metalk8s_network.get_listening_processes]:
+        netlink_result, netlink_time = _bench(func, NETLINK_UTILS, args.number)
+        fallback_result, fallback_time = _bench(func, {}, args.number)
+        print(
+            "{:<24} netlink: {:8.3f} ms  fallback: {:8.3f} ms  "
+            "speedup: x{:.1f}  same result: {}".format(
+                func.__name__,
+                netlink_time * 1000,
+                fallback_time * 1000,
+                fallback_time / netlink_time,
+                netlink_result == fallback_result,
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
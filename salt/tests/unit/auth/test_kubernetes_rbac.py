@@ -0,0 +1,228 @@
+import os
+import shutil
+import tempfile
+import time
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+import salt.cache
+import salt.config
+
+from _auth import kubernetes_rbac
+
+from tests.unit import mixins
+from tests.unit import utils
+
+
+class KubernetesRbacTestCase(TestCase, mixins.LoaderModuleMockMixin):
+    """
+    TestCase for `kubernetes_rbac` eauth module
+    """
+
+    loader_module = kubernetes_rbac
+
+    def loader_module_globals(self):
+        self.cachedir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cachedir)
+
+        opts = salt.config.master_config(None)
+        opts["cachedir"] = self.cachedir
+        opts["external_auth"] = {
+            "kubernetes_rbac": {
+                "^kubeconfig": "/my/kube/config",
+                "^cache_ttl": 10,
+                "^cache_size": 2,
+            }
+        }
+
+        return {"__opts__": opts}
+
+    def setUp(self):
+        super().setUp()
+
+        kubernetes_rbac.clear_cache()
+        self.addCleanup(kubernetes_rbac.clear_cache)
+        patcher = patch.dict(
+            kubernetes_rbac._CLIENT, {"key": None, "client": None, "user_client": None}
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.load_kube_config_mock = MagicMock()
+        self.api_client_mock = MagicMock(side_effect=lambda **_: MagicMock())
+        self.getmtime_mock = MagicMock(return_value=42.0)
+
+        def _token_review(body):
+            ret = MagicMock()
+            ret.status.error = None
+            ret.status.authenticated = True
+            ret.status.user.username = body.spec.token.split(":")[0]
+            return ret
+
+        self.authn_api_mock = MagicMock()
+        self.authn_api_mock.return_value.create_token_review.side_effect = _token_review
+
+        for target, mock in [
+            ("kubernetes.config.load_kube_config", self.load_kube_config_mock),
+            ("kubernetes.client.ApiClient", self.api_client_mock),
+            ("kubernetes.client.AuthenticationV1Api", self.authn_api_mock),
+            ("os.path.getmtime", self.getmtime_mock),
+        ]:
+            patcher = patch(target, mock)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _token_reviews(self):
+        return self.authn_api_mock.return_value.create_token_review.call_count
+
+    def _user_client(self):
+        return kubernetes_rbac._CLIENT["user_client"]
+
+    def test_auth_cache_hit(self):
+        """
+        Tests that a TokenReview decision is reused within the cache TTL
+        """
+        with utils.fake_clock():
+            self.assertTrue(kubernetes_rbac.auth("alice", token="alice:token"))
+            time.sleep(5)
+            self.assertTrue(kubernetes_rbac.auth("alice", token="alice:token"))
+
+        self.assertEqual(self._token_reviews(), 1)
+        self.assertEqual(
+            kubernetes_rbac.cache_stats(), {"hits": 1, "misses": 1, "size": 1}
+        )
+
+    def test_auth_cache_expiry(self):
+        """
+        Tests that a TokenReview decision is not reused after the cache TTL
+        """
+        with utils.fake_clock():
+            kubernetes_rbac.auth("alice", token="alice:token")
+            time.sleep(10)
+            kubernetes_rbac.auth("alice", token="alice:token")
+
+        self.assertEqual(self._token_reviews(), 2)
+
+    def test_auth_cache_mismatch(self):
+        """
+        Tests that decisions are not shared between users or tokens
+        """
+        self.assertTrue(kubernetes_rbac.auth("alice", token="alice:token"))
+        self.assertFalse(kubernetes_rbac.auth("bob", token="alice:token"))
+        self.assertTrue(kubernetes_rbac.auth("alice", token="alice:other"))
+
+        self.assertEqual(self._token_reviews(), 3)
+
+    def test_auth_cache_eviction(self):
+        """
+        Tests that the least recently used decision is evicted once the cache
+        holds `^cache_size` decisions
+        """
+        for user in ["alice", "bob", "alice", "carol"]:
+            kubernetes_rbac.auth(user, token="{}:token".format(user))
+
+        self.assertEqual(self._token_reviews(), 3)
+        self.assertEqual(kubernetes_rbac.cache_stats()["size"], 2)
+
+        # "bob" was evicted, "alice" was used more recently
+        kubernetes_rbac.auth("alice", token="alice:token")
+        self.assertEqual(self._token_reviews(), 3)
+        kubernetes_rbac.auth("bob", token="bob:token")
+        self.assertEqual(self._token_reviews(), 4)
+
+    def test_groups(self):
+        """
+        Tests that access reviews are made with the user token, through the
+        shared client without credentials
+        """
+        kubernetes_rbac.auth("alice", token="alice:token")
+        self._user_client().call_api.return_value.status.allowed = True
+
+        self.assertEqual(
+            kubernetes_rbac.groups("alice", token="alice:token"), ["node-admins"]
+        )
+
+        call_api_mock = self._user_client().call_api
+        call_api_mock.assert_called_once()
+        self.assertEqual(
+            call_api_mock.call_args[1]["header_params"]["Authorization"],
+            "Bearer alice:token",
+        )
+        self.assertEqual(call_api_mock.call_args[1]["auth_settings"], [])
+
+        user_configuration = self.api_client_mock.call_args_list[1][1]["configuration"]
+        self.assertIsNone(user_configuration.cert_file)
+        self.assertIsNone(user_configuration.key_file)
+        self.assertEqual(user_configuration.api_key, {})
+
+        # Both clients are shared between requests
+        self.assertEqual(self.api_client_mock.call_count, 2)
+
+    def test_groups_cache(self):
+        """
+        Tests that groups decisions are cached separately from token ones
+        """
+        kubernetes_rbac.auth("alice", token="alice:token")
+        self._user_client().call_api.return_value.status.allowed = False
+
+        for _ in range(2):
+            self.assertEqual(kubernetes_rbac.groups("alice", token="alice:token"), [])
+
+        self._user_client().call_api.assert_called_once()
+        self.assertEqual(self._token_reviews(), 1)
+        self.assertEqual(
+            kubernetes_rbac.cache_stats(), {"hits": 1, "misses": 2, "size": 2}
+        )
+
+    def test_kubeconfig_change(self):
+        """
+        Tests that the clients are rebuilt once the kubeconfig file changed
+        """
+        kubernetes_rbac.auth("alice", token="alice:token")
+        client = kubernetes_rbac._CLIENT["client"]
+        kubernetes_rbac.auth("bob", token="bob:token")
+
+        self.assertIs(kubernetes_rbac._CLIENT["client"], client)
+        self.load_kube_config_mock.assert_called_once()
+
+        self.getmtime_mock.return_value = 43.0
+        kubernetes_rbac.auth("carol", token="carol:token")
+
+        self.assertIsNot(kubernetes_rbac._CLIENT["client"], client)
+        self.assertEqual(self.load_kube_config_mock.call_count, 2)
+        self.assertEqual(self.api_client_mock.call_count, 4)
+
+    def test_missing_kubeconfig(self):
+        """
+        Tests that no request is authenticated without a kubeconfig
+        """
+        with patch.dict(
+            kubernetes_rbac.__opts__, {"external_auth": {"kubernetes_rbac": {}}}
+        ):
+            self.assertFalse(kubernetes_rbac.auth("alice", token="alice:token"))
+            self.assertEqual(kubernetes_rbac.groups("alice", token="alice:token"), [])
+
+        self.api_client_mock.assert_not_called()
+
+    def test_cache_stats_stored(self):
+        """
+        Tests that the cache statistics are published in the master cache,
+        at most every `STATS_STORE_INTERVAL` seconds
+        """
+        cache = salt.cache.Cache(kubernetes_rbac.__opts__)
+        key = "stats-{}".format(os.getpid())
+
+        with utils.fake_clock(start=1000):
+            kubernetes_rbac.auth("alice", token="alice:token")
+            kubernetes_rbac.auth("alice", token="alice:token")
+            self.assertEqual(
+                cache.fetch("kubernetes_rbac", key),
+                {"hits": 0, "misses": 1, "size": 1, "time": 1000},
+            )
+
+            time.sleep(30)
+            kubernetes_rbac.auth("alice", token="alice:token")
+            self.assertEqual(
+                cache.fetch("kubernetes_rbac", key),
+                {"hits": 1, "misses": 2, "size": 1, "time": 1030},
+            )
@@ -0,0 +1,92 @@
+"""Fake CRI runtime for use in unit tests.
+
+Serves the subset of the CRI gRPC API implemented by `_utils/cri_utils.py`
+over a local unix socket, from an in-memory list of images, pods and
+containers.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import os.path
+import tempfile
+
+import grpc
+
+from _utils import cri_utils
+
+
+class FakeCRIServer:
+    """Fake CRI runtime and image services, usable as a context manager.
+
+    Every received call is recorded, as a (method, request) tuple, in `calls`.
+    """
+
+    def __init__(self, images=None, pods=None, containers=None, pulled_ref=""):
+        messages = cri_utils.MESSAGES
+        self.images = [messages["Image"](**image) for image in images or []]
+        self.pods = [messages["PodSandbox"](**pod) for pod in pods or []]
+        self.containers = [
+            messages["Container"](**container) for container in containers or []
+        ]
+        self.pulled_ref = pulled_ref
+        self.stopped = []
+        self.calls = []
+
+        self._tmpdir = None
+        self._server = None
+        self.endpoint = None
+
+    def _handler(self, method):
+        _, request_name, response_name = cri_utils._METHODS[method]
+        messages = cri_utils.MESSAGES
+
+        def handle(request, context):
+            self.calls.append((method, request))
+            if method == "ListImages":
+                return messages[response_name](images=self.images)
+            if method == "PullImage":
+                if not self.pulled_ref:
+                    context.abort(grpc.StatusCode.NOT_FOUND, "image not found")
+                return messages[response_name](image_ref=self.pulled_ref)
+            if method == "ListPodSandbox":
+                return messages[response_name](items=self.pods)
+            if method == "StopPodSandbox":
+                self.stopped.append(request.pod_sandbox_id)
+                return messages[response_name]()
+            return messages[response_name](containers=self.containers)
+
+        return grpc.unary_unary_rpc_method_handler(
+            handle,
+            request_deserializer=messages[request_name].FromString,
+            response_serializer=messages[response_name].SerializeToString,
+        )
+
+    def __enter__(self):
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.endpoint = "unix://{}".format(
+            os.path.join(self._tmpdir.name, "containerd.sock")
+        )
+
+        self._server = grpc.server(ThreadPoolExecutor(max_workers=2))
+        for service in ["ImageService", "RuntimeService"]:
+            self._server.add_generic_rpc_handlers(
+                [
+                    grpc.method_handlers_generic_handler(
+                        "{}.{}".format(cri_utils.PACKAGE, service),
+                        {
+                            method: self._handler(method)
+                            for method, (method_service, _, _) in (
+                                cri_utils._METHODS.items()
+                            )
+                            if method_service == service
+                        },
+                    )
+                ]
+            )
+        self._server.add_insecure_port(self.endpoint)
+        self._server.start()
+
+        return self
+
+    def __exit__(self, *exc_info):
+        cri_utils.close_channels()
+        self._server.stop(None)
+        self._tmpdir.cleanup()
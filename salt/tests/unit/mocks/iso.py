@@ -0,0 +1,87 @@
+"""Build ISO9660 images for use in unit tests.
+
+Images only have a root directory, with both plain ISO9660 (upper-cased) and
+Joliet names, as `mkisofs -joliet` would generate.
+"""
+import struct
+
+SECTOR_SIZE = 2048
+
+# Sectors of the volume descriptors and root directories
+PRIMARY_VD, JOLIET_VD, TERMINATOR_VD, PRIMARY_ROOT, JOLIET_ROOT = range(16, 21)
+FIRST_FILE_SECTOR = 21
+
+
+def _both16(value):
+    return struct.pack("<H", value) + struct.pack(">H", value)
+
+
+def _both32(value):
+    return struct.pack("<I", value) + struct.pack(">I", value)
+
+
+def _sectors(size):
+    return max(1, -(-size // SECTOR_SIZE))
+
+
+def _dir_record(identifier, extent, size, flags=0):
+    record = (
+        b"\x00\x00"
+        + _both32(extent)
+        + _both32(size)
+        + bytes(7)
+        + bytes([flags, 0, 0])
+        + _both16(1)
+        + bytes([len(identifier)])
+        + identifier
+    )
+    if len(record) % 2:
+        record += b"\x00"
+    return bytes([len(record)]) + record[1:]
+
+
+def _volume_descriptor(vd_type, root_sector, escape_sequence=b""):
+    descriptor = bytearray(SECTOR_SIZE)
+    descriptor[0:7] = bytes([vd_type]) + b"CD001\x01"
+    if vd_type != 255:
+        descriptor[88 : 88 + len(escape_sequence)] = escape_sequence
+        descriptor[128:132] = _both16(SECTOR_SIZE)
+        descriptor[156:190] = _dir_record(b"\x00", root_sector, SECTOR_SIZE, 0x02)
+    return bytes(descriptor)
+
+
+def _root_directory(root_sector, files, encode):
+    records = _dir_record(b"\x00", root_sector, SECTOR_SIZE, 0x02)
+    records += _dir_record(b"\x01", root_sector, SECTOR_SIZE, 0x02)
+    for name, (sector, content) in files.items():
+        records += _dir_record(encode(name + ";1"), sector, len(content))
+    assert len(records) <= SECTOR_SIZE, "Too many files for a single sector"
+    return records.ljust(SECTOR_SIZE, b"\x00")
+
+
+def build_iso(path, files):
+    """Write an ISO image at `path`, containing `files` (a dict of file name
+    to content, as str or bytes) in its root directory."""
+    sector = FIRST_FILE_SECTOR
+    placed = {}
+    for name, content in files.items():
+        if isinstance(content, str):
+            content = content.encode()
+        placed[name] = (sector, content)
+        sector += _sectors(len(content))
+
+    data = bytearray(bytes(SECTOR_SIZE * 16))
+    data += _volume_descriptor(1, PRIMARY_ROOT)
+    data += _volume_descriptor(2, JOLIET_ROOT, b"%/E")
+    data += _volume_descriptor(255, 0)
+    data += _root_directory(
+        PRIMARY_ROOT,
+        {name.upper(): placed[name] for name in placed},
+        lambda name: name.encode("ascii"),
+    )
+    data += _root_directory(JOLIET_ROOT, placed, lambda name: name.encode("utf-16-be"))
+    for _, content in placed.values():
+        data += content.ljust(_sectors(len(content)) * SECTOR_SIZE, b"\x00")
+
+    with open(path, "wb") as fd:
+        fd.write(data)
@@ -6,6 +6,7 @@ arbitrary problems for specific test needs.
 """
 import contextlib
 import copy
+import time
 from unittest.mock import MagicMock, patch
 
 from salt.exceptions import CommandExecutionError
@@ -132,6 +133,10 @@ class KubernetesAPIMock:
         # interacting with the real K8s API
         self.resources = resources or {}
 
+        # Results of the lists made with `with_resource_version`, to start
+        # watches from, indexed by resource version
+        self.snapshots = {}
+
     def seed(self, database=None):
         self.api.database = copy.deepcopy(database or {})
 
@@ -165,9 +170,20 @@ class KubernetesAPIMock:
         return res
 
     def list_objects(
-        self, kind, apiVersion, all_namespaces=False, field_selector=None, **kwargs
+        self,
+        kind,
+        apiVersion,
+        all_namespaces=False,
+        field_selector=None,
+        with_resource_version=False,
+        **kwargs
     ):
-        resource = self.get_resource(kind, apiVersion)
+        try:
+            resource = self.get_resource(kind, apiVersion)
+        except ValueError as exc:
+            raise CommandExecutionError(
+                "Kind '{}' from apiVersion '{}' is unknown".format(kind, apiVersion)
+            ) from exc
 
         # If namespace isn't in kwargs, then all members of the matching
         # resource (after other filters were applied) will get returned
@@ -186,8 +202,55 @@ class KubernetesAPIMock:
         print(
             "Called get_object %s/%s kwargs=%r - %r" % (apiVersion, kind, kwargs, res)
         )
+        for item in res:
+            if "raiseError" in item:
+                raise CommandExecutionError(item["raiseError"])
+        if with_resource_version:
+            resource_version = str(len(self.snapshots) + 1)
+            self.snapshots[resource_version] = copy.deepcopy(res)
+            return res, resource_version
         return res
 
+    def watch_objects(
+        self, kind, apiVersion, timeout=None, resource_version=None, **kwargs
+    ):
+        """Naive re-implem, only reporting DELETED events.
+
+        The database is checked every second, relying on a mocked `time.sleep`
+        (see `TimedEventsMock`) to process events. If a `resource_version` is
+        provided, the objects deleted since the related list are reported.
+        """
+        if resource_version is not None:
+            objects = self.snapshots[resource_version]
+        else:
+            objects = self.list_objects(kind, apiVersion, **kwargs)
+        known = {obj["metadata"]["uid"]: obj for obj in objects}
+        print(
+            "Called watch_objects %s/%s timeout=%r resource_version=%r kwargs=%r"
+            % (apiVersion, kind, timeout, resource_version, kwargs)
+        )
+
+        # Report deletions which happened since the resource version
+        current = {
+            obj["metadata"]["uid"]: obj
+            for obj in self.list_objects(kind, apiVersion, **kwargs)
+        }
+        for uid, obj in known.items():
+            if uid not in current:
+                yield {"type": "DELETED", "object": obj}
+        known = current
+
+        for _ in range(timeout or 1):
+            time.sleep(1)
+            current = {
+                obj["metadata"]["uid"]: obj
+                for obj in self.list_objects(kind, apiVersion, **kwargs)
+            }
+            for uid, obj in known.items():
+                if uid not in current:
+                    yield {"type": "DELETED", "object": obj}
+            known = current
+
 
 class TimedEventsMock:
     """Store timed events to affect an APIMock and mock the `time` module."""
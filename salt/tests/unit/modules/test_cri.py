@@ -9,10 +9,13 @@ from parameterized import parameterized
 from salt.exceptions import CommandExecutionError
 
 from _modules import cri
+from _utils import cri_utils
+from _utils import wait_utils
 
 from tests.unit.log_utils import capture_logs, check_captured_logs
 from tests.unit import mixins
 from tests.unit import utils
+from tests.unit.mocks.cri import FakeCRIServer
 
 
 YAML_TESTS_FILE = os.path.join(
@@ -74,6 +77,41 @@ COMPONENT_LIST = [
     }
 ]
 
+CONTAINERS_LIST = [
+    {
+        "id": "292c3b07b6f5a1b4bf8a44a7c0c2f1bba2b5a2e2f2e2c2a1d4f6f9c8b7a6d5e4",
+        "podSandboxId": "225a77f7ef0df4347ac7ac81a351f3b122b592cbbee62e157061cf28a811ac45",
+        "metadata": {"name": "my_cont", "attempt": 1},
+        "state": "CONTAINER_EXITED",
+        "labels": {"io.kubernetes.container.name": "my_cont"},
+    },
+    {
+        "id": "3e5f9a1c2b4d6e8f0a1b2c3d4e5f6a7b8c9d0e1f2a3b4c5d6e7f8a9b0c1d2e3f",
+        "podSandboxId": "225a77f7ef0df4347ac7ac81a351f3b122b592cbbee62e157061cf28a811ac45",
+        "metadata": {"name": "my_cont", "attempt": 2},
+        "state": "CONTAINER_RUNNING",
+        "labels": {"io.kubernetes.container.name": "my_cont"},
+    },
+    {
+        "id": "4f6a0b2d3c5e7f9a1b2c3d4e5f6a7b8c9d0e1f2a3b4c5d6e7f8a9b0c1d2e3f4a",
+        "podSandboxId": "225a77f7ef0df4347ac7ac81a351f3b122b592cbbee62e157061cf28a811ac45",
+        "metadata": {"name": "other_cont", "attempt": 1},
+        "state": "CONTAINER_CREATED",
+        "labels": {"io.kubernetes.container.name": "other_cont"},
+    },
+]
+
+GRPC_UTILS = {
+    "cri_utils.{}".format(func): getattr(cri_utils, func)
+    for func in [
+        "list_images",
+        "pull_image",
+        "list_pods",
+        "list_containers",
+        "stop_pods",
+    ]
+}
+
 
 class CriTestCase(TestCase, mixins.LoaderModuleMockMixin):
     """
@@ -81,8 +119,17 @@ class CriTestCase(TestCase, mixins.LoaderModuleMockMixin):
     """
 
     loader_module = cri
+    loader_module_globals = {
+        "__utils__": {"wait_utils.wait_for": wait_utils.wait_for},
+    }
     module_log_level = logging.DEBUG
 
+    def setUp(self):
+        super().setUp()
+        # Never share the CRI snapshot between tests
+        cri._SNAPSHOT.clear()
+        self.addCleanup(cri._SNAPSHOT.clear)
+
     def test_virtual(self):
         """
         Tests the return of `__virtual__` function
@@ -194,13 +241,13 @@ class CriTestCase(TestCase, mixins.LoaderModuleMockMixin):
     @parameterized.expand(
         [
             # Success: Found one container
-            (None, 6, 0, "292c3b07b", True),
+            (None, 6, 0, CONTAINERS_LIST, True),
             # Failure: Container does not exist
             (
                 None,
                 6,
                 0,
-                "",
+                [],
                 'Failed to find container "my_cont": No container found',
                 True,
             ),
@@ -210,18 +257,20 @@ class CriTestCase(TestCase, mixins.LoaderModuleMockMixin):
                 6,
                 1,
                 "Error occurred",
-                'Failed to find container "my_cont": Error occurred',
+                'Failed to find container "my_cont": STDERR: \nSTDOUT: Error occurred',
                 True,
             ),
             # Success: Found one running container
-            ("running", 6, 0, "292c3b07b", True),
+            ("running", 6, 0, CONTAINERS_LIST, True),
+            # Success: Found one exited container
+            ("exited", 6, 0, CONTAINERS_LIST, True),
             # Failure: Container does not exist or is not running
             (
-                "running",
+                "created",
                 6,
                 0,
-                "",
-                'Failed to find container "my_cont" in state "running": No container found',
+                CONTAINERS_LIST,
+                'Failed to find container "my_cont" in state "created": No container found',
                 True,
             ),
             # Failure: Error occurred when executing crictl command
@@ -230,23 +279,31 @@ class CriTestCase(TestCase, mixins.LoaderModuleMockMixin):
                 6,
                 1,
                 "Error occurred",
-                'Failed to find container "my_cont" in state "running": Error occurred',
+                'Failed to find container "my_cont" in state "running": '
+                "STDERR: \nSTDOUT: Error occurred",
                 True,
             ),
         ]
     )
     def test_wait_container(
-        self, state, timeout, retcode, stdout, result, raises=False
+        self, state, timeout, retcode, containers, result, raises=False
     ):
         """
         Tests the return of `wait_container` function
         """
-        cmd = utils.cmd_output(retcode=retcode, stdout=stdout)
+        if retcode == 0:
+            cmd = utils.cmd_output(stdout=json.dumps({"containers": containers}))
+        else:
+            cmd = utils.cmd_output(retcode=retcode, stdout=containers)
         mock_cmd = MagicMock(return_value=cmd)
+        timer = [0]
+
+        def sleep_mock(duration):
+            timer.append(timer[-1] + duration)
 
         with patch.dict(cri.__salt__, {"cmd.run_all": mock_cmd}), patch(
-            "time.sleep", MagicMock()
-        ):
+            "time.sleep", sleep_mock
+        ), patch("time.time", lambda: timer[-1]):
             if raises:
                 self.assertRaisesRegex(
                     Exception,
@@ -256,30 +313,66 @@ class CriTestCase(TestCase, mixins.LoaderModuleMockMixin):
                     state=state,
                     timeout=timeout,
                 )
+                # The snapshot is refreshed on each attempt, until the timeout
+                self.assertEqual(mock_cmd.call_count, len(timer))
+                self.assertEqual(timer[-1], timeout)
             else:
                 self.assertEqual(
                     cri.wait_container("my_cont", state=state, timeout=timeout), result
                 )
-            cmd_call = 'crictl ps -q --label io.kubernetes.container.name="my_cont"'
-            if state:
-                cmd_call += " --state {}".format(state)
-            mock_cmd.assert_called_with(cmd_call)
+            mock_cmd.assert_called_with("crictl ps -a -o json")
 
     @parameterized.expand(
         [
-            (0, json.dumps({"items": COMPONENT_LIST}, indent=4), True),
-            (1, "this command failed", False),
-            (0, json.dumps({"items": []}, indent=4), False),
+            (0, json.dumps({"items": COMPONENT_LIST}, indent=4), "etcd", True),
+            (0, json.dumps({"items": COMPONENT_LIST}, indent=4), "my_comp", False),
+            (1, "this command failed", "etcd", False),
+            (0, json.dumps({"items": []}, indent=4), "etcd", False),
         ]
     )
-    def test_component_is_running(self, retcode, stdout, result):
+    def test_component_is_running(self, retcode, stdout, name, result):
         """
         Tests the return of `component_is_running` function
         """
         cmd = utils.cmd_output(retcode=retcode, stdout=stdout)
         mock_cmd = MagicMock(return_value=cmd)
         with patch.dict(cri.__salt__, {"cmd.run_all": mock_cmd}):
-            self.assertEqual(cri.component_is_running("my_comp"), result)
+            self.assertEqual(cri.component_is_running(name), result)
+            mock_cmd.assert_called_once_with("crictl pods -o json")
+
+    def test_snapshot(self):
+        """
+        Tests that the CRI snapshot is shared between calls, and refreshed
+        once invalidated or expired
+        """
+        images_cmd = utils.cmd_output(stdout=json.dumps({"images": IMAGES_LIST}))
+        pull_cmd = utils.cmd_output(stdout="Image is up to date for sha256:abc")
+        mock_cmd = MagicMock(
+            side_effect=lambda cmd: pull_cmd if "pull" in cmd else images_cmd
+        )
+        timer = [0]
+
+        with patch.dict(cri.__salt__, {"cmd.run_all": mock_cmd}), patch(
+            "time.time", lambda: timer[0]
+        ):
+            self.assertTrue(cri.available("k8s.gcr.io/pause:3.1"))
+            self.assertTrue(cri.available("myEtcdTag"))
+            self.assertFalse(cri.available("Abc"))
+            self.assertEqual(mock_cmd.call_count, 1)
+
+            # Pulling an image invalidates the snapshot
+            cri.pull_image("Abc")
+            self.assertFalse(cri.available("Abc"))
+            self.assertEqual(mock_cmd.call_count, 3)
+
+            # Snapshot expired
+            timer[0] += cri.SNAPSHOT_TTL
+            self.assertFalse(cri.available("Abc"))
+            self.assertEqual(mock_cmd.call_count, 4)
+
+            # Explicit refresh
+            self.assertFalse(cri.available("Abc", refresh=True))
+            self.assertEqual(mock_cmd.call_count, 5)
 
     @utils.parameterized_from_cases(YAML_TESTS_CASES["ready"])
     def test_ready(
@@ -347,20 +440,18 @@ class CriTestCase(TestCase, mixins.LoaderModuleMockMixin):
     def test_get_pod_id(
         self,
         result,
-        pod_ids_out=None,
-        pod_stop_out=None,
+        pods=None,
+        pods_out=None,
         raises=False,
-        expected_cmd_args=None,
         **kwargs,
     ):
         """Test the return value of `get_pod_id`."""
-        expect_cmd = f"crictl pods --quiet"
-        if expected_cmd_args:
-            expect_cmd += f" {expected_cmd_args}"
 
         def cmd_run_mock(cmd):
-            self.assertEqual(cmd, expect_cmd)
-            return utils.cmd_output(**(pod_ids_out or {}))
+            self.assertEqual(cmd, "crictl pods -o json")
+            if pods_out:
+                return utils.cmd_output(**pods_out)
+            return utils.cmd_output(stdout=json.dumps({"items": pods}))
 
         salt_dict = {"cmd.run_all": MagicMock(side_effect=cmd_run_mock)}
 
@@ -389,7 +480,7 @@ class CriTestCase(TestCase, mixins.LoaderModuleMockMixin):
         def time_mock():
             return timer[-1]
 
-        result_iterator = iter(pod_ids or [])
+        pod_ids = list(pod_ids or [])
 
         def pod_ids_mock(*a, **k):
             self.assertEqual(a, ())
@@ -404,7 +495,8 @@ class CriTestCase(TestCase, mixins.LoaderModuleMockMixin):
             )
             if pod_ids_raise:
                 raise CommandExecutionError(pod_ids_raise)
-            return next(result_iterator)
+            # Keep returning the last result once all were consumed
+            return pod_ids.pop(0) if len(pod_ids) > 1 else pod_ids[0]
 
         with patch("time.sleep", sleep_mock), patch(
             "time.time", time_mock
@@ -414,3 +506,130 @@ class CriTestCase(TestCase, mixins.LoaderModuleMockMixin):
                     cri.wait_pod(**kwargs)
             else:
                 self.assertEqual(cri.wait_pod(**kwargs), result)
+
+    def test_grpc_backend(self):
+        """
+        Tests the `cri` functions using the gRPC backend
+        """
+        images = [
+            {
+                "id": image["id"],
+                "repo_tags": image["repoTags"],
+                "repo_digests": image["repoDigests"],
+                "size": int(image["size"]),
+            }
+            for image in IMAGES_LIST
+        ]
+        pods = [
+            {
+                "id": "abcdef123456",
+                "metadata": {"name": "etcd-bootstrap", "namespace": "kube-system"},
+                "state": "SANDBOX_READY",
+                "created_at": 2,
+                "labels": {"component": "etcd"},
+            },
+            {
+                "id": "ghijkl789123",
+                "metadata": {"name": "etcd-bootstrap", "namespace": "kube-system"},
+                "state": "SANDBOX_NOTREADY",
+                "created_at": 1,
+                "labels": {"component": "etcd"},
+            },
+        ]
+        containers = [
+            {
+                "id": container["id"],
+                "pod_sandbox_id": container["podSandboxId"],
+                "metadata": container["metadata"],
+                "state": container["state"],
+                "labels": container["labels"],
+            }
+            for container in CONTAINERS_LIST
+        ]
+        digest = "2bd222736f60f13a760bcfcc0728e4bd0812169d9d3068c01319c72102c9972a"
+        mock_cmd = MagicMock()
+
+        with FakeCRIServer(
+            images=images,
+            pods=pods,
+            containers=containers,
+            pulled_ref="sha256:" + digest,
+        ) as server, patch.dict(
+            cri.__opts__,
+            {"cri.backend": "grpc", "cri.runtime_endpoint": server.endpoint},
+        ), patch.dict(
+            cri.__utils__, GRPC_UTILS
+        ), patch.dict(
+            cri.__salt__, {"cmd.run_all": mock_cmd}
+        ):
+            listed = cri.list_images()
+            self.assertEqual(
+                [image["repoTags"] for image in listed],
+                [image["repoTags"] for image in IMAGES_LIST],
+            )
+            self.assertEqual(listed[0]["size"], IMAGES_LIST[0]["size"])
+            self.assertTrue(cri.available("myEtcdTag"))
+
+            self.assertEqual(
+                cri.pull_image("my-image"), {"digests": {"sha256": digest}}
+            )
+            self.assertEqual(
+                server.calls[-1][1].image.image,
+                "my-image",
+            )
+
+            self.assertEqual(
+                cri.get_pod_id(name="etcd-bootstrap", multiple=True),
+                ["abcdef123456", "ghijkl789123"],
+            )
+            self.assertEqual(
+                cri.get_pod_id(name="etcd-bootstrap", state="notready"),
+                "ghijkl789123",
+            )
+            self.assertTrue(cri.component_is_running("etcd"))
+            self.assertTrue(cri.wait_container("my_cont", state="exited"))
+
+            self.assertEqual(
+                cri.stop_pod({"component": "etcd"}),
+                "Stopped sandbox abcdef123456\nStopped sandbox ghijkl789123",
+            )
+            self.assertEqual(server.stopped, ["abcdef123456", "ghijkl789123"])
+
+        # Nothing went through crictl
+        mock_cmd.assert_not_called()
+
+    def test_grpc_backend_fallback(self):
+        """
+        Tests that `crictl` is used if the gRPC backend fails
+        """
+        cmd = utils.cmd_output(stdout=json.dumps({"images": IMAGES_LIST}))
+        mock_cmd = MagicMock(return_value=utils.cmd_output(retcode=1))
+
+        with FakeCRIServer() as server, patch.dict(
+            cri.__opts__,
+            {"cri.backend": "grpc", "cri.runtime_endpoint": server.endpoint},
+        ), patch.dict(cri.__utils__, GRPC_UTILS), patch.dict(
+            cri.__salt__, {"cmd.run_all": mock_cmd}
+        ):
+            # The fake runtime fails to pull images
+            self.assertIsNone(cri.pull_image("my-image"))
+            mock_cmd.assert_called_once_with('crictl pull "my-image"')
+
+        mock_cmd = MagicMock(return_value=cmd)
+        with patch.dict(
+            cri.__opts__,
+            {"cri.backend": "grpc", "cri.runtime_endpoint": "unix:///nonexistent"},
+        ), patch.dict(cri.__utils__, GRPC_UTILS), patch.dict(
+            cri.__salt__, {"cmd.run_all": mock_cmd}
+        ):
+            self.assertEqual(cri.list_images(), IMAGES_LIST)
+            mock_cmd.assert_called_once_with("crictl images -o json")
+        cri_utils.close_channels()
+
+        mock_cmd.reset_mock()
+        # The gRPC backend is not loaded
+        with patch.dict(cri.__opts__, {"cri.backend": "grpc"}), patch.dict(
+            cri.__salt__, {"cmd.run_all": mock_cmd}
+        ):
+            self.assertEqual(cri.list_images(), IMAGES_LIST)
+            mock_cmd.assert_called_once_with("crictl images -o json")
@@ -5,15 +5,18 @@ from unittest import TestCase
 from unittest.mock import MagicMock, mock_open, patch
 
 from parameterized import param, parameterized
-from salt.exceptions import CommandExecutionError
+from salt.exceptions import CommandExecutionError, SaltRenderError
 import salt.renderers.jinja
 import salt.renderers.yaml
 import salt.utils.files
 import yaml
 
 from _modules import metalk8s
+from _utils import iso_utils
+from _utils import wait_utils
 
 from tests.unit.log_utils import capture_logs, check_captured_logs
+from tests.unit.mocks.iso import build_iso
 from tests.unit import mixins
 from tests.unit import utils
 
@@ -50,6 +53,10 @@ class Metalk8sTestCase(TestCase, mixins.LoaderModuleMockMixin):
             "renderer_whitelist": [],
         },
         "__salt__": {},
+        "__utils__": {
+            "iso_utils.read_file": iso_utils.read_file,
+            "wait_utils.wait_for": wait_utils.wait_for,
+        },
     }
 
     def test_virtual(self):
@@ -79,8 +86,13 @@ class Metalk8sTestCase(TestCase, mixins.LoaderModuleMockMixin):
             kubernetes_ping_mock.return_value = status
 
         patch_dict = {"metalk8s_kubernetes.ping": kubernetes_ping_mock}
-        with patch.dict(metalk8s.__salt__, patch_dict):
-            self.assertEqual(metalk8s.wait_apiserver(retry=retry, interval=0), result)
+        with patch.dict(metalk8s.__salt__, patch_dict), utils.fake_clock() as sleep:
+            self.assertEqual(metalk8s.wait_apiserver(retry=retry, interval=1), result)
+
+        # The overall wait is the same as with a fixed interval between attempts
+        self.assertLessEqual(
+            round(sum(call[0][0] for call in sleep.call_args_list), 6), retry - 1
+        )
 
     @parameterized.expand(
         [
@@ -185,38 +197,32 @@ class Metalk8sTestCase(TestCase, mixins.LoaderModuleMockMixin):
     @parameterized.expand(
         [
             (PRODUCT_TXT, {"version": "2.5.0", "name": "MetalK8s"}),
-            (None, "Failed to run isoinfo: An error has occurred", True),
+            (None, "ISO at '.*' must contain a 'PRODUCT.TXT' file", True),
             ("Not a good product txt", {"version": None, "name": None}),
+            (False, "Failed to read PRODUCT.TXT from ISO .*: Not an ISO9660", True),
         ]
     )
     def test_archive_info_from_iso(self, product, result, raises=False):
         """
         Tests the return of `archive_info_from_iso` function
         """
-        if product is None:
-            iso_info_cmd_kwargs = {
-                "retcode": 1,
-                "stderr": "An error has occurred",
-            }
-        else:
-            iso_info_cmd_kwargs = {"stdout": product}
-
-        iso_info_cmd_mock = MagicMock(
-            return_value=utils.cmd_output(**iso_info_cmd_kwargs)
-        )
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "metalk8s.iso")
+            if product is False:
+                with open(path, "wb") as fd:
+                    fd.write(bytes(64 * 1024))
+            else:
+                build_iso(path, {"product.txt": product} if product else {})
 
-        with patch.dict(metalk8s.__salt__, {"cmd.run_all": iso_info_cmd_mock}):
             if raises:
                 self.assertRaisesRegex(
                     CommandExecutionError,
                     result,
                     metalk8s.archive_info_from_iso,
-                    "/my/path/",
+                    path,
                 )
             else:
-                self.assertEqual(metalk8s.archive_info_from_iso("/my/path/iso"), result)
-
-            iso_info_cmd_mock.assert_called_once()
+                self.assertEqual(metalk8s.archive_info_from_iso(path), result)
 
     @utils.parameterized_from_cases(YAML_TESTS_CASES["get_archives"])
     def test_get_archives(
@@ -337,6 +343,36 @@ class Metalk8sTestCase(TestCase, mixins.LoaderModuleMockMixin):
             else:
                 self.assertEqual(metalk8s.format_slots(data), result)
 
+    def test_format_slots_dedup(self):
+        """
+        Tests `format_slots` computes each slot once, and does not copy
+        sub-trees without slots
+        """
+        slot = "__slot__:salt:my_mod.my_fun()"
+        my_fun_mock = MagicMock(return_value={"ip": "10.96.0.10"})
+        data = {
+            "no_slots": {"my": ["simple", "data"]},
+            "slots": [{"first": slot}, {"second": slot}],
+        }
+
+        with patch.dict(metalk8s.__salt__, {"my_mod.my_fun": my_fun_mock}):
+            result = metalk8s.format_slots(data)
+
+        my_fun_mock.assert_called_once_with()
+        self.assertEqual(
+            result,
+            {
+                "no_slots": {"my": ["simple", "data"]},
+                "slots": [
+                    {"first": {"ip": "10.96.0.10"}},
+                    {"second": {"ip": "10.96.0.10"}},
+                ],
+            },
+        )
+        self.assertEqual(data["slots"], [{"first": slot}, {"second": slot}])
+        self.assertIs(result["no_slots"], data["no_slots"])
+        self.assertIsNot(result["slots"][0]["first"], result["slots"][1]["second"])
+
     @parameterized.expand(
         [
             param([3, 5, 2, -4], [-4, 2, 3, 5]),
@@ -534,9 +570,11 @@ class Metalk8sTestCase(TestCase, mixins.LoaderModuleMockMixin):
             }
 
         compile_template_mock = MagicMock()
-        with patch.dict(metalk8s.__pillar__, pillar_content), patch(
-            "salt.loader.render", MagicMock()
-        ), patch("salt.template.compile_template", compile_template_mock):
+        with patch.dict(metalk8s.__pillar__, pillar_content), patch.dict(
+            metalk8s._MAP_CACHE, clear=True
+        ), patch("salt.loader.render", MagicMock()), patch(
+            "salt.template.compile_template", compile_template_mock
+        ):
             metalk8s.get_from_map("my-key", saltenv=saltenv)
             compile_template_mock.assert_called_once()
             self.assertEqual(
@@ -547,6 +585,117 @@ class Metalk8sTestCase(TestCase, mixins.LoaderModuleMockMixin):
                 compile_template_mock.call_args[1],
             )
 
+    def test_get_from_map_cache(self):
+        """
+        Tests `get_from_map` renders all the map.jinja values once
+        """
+        rendered = {"repo": {"conflicting_packages": ["a"]}, "networks": {}}
+        compile_template_mock = MagicMock(return_value=rendered)
+
+        with tempfile.TemporaryDirectory() as cachedir:
+            map_path = os.path.join(cachedir, "map.jinja")
+            with open(map_path, "w") as fd:
+                fd.write("{% set repo = {} %}\n{%- set networks = {} %}\n")
+
+            salt_dict = {
+                "cp.is_cached": MagicMock(
+                    side_effect=lambda path, **_: map_path
+                    if path.endswith("map.jinja")
+                    else ""
+                )
+            }
+            with patch.dict(metalk8s.__pillar__, {"key": "value"}), patch.dict(
+                metalk8s.__salt__, salt_dict
+            ), patch.dict(metalk8s._MAP_CACHE, clear=True), patch(
+                "salt.loader.render", MagicMock()
+            ), patch(
+                "salt.template.compile_template", compile_template_mock
+            ):
+                repo = metalk8s.get_from_map("repo", saltenv="my-env")
+                self.assertEqual(repo, rendered["repo"])
+                self.assertEqual(
+                    compile_template_mock.call_args[1]["input_data"],
+                    '{% from "metalk8s/map.jinja" import networks, repo with context %}\n'
+                    '{{ {"networks": networks, "repo": repo} | tojson }}\n',
+                )
+
+                # Cached values are not shared with the callers
+                repo["conflicting_packages"].append("b")
+                self.assertEqual(
+                    metalk8s.get_from_map("repo", saltenv="my-env"), rendered["repo"]
+                )
+                self.assertEqual(
+                    metalk8s.get_from_map("networks", saltenv="my-env"), {}
+                )
+                compile_template_mock.assert_called_once()
+
+                # Rendered again when the pillar changes
+                metalk8s.__pillar__["key"] = "other-value"
+                metalk8s.get_from_map("repo", saltenv="my-env")
+                self.assertEqual(compile_template_mock.call_count, 2)
+
+                # Or when map.jinja changes
+                os.utime(map_path, ns=(0, 0))
+                metalk8s.get_from_map("repo", saltenv="my-env")
+                self.assertEqual(compile_template_mock.call_count, 3)
+
+                # Or when explicitly asked to
+                compile_template_mock.return_value = rendered["repo"]
+                metalk8s.get_from_map("repo", saltenv="my-env", use_cache=False)
+                self.assertEqual(compile_template_mock.call_count, 4)
+                metalk8s.get_from_map("repo", saltenv="my-env")
+                self.assertEqual(compile_template_mock.call_count, 4)
+
+    def test_get_from_map_fallback(self):
+        """
+        Tests `get_from_map` falls back to render only the requested value
+        """
+        repo = {"conflicting_packages": ["a"]}
+        single_template = (
+            '{% from "metalk8s/map.jinja" import repo with context %}\n'
+            "{{ repo | tojson }}\n"
+        )
+
+        def _compile_template(*_args, input_data, **_kwargs):
+            if input_data != single_template:
+                raise SaltRenderError("Banana")
+            return repo
+
+        compile_template_mock = MagicMock(side_effect=_compile_template)
+
+        with tempfile.TemporaryDirectory() as cachedir:
+            map_path = os.path.join(cachedir, "map.jinja")
+            salt_dict = {
+                "cp.is_cached": MagicMock(
+                    side_effect=lambda path, **_: map_path
+                    if path.endswith("map.jinja")
+                    else ""
+                )
+            }
+            with patch.dict(metalk8s.__salt__, salt_dict), patch(
+                "salt.loader.render", MagicMock()
+            ), patch("salt.template.compile_template", compile_template_mock):
+                # map.jinja cannot be read
+                with patch.dict(metalk8s._MAP_CACHE, clear=True):
+                    self.assertEqual(
+                        metalk8s.get_from_map("repo", saltenv="my-env"), repo
+                    )
+                    compile_template_mock.assert_called_once()
+
+                # Rendering all the values fails
+                with open(map_path, "w") as fd:
+                    fd.write("{% set repo = {} %}\n{%- set networks = {} %}\n")
+                compile_template_mock.reset_mock()
+                with patch.dict(metalk8s._MAP_CACHE, clear=True):
+                    self.assertEqual(
+                        metalk8s.get_from_map("repo", saltenv="my-env"), repo
+                    )
+                    self.assertEqual(compile_template_mock.call_count, 2)
+                    self.assertEqual(
+                        compile_template_mock.call_args[1]["input_data"],
+                        single_template,
+                    )
+
     @utils.parameterized_from_cases(YAML_TESTS_CASES["archive_info_from_product_txt"])
     def test_archive_info_from_product_txt(
         self, archive, info, result, is_file=False, is_dir=False, raises=False
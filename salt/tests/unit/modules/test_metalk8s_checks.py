@@ -1,4 +1,5 @@
 import os.path
+import threading
 from unittest import TestCase
 from unittest.mock import MagicMock, patch
 
@@ -73,6 +74,56 @@ class Metalk8sChecksTestCase(TestCase, mixins.LoaderModuleMockMixin):
             else:
                 self.assertEqual(metalk8s_checks.node(**kwargs), result)
 
+    def test_node_timings(self):
+        """
+        Tests the timings returned by the `node` function
+        """
+        salt_dict = {
+            "metalk8s_checks.{}".format(name): MagicMock(return_value=True)
+            for name in ["packages", "services", "ports", "containerd_filesystem"]
+        }
+
+        with patch.dict(metalk8s_checks.__pillar__, {}), patch.dict(
+            metalk8s_checks.__salt__, salt_dict
+        ):
+            ret = metalk8s_checks.node(timings=True)
+
+        self.assertEqual(ret["result"], True)
+        self.assertEqual(
+            list(ret["timings"]),
+            ["packages", "services", "ports", "containerd_filesystem"],
+        )
+        for duration in ret["timings"].values():
+            self.assertGreaterEqual(duration, 0)
+
+    def test_node_timeout(self):
+        """
+        Tests the `node` function with a check not completing in time
+        """
+        released = threading.Event()
+        salt_dict = {
+            "metalk8s_checks.packages": MagicMock(return_value=True),
+            "metalk8s_checks.services": MagicMock(return_value=True),
+            "metalk8s_checks.ports": MagicMock(side_effect=lambda **_: released.wait()),
+            "metalk8s_checks.containerd_filesystem": MagicMock(return_value=True),
+        }
+
+        try:
+            with patch.dict(
+                metalk8s_checks.__grains__, {"id": "my_node_1"}
+            ), patch.dict(metalk8s_checks.__pillar__, {}), patch.dict(
+                metalk8s_checks.__salt__, salt_dict
+            ):
+                ret = metalk8s_checks.node(raises=False, timeout=0.1, timings=True)
+        finally:
+            released.set()
+
+        self.assertEqual(
+            ret["result"],
+            "Node my_node_1: Check ports did not complete within 0.1 seconds.",
+        )
+        self.assertIsNone(ret["timings"]["ports"])
+
     @utils.parameterized_from_cases(YAML_TESTS_CASES["packages"])
     def test_packages(
         self, result, get_map_ret=None, list_pkgs_ret=None, expect_raise=False, **kwargs
@@ -103,6 +154,7 @@ class Metalk8sChecksTestCase(TestCase, mixins.LoaderModuleMockMixin):
         get_map_ret=None,
         service_status_ret=None,
         service_disabled_ret=None,
+        systemctl_show_ret=None,
         expect_raise=False,
         **kwargs
     ):
@@ -112,11 +164,19 @@ class Metalk8sChecksTestCase(TestCase, mixins.LoaderModuleMockMixin):
         get_map_mock = MagicMock(return_value=get_map_ret)
         service_status_mock = MagicMock(side_effect=(service_status_ret or {}).get)
         service_disabled_mock = MagicMock(side_effect=(service_disabled_ret or {}).get)
+        if systemctl_show_ret is None:
+            # Fallback to the `service` module
+            run_all_mock = MagicMock(return_value=utils.cmd_output(retcode=1))
+        else:
+            run_all_mock = MagicMock(
+                return_value=utils.cmd_output(stdout=systemctl_show_ret)
+            )
 
         salt_dict = {
             "metalk8s.get_from_map": get_map_mock,
             "service.status": service_status_mock,
             "service.disabled": service_disabled_mock,
+            "cmd.run_all": run_all_mock,
         }
 
         with patch.dict(metalk8s_checks.__salt__, salt_dict):
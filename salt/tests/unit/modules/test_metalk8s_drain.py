@@ -100,35 +100,41 @@ class Metalk8sDrainTestCase(TestCase, mixins.LoaderModuleMockMixin):
         def _create_mock(*args, **kwargs):
             if create_raises == "ApiException":
                 if create_error_body is None:
-                    raise ApiException(status=create_error_status)
+                    exc = ApiException(status=create_error_status)
                 else:
                     http_resp = MagicMock(
                         status=create_error_status,
                         data=json.dumps(create_error_body).encode("utf-8"),
                     )
-                    raise ApiException(http_resp=http_resp)
+                    exc = ApiException(http_resp=http_resp)
 
             elif create_raises == "HTTPError":
-                raise HTTPError()
+                exc = HTTPError()
 
-        create_mock = MagicMock(side_effect=_create_mock)
+            else:
+                return {}
 
-        dynamic_client_mock = MagicMock()
-        dynamic_client_mock.request.side_effect = create_mock
+            raise CommandExecutionError("Failed to create subresource") from exc
 
-        dynamic_mock = MagicMock()
-        dynamic_mock.DynamicClient.return_value = dynamic_client_mock
-        with patch("kubernetes.dynamic", dynamic_mock), patch(
-            "kubernetes.config", MagicMock()
-        ), capture_logs(metalk8s_drain.log, logging.DEBUG) as captured:
+        create_mock = MagicMock(side_effect=_create_mock)
+
+        salt_dict = {"metalk8s_kubernetes.create_subresource": create_mock}
+        with patch.dict(metalk8s_drain.__salt__, salt_dict), capture_logs(
+            metalk8s_drain.log, logging.DEBUG
+        ) as captured:
             if raises:
                 self.assertRaisesRegex(
                     CommandExecutionError, result, metalk8s_drain.evict_pod, **kwargs
                 )
             else:
                 self.assertEqual(metalk8s_drain.evict_pod(**kwargs), result)
-                # TODO(gd): check that parameters match expected API call
                 create_mock.assert_called_once()
+                call_kwargs = create_mock.call_args[1]
+                self.assertEqual(call_kwargs["subresource"], "eviction")
+                self.assertEqual(call_kwargs["name"], kwargs["name"])
+                self.assertEqual(
+                    call_kwargs["namespace"], kwargs.get("namespace", "default")
+                )
 
             check_captured_logs(captured, log_lines)
 
@@ -230,6 +236,7 @@ class DrainTestCase(TestCase, mixins.LoaderModuleMockMixin):
             "__salt__": {
                 "metalk8s_kubernetes.get_object": self.api_mock.get_object,
                 "metalk8s_kubernetes.list_objects": self.api_mock.list_objects,
+                "metalk8s_kubernetes.watch_objects": self.api_mock.watch_objects,
             },
             "evict_pod": self.evict_pod_mock,
         }
@@ -240,7 +247,14 @@ class DrainTestCase(TestCase, mixins.LoaderModuleMockMixin):
 
     @utils.parameterized_from_cases(YAML_TESTS_CASES["drain"]["nominal"])
     def test_nominal(
-        self, node_name, dataset, pods_to_evict, events=None, log_lines=None, **kwargs
+        self,
+        node_name,
+        dataset,
+        pods_to_evict,
+        result,
+        events=None,
+        log_lines=None,
+        **kwargs
     ):
         self.seed_api_mock(dataset, events)
         drainer = metalk8s_drain.Drain(node_name, timeout=30, **kwargs)
@@ -248,9 +262,8 @@ class DrainTestCase(TestCase, mixins.LoaderModuleMockMixin):
         with capture_logs(
             metalk8s_drain.log, logging.DEBUG
         ) as captured, self.time_mock.patch():
-            result = drainer.run_drain()
+            self.assertEqual(drainer.run_drain(), result)
 
-        self.assertEqual(result, "Eviction complete.")
         check_captured_logs(captured, log_lines)
         self.assertEqual(self.evict_pod_mock.call_count, len(pods_to_evict))
         self.assertEqual(
@@ -275,6 +288,39 @@ class DrainTestCase(TestCase, mixins.LoaderModuleMockMixin):
         self.assertEqual(result, expected_result)
         self.evict_pod_mock.assert_not_called()
 
+    @parameterized.expand(
+        [
+            # All pods share the same ReplicaSet: a single list call
+            ("multiple-pods", 0, 1),
+            # ReplicaSet and DaemonSet listed, unknown kind is not listable
+            ("full", 0, 2),
+            ("unknown-controller-pod", 1, 1),
+        ]
+    )
+    def test_controllers_prefetch(self, dataset, get_calls, list_calls):
+        """Check that pod controllers are retrieved once per kind/namespace."""
+        self.seed_api_mock(dataset)
+        drainer = metalk8s_drain.Drain(
+            "my-node",
+            force=True,
+            delete_local_data=True,
+            ignore_daemonset=True,
+            ignore_pending=True,
+        )
+
+        get_object_mock = MagicMock(side_effect=self.api_mock.get_object)
+        list_objects_mock = MagicMock(side_effect=self.api_mock.list_objects)
+        salt_dict = {
+            "metalk8s_kubernetes.get_object": get_object_mock,
+            "metalk8s_kubernetes.list_objects": list_objects_mock,
+        }
+        with patch.dict(metalk8s_drain.__salt__, salt_dict):
+            drainer.run_drain(dry_run=True)
+
+        self.assertEqual(get_object_mock.call_count, get_calls)
+        # One more list call, for the Pods
+        self.assertEqual(list_objects_mock.call_count, list_calls + 1)
+
     @utils.parameterized_from_cases(YAML_TESTS_CASES["drain"]["eviction-filters"])
     def test_eviction_filters(
         self,
@@ -310,32 +356,158 @@ class DrainTestCase(TestCase, mixins.LoaderModuleMockMixin):
 
     @utils.parameterized_from_cases(YAML_TESTS_CASES["drain"]["eviction-retry"])
     def test_eviction_retry(
-        self, node_name, dataset, eviction_attempts, events=None, **kwargs
+        self, node_name, dataset, eviction_attempts, result, events=None, **kwargs
     ):
         """Check that eviction temporary failures (429) will be retried."""
         self.seed_api_mock(dataset, events)
         drainer = metalk8s_drain.Drain(node_name, **kwargs)
 
         with self.time_mock.patch():
-            result = drainer.run_drain()
+            self.assertEqual(drainer.run_drain(), result)
 
-        self.assertEqual(result, "Eviction complete.")
         self.assertEqual(self.evict_pod_mock.call_count, eviction_attempts)
 
     @utils.parameterized_from_cases(YAML_TESTS_CASES["drain"]["waiting-for-eviction"])
     def test_waiting_for_eviction(
-        self, node_name, dataset, sleep_time, events=None, **kwargs
+        self, node_name, dataset, sleep_time, result, events=None, **kwargs
     ):
         """Check that the drain waits for pods to become evicted."""
         self.seed_api_mock(dataset, events)
         drainer = metalk8s_drain.Drain(node_name, **kwargs)
 
         with self.time_mock.patch():
-            result = drainer.run_drain()
+            self.assertEqual(drainer.run_drain(), result)
 
-        self.assertEqual(result, "Eviction complete.")
         self.assertEqual(self.time_mock.time(), sleep_time)
 
+    @parameterized.expand(
+        [
+            ("watch failure", CommandExecutionError("Failed to watch resources")),
+            ("error event", {"type": "ERROR", "object": {"code": 500}}),
+        ]
+    )
+    def test_waiting_for_eviction_watch_error(self, _, watch_error):
+        """Check that the drain falls back to polling if the watch fails."""
+        self.seed_api_mock(
+            "multiple-pods",
+            {
+                2: [
+                    {"resource": "pods", "verb": "delete", "name": "my-pod-1"},
+                    {"resource": "pods", "verb": "delete", "name": "my-pod-2"},
+                ],
+                4: [{"resource": "pods", "verb": "delete", "name": "my-pod-3"}],
+            },
+        )
+        drainer = metalk8s_drain.Drain("my-node")
+
+        def _watch_objects(**_):
+            if isinstance(watch_error, Exception):
+                raise watch_error
+            yield watch_error
+
+        watch_mock = MagicMock(side_effect=_watch_objects)
+
+        with self.time_mock.patch(), patch.dict(
+            metalk8s_drain.__salt__,
+            {"metalk8s_kubernetes.watch_objects": watch_mock},
+        ), capture_logs(metalk8s_drain.log, logging.WARNING) as captured:
+            result = drainer.run_drain()
+
+        self.assertEqual(
+            result,
+            "\n".join(
+                [
+                    "Eviction complete.",
+                    "- my-namespace/my-pod-1: evicted (1 attempt)",
+                    "- my-namespace/my-pod-2: evicted (1 attempt)",
+                    "- my-namespace/my-pod-3: evicted (1 attempt)",
+                ]
+            ),
+        )
+        # Polling every second after the watch failure
+        self.assertEqual(self.time_mock.time(), 4)
+        watch_mock.assert_called_once()
+        check_captured_logs(
+            captured,
+            [
+                {
+                    "level": "WARNING",
+                    "contains": (
+                        "Unable to watch Pods of Node my-node, falling back "
+                        "to polling"
+                    ),
+                }
+            ],
+        )
+
+    def test_waiting_for_eviction_watch_from_list(self):
+        """Check that the watch reports deletions happening after the list."""
+        self.seed_api_mock("multiple-pods")
+        drainer = metalk8s_drain.Drain("my-node")
+
+        def _list_objects(**kwargs):
+            result = self.api_mock.list_objects(**kwargs)
+            if kwargs.get("with_resource_version"):
+                # All pods are deleted right after being listed
+                for pod in result[0]:
+                    self.api_mock.api.delete("pods", name=pod["metadata"]["name"])
+            return result
+
+        list_mock = MagicMock(side_effect=_list_objects)
+        watch_mock = MagicMock(side_effect=self.api_mock.watch_objects)
+
+        with self.time_mock.patch(), patch.dict(
+            metalk8s_drain.__salt__,
+            {
+                "metalk8s_kubernetes.list_objects": list_mock,
+                "metalk8s_kubernetes.watch_objects": watch_mock,
+            },
+        ):
+            result = drainer.run_drain()
+
+        self.assertTrue(result.startswith("Eviction complete."))
+        # Deletions were reported by the first watch, without waiting
+        self.assertEqual(self.time_mock.time(), 0)
+        watch_mock.assert_called_once()
+        self.assertEqual(watch_mock.call_args[1]["resource_version"], "1")
+
+    def test_waiting_for_eviction_watch_expired(self):
+        """Check that an expired watch is started again after a new list."""
+        self.seed_api_mock(
+            "multiple-pods",
+            {
+                2: [
+                    {"resource": "pods", "verb": "delete", "name": "my-pod-1"},
+                    {"resource": "pods", "verb": "delete", "name": "my-pod-2"},
+                    {"resource": "pods", "verb": "delete", "name": "my-pod-3"},
+                ],
+            },
+        )
+        drainer = metalk8s_drain.Drain("my-node")
+
+        def _watch_objects(**kwargs):
+            if watch_mock.call_count == 1:
+                yield {"type": "ERROR", "object": {"code": 410}}
+            else:
+                yield from self.api_mock.watch_objects(**kwargs)
+
+        watch_mock = MagicMock(side_effect=_watch_objects)
+
+        with self.time_mock.patch(), patch.dict(
+            metalk8s_drain.__salt__,
+            {"metalk8s_kubernetes.watch_objects": watch_mock},
+        ), capture_logs(metalk8s_drain.log, logging.WARNING) as captured:
+            result = drainer.run_drain()
+
+        self.assertTrue(result.startswith("Eviction complete."))
+        self.assertEqual(self.time_mock.time(), 2)
+        self.assertEqual(
+            [call[1]["resource_version"] for call in watch_mock.call_args_list],
+            ["1", "2"],
+        )
+        # No fallback to polling
+        check_captured_logs(captured, [])
+
     @utils.parameterized_from_cases(YAML_TESTS_CASES["drain"]["timeout"])
     def test_timeout(self, node_name, dataset, **kwargs):
         """Check different sources of timeout."""
@@ -349,6 +521,22 @@ class DrainTestCase(TestCase, mixins.LoaderModuleMockMixin):
                 drainer.run_drain,
             )
 
+    def test_timeout_eviction_backoff(self):
+        """Check that retrying evictions does not wait beyond the timeout."""
+        self.seed_api_mock("blocked-eviction")
+        # Attempts at 0 and 5 seconds, the next one would be at 15 seconds
+        drainer = metalk8s_drain.Drain("my-node", timeout=12)
+
+        with self.time_mock.patch():
+            self.assertRaisesRegex(
+                CommandExecutionError,
+                "Drain did not complete within 12 seconds",
+                drainer.run_drain,
+            )
+
+        self.assertEqual(self.evict_pod_mock.call_count, 2)
+        self.assertEqual(self.time_mock.time(), 12)
+
     @utils.parameterized_from_cases(YAML_TESTS_CASES["drain"]["eviction-error"])
     def test_eviction_error(self, node_name, dataset, **kwargs):
         """Check that errors when evicting are stopping the drain process."""
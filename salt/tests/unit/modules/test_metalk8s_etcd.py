@@ -1,4 +1,5 @@
 from importlib import reload
+import threading
 from unittest import TestCase
 from unittest.mock import MagicMock, patch
 
@@ -276,7 +277,13 @@ class Metalk8sEtcdTestCase(TestCase, mixins.LoaderModuleMockMixin):
             if isinstance(status, list):
                 result = status.pop(0)
             if result:
-                return True
+                return MagicMock(
+                    leader=MEMBERS_LIST[0],
+                    raft_index=42,
+                    raft_term=2,
+                    db_size=1024,
+                    version="3.4.13",
+                )
             else:
                 raise Exception("Unhealthy member")
 
@@ -302,11 +309,12 @@ class Metalk8sEtcdTestCase(TestCase, mixins.LoaderModuleMockMixin):
                     cert_cert="cert",
                 )
             else:
+                ret = metalk8s_etcd.check_etcd_health(
+                    minion_id, ca_cert="ca", cert_key="key", cert_cert="cert"
+                )
+                self.assertEqual(ret["status"], result)
                 self.assertEqual(
-                    metalk8s_etcd.check_etcd_health(
-                        minion_id, ca_cert="ca", cert_key="key", cert_cert="cert"
-                    ),
-                    result,
+                    sorted(ret["members"]), sorted(member.name for member in members)
                 )
             etcd3_mock.assert_any_call(
                 host=cp_ips[minion_id] if minion_id else endpoint,
@@ -316,6 +324,103 @@ class Metalk8sEtcdTestCase(TestCase, mixins.LoaderModuleMockMixin):
                 timeout=30,
             )
 
+    def test_check_etcd_health_members(self):
+        """
+        Tests the per-member details returned by `check_etcd_health`
+        """
+        etcd3_mock = MagicMock()
+        etcd3_mock.return_value.__enter__.return_value.members = MEMBERS_LIST
+        etcd3_mock.return_value.__enter__.return_value.status.return_value = MagicMock(
+            leader=MEMBERS_LIST[0],
+            raft_index=42,
+            raft_term=2,
+            db_size=1024,
+            version="3.4.13",
+        )
+
+        with patch("etcd3.client", etcd3_mock), patch.object(
+            metalk8s_etcd, "_get_endpoint_up", MagicMock(return_value="10.11.12.13")
+        ):
+            ret = metalk8s_etcd.check_etcd_health()
+
+        for member in ret["members"].values():
+            self.assertIsInstance(member.pop("latency"), float)
+        self.assertEqual(
+            ret["members"],
+            {
+                "bootstrap": {
+                    "id": "17971792102091431977L",
+                    "endpoint": "https://10.11.12.13:2379",
+                    "healthy": True,
+                    "leader": True,
+                    "raft_index": 42,
+                    "raft_term": 2,
+                    "db_size": 1024,
+                    "version": "3.4.13",
+                },
+                "node1": {
+                    "id": "17971792102091431978L",
+                    "endpoint": "https://10.11.12.14:2379",
+                    "healthy": True,
+                    "leader": False,
+                    "raft_index": 42,
+                    "raft_term": 2,
+                    "db_size": 1024,
+                    "version": "3.4.13",
+                },
+            },
+        )
+
+    def test_check_etcd_health_no_leader(self):
+        """
+        Tests `check_etcd_health` while the cluster has no leader (e.g. during
+        an election)
+        """
+        etcd3_mock = MagicMock()
+        etcd3_mock.return_value.__enter__.return_value.members = MEMBERS_LIST
+        etcd3_mock.return_value.__enter__.return_value.status.return_value = MagicMock(
+            leader=None,
+            raft_index=42,
+            raft_term=3,
+            db_size=1024,
+            version="3.4.13",
+        )
+
+        with patch("etcd3.client", etcd3_mock), patch.object(
+            metalk8s_etcd, "_get_endpoint_up", MagicMock(return_value="10.11.12.13")
+        ):
+            ret = metalk8s_etcd.check_etcd_health()
+
+        self.assertEqual(
+            {name: member["leader"] for name, member in ret["members"].items()},
+            {"bootstrap": False, "node1": False},
+        )
+
+    def test_check_etcd_health_timeout(self):
+        """
+        Tests that `check_etcd_health` does not wait for members probes
+        after the timeout
+        """
+        release = threading.Event()
+        etcd3_mock = MagicMock()
+        etcd3_mock.return_value.__enter__.return_value.members = MEMBERS_LIST
+        etcd3_mock.return_value.__enter__.return_value.status.side_effect = (
+            lambda: release.wait(5)
+        )
+
+        with patch("etcd3.client", etcd3_mock), patch.object(
+            metalk8s_etcd, "_get_endpoint_up", MagicMock(return_value="10.11.12.13")
+        ), patch.object(metalk8s_etcd, "TIMEOUT", 0.1):
+            try:
+                self.assertRaisesRegex(
+                    CommandExecutionError,
+                    r"^cluster is unavailable \(bootstrap: timed out after 0.1 "
+                    r"seconds, node1: timed out after 0.1 seconds\)$",
+                    metalk8s_etcd.check_etcd_health,
+                )
+            finally:
+                release.set()
+
     @parameterized.expand(
         [
             (MEMBERS_LIST, MEMBERS_LIST_DICT),
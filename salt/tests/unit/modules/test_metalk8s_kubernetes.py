@@ -1,4 +1,6 @@
+import copy
 from importlib import reload
+import json
 import os.path
 from unittest import TestCase
 from unittest.mock import MagicMock, patch
@@ -7,7 +9,7 @@ from kubernetes.dynamic.exceptions import ResourceNotFoundError
 from kubernetes.client.rest import ApiException
 from parameterized import param, parameterized
 from salt.utils import dictupdate, hashutils
-from salt.exceptions import CommandExecutionError
+from salt.exceptions import CommandExecutionError, SaltCacheError
 import yaml
 
 from _modules import metalk8s_kubernetes
@@ -82,6 +84,12 @@ class Metalk8sKubernetesTestCase(TestCase, mixins.LoaderModuleMockMixin):
 
         return {"__salt__": salt_obj}
 
+    def setUp(self):
+        super().setUp()
+        # Never share cached clients between tests
+        metalk8s_kubernetes.clear_client_cache()
+        self.addCleanup(metalk8s_kubernetes.clear_client_cache)
+
     def assertDictContainsSubset(self, subdict, maindict):
         return self.assertEqual(dict(maindict, **subdict), maindict)
 
@@ -241,6 +249,7 @@ class Metalk8sKubernetesTestCase(TestCase, mixins.LoaderModuleMockMixin):
         namespaced=False,
         manifest_file_content=None,
         called_with=None,
+        skipped=False,
         **kwargs
     ):
         """
@@ -283,7 +292,13 @@ class Metalk8sKubernetesTestCase(TestCase, mixins.LoaderModuleMockMixin):
                     Exception, result, metalk8s_kubernetes.replace_object, **kwargs
                 )
             else:
+                manifest = copy.deepcopy(kwargs.get("manifest"))
                 self.assertEqual(metalk8s_kubernetes.replace_object(**kwargs), result)
+                # The given manifest must be left untouched
+                self.assertEqual(kwargs.get("manifest"), manifest)
+                if skipped:
+                    replace_mock.assert_not_called()
+                    return
                 replace_mock.assert_called_once()
                 if called_with:
                     self.assertDictContainsSubset(
@@ -407,6 +422,70 @@ class Metalk8sKubernetesTestCase(TestCase, mixins.LoaderModuleMockMixin):
                 if called_with:
                     self.assertDictContainsSubset(called_with, patch_mock.call_args[1])
 
+    @utils.parameterized_from_cases(
+        YAML_TESTS_CASES["apply_object"] + YAML_TESTS_CASES["common_tests"]
+    )
+    def test_apply_object(
+        self,
+        result,
+        raises=False,
+        api_status_code=None,
+        namespaced=False,
+        manifest_file_content=None,
+        called_with=None,
+        **kwargs
+    ):
+        """
+        Tests the return of `apply_object` function
+        """
+
+        def _apply_mock(body, **_):
+            if api_status_code is not None:
+                raise ApiException(
+                    status=api_status_code, reason="An error has occurred"
+                )
+
+            obj = MagicMock()
+            # Body is sent serialized
+            obj.to_dict.return_value = json.loads(body)
+            return obj
+
+        apply_mock = MagicMock(side_effect=_apply_mock)
+        dynamic_mock = _mock_k8s_dynamic(
+            namespaced=namespaced, action="patch", mock=apply_mock
+        )
+
+        manifest_read_mock = MagicMock()
+        # None = IOError
+        # False = YAMLError
+        if manifest_file_content is None:
+            manifest_read_mock.side_effect = IOError("An error has occurred")
+        elif manifest_file_content is False:
+            manifest_read_mock.side_effect = yaml.YAMLError("An error has occurred")
+        else:
+            manifest_read_mock.return_value = manifest_file_content
+
+        salt_dict = {
+            "metalk8s_kubernetes.read_and_render_yaml_file": manifest_read_mock
+        }
+        with patch("kubernetes.dynamic", dynamic_mock), patch(
+            "kubernetes.config", MagicMock()
+        ), patch.dict(metalk8s_kubernetes.__salt__, salt_dict):
+            if raises:
+                self.assertRaisesRegex(
+                    Exception, result, metalk8s_kubernetes.apply_object, **kwargs
+                )
+            else:
+                self.assertEqual(metalk8s_kubernetes.apply_object(**kwargs), result)
+                apply_mock.assert_called_once()
+                if called_with:
+                    called_with = dict(called_with)
+                    if "query_params" in called_with:
+                        called_with["query_params"] = [
+                            tuple(param) for param in called_with["query_params"]
+                        ]
+                    self.assertDictContainsSubset(called_with, apply_mock.call_args[1])
+
     @parameterized.expand(
         [
             (
@@ -468,7 +547,8 @@ class Metalk8sKubernetesTestCase(TestCase, mixins.LoaderModuleMockMixin):
                 "items": [
                     "<my first object dict>",
                     "<my second object dict>",
-                ]
+                ],
+                "metadata": {"resourceVersion": "1234"},
             }
             return res
 
@@ -490,6 +570,185 @@ class Metalk8sKubernetesTestCase(TestCase, mixins.LoaderModuleMockMixin):
                 if called_with:
                     self.assertDictContainsSubset(called_with, list_mock.call_args[1])
 
+    def test_list_objects_with_resource_version(self):
+        """
+        Tests that `list_objects` can return the list `resourceVersion`
+        """
+        list_mock = MagicMock()
+        list_mock.return_value.to_dict.return_value = {
+            "items": ["<my object dict>"],
+            "metadata": {"resourceVersion": "1234"},
+        }
+        dynamic_mock = _mock_k8s_dynamic(namespaced=True, action="get", mock=list_mock)
+
+        with patch("kubernetes.dynamic", dynamic_mock), patch(
+            "kubernetes.config", MagicMock()
+        ):
+            self.assertEqual(
+                metalk8s_kubernetes.list_objects(
+                    kind="Pod", apiVersion="v1", with_resource_version=True
+                ),
+                (["<my object dict>"], "1234"),
+            )
+            list_mock.assert_called_once_with(namespace="default")
+
+    @parameterized.expand(
+        [
+            # Simple watch on a namespaced kind
+            (
+                {"kind": "Pod", "apiVersion": "v1"},
+                {"namespace": "default"},
+            ),
+            # Watch on all namespaces with all options
+            (
+                {
+                    "kind": "Pod",
+                    "apiVersion": "v1",
+                    "all_namespaces": True,
+                    "field_selector": "spec.nodeName=my-node",
+                    "label_selector": "app=my-app",
+                    "resource_version": "1234",
+                    "timeout": 10,
+                },
+                {
+                    "field_selector": "spec.nodeName=my-node",
+                    "label_selector": "app=my-app",
+                    "resource_version": "1234",
+                    "timeout": 10,
+                },
+            ),
+            # Watch on a non-namespaced kind
+            (
+                {"kind": "Node", "apiVersion": "v1", "namespace": "my-namespace"},
+                {},
+                False,
+            ),
+            # Error when watching
+            (
+                {"kind": "Pod", "apiVersion": "v1", "namespace": "my-namespace"},
+                {"namespace": "my-namespace"},
+                True,
+                True,
+            ),
+        ]
+    )
+    def test_watch_objects(self, kwargs, called_with, namespaced=True, api_error=False):
+        """
+        Tests the return of `watch_objects` function
+        """
+        events = [
+            {"type": "ADDED", "object": MagicMock(), "raw_object": {"id": 1}},
+            {"type": "DELETED", "object": MagicMock(), "raw_object": {"id": 2}},
+        ]
+
+        def _watch_mock(**_):
+            yield events[0]
+            if api_error:
+                raise ApiException(status=0, reason="An error has occurred")
+            yield events[1]
+
+        watch_mock = MagicMock(side_effect=_watch_mock)
+        dynamic_mock = _mock_k8s_dynamic(
+            namespaced=namespaced, action="watch", mock=watch_mock
+        )
+
+        with patch("kubernetes.dynamic", dynamic_mock), patch(
+            "kubernetes.config", MagicMock()
+        ):
+            watcher = metalk8s_kubernetes.watch_objects(**kwargs)
+            self.assertEqual(next(watcher), {"type": "ADDED", "object": {"id": 1}})
+            if api_error:
+                self.assertRaisesRegex(
+                    CommandExecutionError,
+                    'Failed to watch resources "v1/Pod" in namespace "my-namespace"',
+                    next,
+                    watcher,
+                )
+            else:
+                self.assertEqual(
+                    list(watcher), [{"type": "DELETED", "object": {"id": 2}}]
+                )
+            watch_mock.assert_called_once_with(**called_with)
+
+    @parameterized.expand(
+        [
+            # Subresource of a namespaced kind
+            (
+                {"namespace": "my-namespace"},
+                True,
+                "my-namespace",
+            ),
+            # Subresource of a non-namespaced kind
+            ({"namespace": "my-namespace"}, False, None),
+            # Error when creating
+            (
+                {"namespace": "my-namespace"},
+                True,
+                "my-namespace",
+                'Failed to create "eviction" for Pod "my-pod" '
+                'in namespace "my-namespace"',
+            ),
+        ]
+    )
+    def test_create_subresource(
+        self, kwargs, namespaced, path_namespace, error_msg=None
+    ):
+        """
+        Tests the return of `create_subresource` function
+        """
+        client_mock = MagicMock()
+        client_mock.request.return_value.to_dict.return_value = {"kind": "Status"}
+        if error_msg:
+            client_mock.request.side_effect = ApiException(status=429)
+        dynamic_mock = _mock_k8s_dynamic(
+            namespaced=namespaced, action="client", mock=client_mock
+        )
+        resources_get_mock = dynamic_mock.DynamicClient.return_value.resources.get
+
+        with patch("kubernetes.dynamic", dynamic_mock), patch(
+            "kubernetes.config", MagicMock()
+        ):
+            for _ in range(2):
+                if error_msg:
+                    with self.assertRaisesRegex(CommandExecutionError, error_msg) as cm:
+                        metalk8s_kubernetes.create_subresource(
+                            kind="Pod",
+                            apiVersion="v1",
+                            name="my-pod",
+                            subresource="eviction",
+                            body={},
+                            **kwargs
+                        )
+                    # The API error is kept for callers to handle
+                    self.assertEqual(cm.exception.__cause__.status, 429)
+                else:
+                    self.assertEqual(
+                        metalk8s_kubernetes.create_subresource(
+                            kind="Pod",
+                            apiVersion="v1",
+                            name="my-pod",
+                            subresource="eviction",
+                            body={},
+                            **kwargs
+                        ),
+                        {"kind": "Status"},
+                    )
+
+            # The cached client and discovery results are used
+            dynamic_mock.DynamicClient.assert_called_once()
+            resources_get_mock.assert_called_once()
+
+        api = metalk8s_kubernetes._CLIENT_CACHE[
+            next(iter(metalk8s_kubernetes._CLIENT_CACHE))
+        ]["resources"][("v1", "Pod")]
+        api.path.assert_called_with(name="my-pod", namespace=path_namespace)
+        self.assertEqual(client_mock.request.call_count, 2)
+        self.assertEqual(client_mock.request.call_args[0][0], "post")
+        self.assertEqual(
+            client_mock.request.call_args[0][1],
+            "{}/eviction".format(api.path.return_value),
+        )
+
     @parameterized.expand(
         param.explicit(kwargs=test_case)
         for test_case in YAML_TESTS_CASES["get_object_digest"]
@@ -509,3 +768,166 @@ class Metalk8sKubernetesTestCase(TestCase, mixins.LoaderModuleMockMixin):
                 self.assertEqual(
                     metalk8s_kubernetes.get_object_digest(**kwargs), result
                 )
+
+    def test_client_cache(self):
+        """
+        Tests that `DynamicClient` and discovery results are cached
+        """
+        get_mock = MagicMock()
+        dynamic_mock = _mock_k8s_dynamic(namespaced=True, action="get", mock=get_mock)
+        resources_get_mock = dynamic_mock.DynamicClient.return_value.resources.get
+
+        with patch("kubernetes.dynamic", dynamic_mock), patch(
+            "kubernetes.config", MagicMock()
+        ):
+            for _ in range(3):
+                metalk8s_kubernetes.get_object(
+                    name="my-pod", kind="Pod", apiVersion="v1"
+                )
+            metalk8s_kubernetes.list_objects(kind="Pod", apiVersion="v1")
+
+            self.assertEqual(get_mock.call_count, 4)
+            dynamic_mock.DynamicClient.assert_called_once()
+            resources_get_mock.assert_called_once_with(api_version="v1", kind="Pod")
+
+            metalk8s_kubernetes.get_object(name="my-node", kind="Node", apiVersion="v1")
+            self.assertEqual(resources_get_mock.call_count, 2)
+
+            self.assertEqual(
+                metalk8s_kubernetes.client_cache_stats(),
+                {"hits": 4, "misses": 1, "size": 1},
+            )
+
+    @parameterized.expand(
+        [
+            # Same kubeconfig file, after TTL expiry
+            (None, None, 1000, 2),
+            # Same kubeconfig file, before TTL expiry
+            (None, None, 10, 1),
+            # Kubeconfig file modified
+            (42.0, 43.0, 10, 2),
+        ]
+    )
+    def test_client_cache_refresh(
+        self, first_mtime, second_mtime, elapsed, expected_clients
+    ):
+        """
+        Tests that cached `DynamicClient` are rebuilt when outdated
+        """
+        get_mock = MagicMock()
+        dynamic_mock = _mock_k8s_dynamic(namespaced=True, action="get", mock=get_mock)
+        time_mock = MagicMock(side_effect=[100, 100 + elapsed])
+        mtime_mock = MagicMock(side_effect=[first_mtime, second_mtime])
+        if first_mtime is None:
+            mtime_mock.side_effect = OSError("No such file")
+
+        with patch("kubernetes.dynamic", dynamic_mock), patch(
+            "kubernetes.config", MagicMock()
+        ), patch("time.time", time_mock), patch("os.path.getmtime", mtime_mock):
+            for _ in range(2):
+                metalk8s_kubernetes.get_object(
+                    name="my-pod", kind="Pod", apiVersion="v1"
+                )
+
+        self.assertEqual(dynamic_mock.DynamicClient.call_count, expected_clients)
+        self.assertEqual(metalk8s_kubernetes.client_cache_stats()["size"], 1)
+
+    def test_client_cache_invalidate_unknown_kind(self):
+        """
+        Tests that an unknown kind invalidates the cached `DynamicClient`
+        """
+        get_mock = MagicMock()
+        dynamic_mock = _mock_k8s_dynamic(namespaced=True, action="get", mock=get_mock)
+        resources_get_mock = dynamic_mock.DynamicClient.return_value.resources.get
+        resources_get_mock.side_effect = [
+            ResourceNotFoundError("Error !!"),
+            MagicMock(namespaced=True, get=get_mock),
+        ]
+
+        with patch("kubernetes.dynamic", dynamic_mock), patch(
+            "kubernetes.config", MagicMock()
+        ):
+            metalk8s_kubernetes.get_object(
+                name="my-banana", kind="Banana", apiVersion="fruits/v1"
+            )
+
+        get_mock.assert_called_once()
+        self.assertEqual(dynamic_mock.DynamicClient.call_count, 2)
+        self.assertEqual(
+            metalk8s_kubernetes.client_cache_stats(),
+            {"hits": 0, "misses": 2, "size": 1},
+        )
+
+    @parameterized.expand(
+        [
+            # Node written from the master
+            ("patch", "Node", "master", True),
+            ("delete", "Node", "master", True),
+            # Node only read
+            ("get", "Node", "master", False),
+            # Other kind written
+            ("patch", "Pod", "master", False),
+            # Node written from a minion
+            ("patch", "Node", "minion", False),
+        ]
+    )
+    def test_nodes_changed_marker(self, action, kind, role, marked):
+        """
+        Tests that Node writes from the master invalidate the cluster snapshot
+        of the `metalk8s_nodes` ext_pillar
+        """
+        action_mock = MagicMock()
+        dynamic_mock = _mock_k8s_dynamic(
+            namespaced=False, action=action, mock=action_mock
+        )
+        cache_mock = MagicMock()
+
+        with patch("kubernetes.dynamic", dynamic_mock), patch(
+            "kubernetes.config", MagicMock()
+        ), patch("salt.cache.Cache", cache_mock), patch(
+            "time.time", MagicMock(return_value=1234)
+        ), patch.dict(
+            metalk8s_kubernetes.__opts__, {"__role": role}
+        ):
+            function = {"patch": "update_object"}.get(action, action + "_object")
+            getattr(metalk8s_kubernetes, function)(
+                name="my-object",
+                kind=kind,
+                apiVersion="v1",
+                patch={"metadata": {"labels": {"my-label": "my-value"}}},
+            )
+
+        action_mock.assert_called_once()
+        if marked:
+            cache_mock.return_value.store.assert_called_once_with(
+                "metalk8s_nodes", "nodes-changed", {"time": 1234}
+            )
+        else:
+            cache_mock.return_value.store.assert_not_called()
+
+    def test_nodes_changed_marker_cache_error(self):
+        """
+        Tests that a Node write does not fail if the cluster snapshot of the
+        `metalk8s_nodes` ext_pillar cannot be invalidated
+        """
+        dynamic_mock = _mock_k8s_dynamic(
+            namespaced=False, action="patch", mock=MagicMock()
+        )
+        cache_mock = MagicMock()
+        cache_mock.return_value.store.side_effect = SaltCacheError("Banana")
+
+        with patch("kubernetes.dynamic", dynamic_mock), patch(
+            "kubernetes.config", MagicMock()
+        ), patch("salt.cache.Cache", cache_mock), patch.dict(
+            metalk8s_kubernetes.__opts__, {"__role": "master"}
+        ):
+            self.assertIsNotNone(
+                metalk8s_kubernetes.update_object(
+                    name="my-node",
+                    kind="Node",
+                    apiVersion="v1",
+                    patch={"spec": {"unschedulable": True}},
+                )
+            )
+
+        cache_mock.return_value.store.assert_called_once()
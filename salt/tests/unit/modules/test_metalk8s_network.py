@@ -4,6 +4,7 @@ from unittest import TestCase
 from unittest.mock import MagicMock, patch
 
 from parameterized import parameterized
+import psutil
 from salt.exceptions import CommandExecutionError
 import yaml
 
@@ -242,7 +243,12 @@ class Metalk8sNetworkTestCase(TestCase, mixins.LoaderModuleMockMixin):
 
     @utils.parameterized_from_cases(YAML_TESTS_CASES["get_listening_processes"])
     def test_get_listening_processes(
-        self, result, net_conns_ret=None, process_ret=None
+        self,
+        result,
+        net_conns_ret=None,
+        process_ret=None,
+        netlink_sockets=None,
+        netlink_owners=None,
     ):
         """
         Tests the return of `get_listening_processes` function
@@ -259,17 +265,39 @@ class Metalk8sNetworkTestCase(TestCase, mixins.LoaderModuleMockMixin):
         for pid, name in (process_ret or {}).items():
             process_return[pid] = MagicMock()
             process_return[pid].name.return_value = name
+            # No name means that the process exited in the meantime
+            if name is None:
+                process_return[pid].name.side_effect = psutil.NoSuchProcess(pid)
 
         net_conns_mock = MagicMock(return_value=net_conns_return)
         process_mock = MagicMock(side_effect=process_return.get)
 
+        utils_dict = {}
+        if netlink_sockets is not None:
+            utils_dict = {
+                "netlink_utils.dump_listening_sockets": MagicMock(
+                    return_value=netlink_sockets
+                ),
+                "netlink_utils.socket_owners": MagicMock(
+                    return_value=netlink_owners or {}
+                ),
+            }
+
         with patch("psutil.net_connections", net_conns_mock), patch(
             "psutil.Process", process_mock
-        ):
+        ), patch.dict(metalk8s_network.__utils__, utils_dict):
             self.assertEqual(metalk8s_network.get_listening_processes(), result)
 
+        if netlink_sockets is not None:
+            net_conns_mock.assert_not_called()
+        # Process names are only retrieved once per PID
+        self.assertEqual(
+            process_mock.call_count,
+            len({call[0][0] for call in process_mock.call_args_list}),
+        )
+
     @utils.parameterized_from_cases(YAML_TESTS_CASES["routes"])
-    def test_routes(self, ip_route_output, result):
+    def test_routes(self, result, ip_route_output=None, netlink_routes=None):
         """
         Tests the return of `routes` function
         """
@@ -282,14 +310,23 @@ class Metalk8sNetworkTestCase(TestCase, mixins.LoaderModuleMockMixin):
             ret["broadcast"] = str(network_info.broadcast_address)
             return ret
 
+        utils_dict = {}
+        if netlink_routes is not None:
+            utils_dict["netlink_utils.dump_routes"] = MagicMock(
+                return_value=netlink_routes
+            )
+
         mock_convert_cidr = MagicMock(side_effect=_mock_convert_cidr)
         mock_ip_cmd = MagicMock(return_value=ip_route_output)
         with patch.dict(
             metalk8s_network.__salt__,
             {"cmd.run": mock_ip_cmd, "network.convert_cidr": mock_convert_cidr},
-        ):
+        ), patch.dict(metalk8s_network.__utils__, utils_dict):
             self.assertEqual(metalk8s_network.routes(), result)
-            mock_ip_cmd.assert_called_once_with("ip -4 route show table main")
+            if netlink_routes is None:
+                mock_ip_cmd.assert_called_once_with("ip -4 route show table main")
+            else:
+                mock_ip_cmd.assert_not_called()
 
     @utils.parameterized_from_cases(YAML_TESTS_CASES["get_control_plane_ingress_ip"])
     def test_get_control_plane_ingress_ip(
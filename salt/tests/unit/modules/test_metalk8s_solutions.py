@@ -1,5 +1,7 @@
 import errno
+import json
 import os.path
+import tempfile
 from unittest import TestCase
 from unittest.mock import MagicMock, mock_open, patch
 
@@ -8,7 +10,9 @@ from salt.exceptions import CommandExecutionError
 import yaml
 
 from _modules import metalk8s_solutions
+from _utils import iso_utils
 
+from tests.unit.mocks.iso import build_iso
 from tests.unit import mixins
 from tests.unit import utils
 
@@ -26,6 +30,7 @@ class Metalk8sSolutionsTestCase(TestCase, mixins.LoaderModuleMockMixin):
     """
 
     loader_module = metalk8s_solutions
+    loader_module_globals = {"__utils__": {"iso_utils.read_file": iso_utils.read_file}}
 
     def test_virtual_success(self):
         """
@@ -248,16 +253,14 @@ class Metalk8sSolutionsTestCase(TestCase, mixins.LoaderModuleMockMixin):
         Tests the return of `manifest_from_iso` function
         """
 
-        def _cmd_run_all_mock(**_):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "my-solution.iso")
             if manifest is None:
-                return {"retcode": 1, "stderr": "isoinfo error", "stdout": ""}
-            return {"retcode": 0, "stdout": manifest}
-
-        cmd_run_all_mock = MagicMock(side_effect=_cmd_run_all_mock)
+                with open(path, "wb") as fd:
+                    fd.write(bytes(64 * 1024))
+            else:
+                build_iso(path, {"manifest.yaml": manifest} if manifest else {})
 
-        patch_dict = {"cmd.run_all": cmd_run_all_mock}
-        path = "/tmp/my-solution.iso"
-        with patch.dict(metalk8s_solutions.__salt__, patch_dict):
             if raises:
                 self.assertRaisesRegex(
                     CommandExecutionError,
@@ -281,11 +284,130 @@ class Metalk8sSolutionsTestCase(TestCase, mixins.LoaderModuleMockMixin):
         salt_dict_patch = {
             "mount.active": mount_active_mock,
         }
-        with patch.dict(metalk8s_solutions.__salt__, salt_dict_patch), patch.object(
+        with tempfile.TemporaryDirectory() as cachedir, patch.dict(
+            metalk8s_solutions.__opts__, {"cachedir": cachedir}
+        ), patch.dict(metalk8s_solutions.__salt__, salt_dict_patch), patch.object(
             metalk8s_solutions, "read_solution_manifest", read_solution_manifest_mock
         ):
             self.assertEqual(metalk8s_solutions.list_available(), result or {})
 
+    def test_list_available_index(self):
+        """
+        Tests `list_available` only reads manifests of new or changed archives
+        """
+        manifest = {"spec": {"images": ["my-solution-operator:1.0.0"]}}
+        info = {
+            "name": "my-solution",
+            "version": "1.0.0",
+            "display_name": "My Solution",
+            "id": "my-solution-1.0.0",
+        }
+
+        def _read_solution_manifest(mountpoint):
+            if mountpoint == "/srv/scality/no-solution":
+                raise CommandExecutionError("Banana")
+            return manifest, info
+
+        read_solution_manifest_mock = MagicMock(side_effect=_read_solution_manifest)
+
+        with tempfile.TemporaryDirectory() as cachedir, patch.dict(
+            metalk8s_solutions.__opts__, {"cachedir": cachedir}
+        ), patch.object(
+            metalk8s_solutions, "read_solution_manifest", read_solution_manifest_mock
+        ):
+            isos = {}
+            for name in ["my-solution-1.0.0.iso", "not-a-solution.iso"]:
+                isos[name] = os.path.join(cachedir, name)
+                open(isos[name], "w").close()
+
+            mountpoints = {
+                "/srv/scality/my-solution": {
+                    "device": "/dev/loop1",
+                    "alt_device": isos["my-solution-1.0.0.iso"],
+                    "fstype": "iso9660",
+                },
+                "/srv/scality/no-solution": {
+                    "device": "/dev/loop2",
+                    "alt_device": isos["not-a-solution.iso"],
+                    "fstype": "iso9660",
+                },
+            }
+            expected = {
+                "my-solution": [
+                    {
+                        "name": "My Solution",
+                        "id": "my-solution-1.0.0",
+                        "mountpoint": "/srv/scality/my-solution",
+                        "archive": isos["my-solution-1.0.0.iso"],
+                        "version": "1.0.0",
+                        "manifest": manifest,
+                    }
+                ]
+            }
+            index_path = os.path.join(cachedir, metalk8s_solutions.SOLUTIONS_INDEX)
+
+            with patch.dict(
+                metalk8s_solutions.__salt__,
+                {"mount.active": MagicMock(return_value=mountpoints)},
+            ):
+                self.assertEqual(metalk8s_solutions.list_available(), expected)
+                self.assertEqual(read_solution_manifest_mock.call_count, 2)
+
+                # Unchanged mounts are served from the index
+                self.assertEqual(metalk8s_solutions.list_available(), expected)
+                self.assertEqual(read_solution_manifest_mock.call_count, 2)
+
+                # Re-mounted archives are read again
+                mountpoints["/srv/scality/my-solution"]["device"] = "/dev/loop3"
+                self.assertEqual(metalk8s_solutions.list_available(), expected)
+                self.assertEqual(read_solution_manifest_mock.call_count, 3)
+
+                # So are modified archives
+                stat = os.stat(isos["not-a-solution.iso"])
+                os.utime(
+                    isos["not-a-solution.iso"],
+                    ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9),
+                )
+                self.assertEqual(metalk8s_solutions.list_available(), expected)
+                self.assertEqual(read_solution_manifest_mock.call_count, 4)
+                read_solution_manifest_mock.assert_called_with(
+                    "/srv/scality/no-solution"
+                )
+
+                # Or all of them, if asked to
+                self.assertEqual(
+                    metalk8s_solutions.list_available(refresh=True), expected
+                )
+                self.assertEqual(read_solution_manifest_mock.call_count, 6)
+
+                # Or if the index comes from another version
+                with open(index_path) as fd:
+                    index = json.load(fd)
+                index["version"] = metalk8s_solutions.SOLUTIONS_INDEX_VERSION + 1
+                with open(index_path, "w") as fd:
+                    json.dump(index, fd)
+                self.assertEqual(metalk8s_solutions.list_available(), expected)
+                self.assertEqual(read_solution_manifest_mock.call_count, 8)
+
+                # Unmounted archives are removed from the index
+                del mountpoints["/srv/scality/my-solution"]
+                self.assertEqual(metalk8s_solutions.list_available(), {})
+                with open(index_path) as fd:
+                    self.assertEqual(
+                        list(json.load(fd)["mounts"]), ["/srv/scality/no-solution"]
+                    )
+
+            # Failing to write the index is not an error
+            with patch.dict(
+                metalk8s_solutions.__opts__,
+                {"cachedir": os.path.join(cachedir, "missing")},
+            ), patch.dict(
+                metalk8s_solutions.__salt__,
+                {"mount.active": MagicMock(return_value=mountpoints)},
+            ):
+                self.assertEqual(metalk8s_solutions.list_available(), {})
+                self.assertEqual(read_solution_manifest_mock.call_count, 9)
+
     @utils.parameterized_from_cases(YAML_TESTS_CASES["operator_roles_from_manifest"])
     def test_operator_roles_from_manifest(
         self, manifest=None, result=None, raises=False
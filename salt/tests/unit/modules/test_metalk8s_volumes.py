@@ -3,10 +3,12 @@ from unittest import TestCase
 from unittest.mock import MagicMock, patch
 
 from parameterized import param, parameterized
+from pyfakefs import fake_filesystem_unittest
 from salt.exceptions import CommandExecutionError
 import yaml
 
 from _modules import metalk8s_volumes
+from _utils import volume_utils
 
 from tests.unit import mixins
 from tests.unit import utils
@@ -19,6 +21,11 @@ with open(YAML_TESTS_FILE) as fd:
     YAML_TESTS_CASES = yaml.safe_load(fd)
 
 
+def lookup_device_mock(path, refresh=False):
+    # Devices are not found in the inventory by default
+    return None
+
+
 def device_name_mock(path):
     if path.startswith("/dev/my_vg/"):
         path = "dm-2"
@@ -31,6 +38,13 @@ class Metalk8sVolumesTestCase(TestCase, mixins.LoaderModuleMockMixin):
     """
 
     loader_module = metalk8s_volumes
+    loader_module_globals = {
+        "__utils__": {
+            "metalk8s_volumes.lookup_device": lookup_device_mock,
+            "metalk8s_volumes.invalidate_probe_cache": MagicMock(),
+            "metalk8s_volumes.invalidate_device_inventory": MagicMock(),
+        }
+    }
 
     def test_virtual(self):
         """
@@ -138,13 +152,12 @@ class Metalk8sVolumesTestCase(TestCase, mixins.LoaderModuleMockMixin):
         """
         pillar_dict = {"metalk8s": {"volumes": pillar_volumes or {}}}
 
-        get_blkid_mock = MagicMock()
-        probe_mock = get_blkid_mock.return_value.__enter__.return_value.probe
+        probe_mock = MagicMock()
         probe_mock.return_value.uuid = uuid_return
 
         utils_dict = {
             "metalk8s_volumes.get_superblock_flags": MagicMock(),
-            "metalk8s_volumes.get_blkid_probe": get_blkid_mock,
+            "metalk8s_volumes.probe_device": probe_mock,
         }
 
         def _device_name(path):
@@ -187,14 +200,15 @@ class Metalk8sVolumesTestCase(TestCase, mixins.LoaderModuleMockMixin):
         """
         pillar_dict = {"metalk8s": {"volumes": pillar_volumes or {}}}
 
-        get_blkid_mock = MagicMock()
-        probe_mock = get_blkid_mock.return_value.__enter__.return_value.probe
+        probe_mock = MagicMock()
         probe_mock.return_value.fstype = current_fstype
         probe_mock.return_value.has_partition = has_partition
+        invalidate_mock = MagicMock()
 
         utils_dict = {
             "metalk8s_volumes.get_superblock_flags": MagicMock(),
-            "metalk8s_volumes.get_blkid_probe": get_blkid_mock,
+            "metalk8s_volumes.probe_device": probe_mock,
+            "metalk8s_volumes.invalidate_probe_cache": invalidate_mock,
         }
 
         if cmd_output is None:
@@ -223,6 +237,8 @@ class Metalk8sVolumesTestCase(TestCase, mixins.LoaderModuleMockMixin):
             else:
                 # This function does not return anything
                 metalk8s_volumes.prepare(name)
+                # Cached probe results are outdated once the volume is prepared
+                invalidate_mock.assert_called_once()
 
     @utils.parameterized_from_cases(YAML_TESTS_CASES["is_cleaned_up"])
     def test_is_cleaned_up(
@@ -294,6 +310,54 @@ class Metalk8sVolumesTestCase(TestCase, mixins.LoaderModuleMockMixin):
             result = metalk8s_volumes.device_name("/dev/my-device")
             self.assertEqual(result, expected)
 
+    def test_device_inventory(self):
+        """
+        Tests that devices are resolved from the device inventory
+        """
+        inventory = {
+            "/dev/nvme0n1p3": {
+                "name": "nvme0n1p3",
+                "size": 4242,
+                "partition": "3",
+                "parent": "nvme0n1",
+                "lvm_path": None,
+            },
+        }
+        pillar_dict = {
+            "metalk8s": {
+                "volumes": {
+                    "my-volume": {
+                        "metadata": {"name": "my-volume", "uid": "my-uid"},
+                        "spec": {
+                            "mode": "Block",
+                            "rawBlockDevice": {"devicePath": "/dev/nvme0n1p3"},
+                        },
+                    }
+                }
+            }
+        }
+        utils_dict = {
+            "metalk8s_volumes.lookup_device": lambda path, refresh=False: (
+                inventory.get(path)
+            )
+        }
+        exists_mock = MagicMock()
+
+        with patch.dict(metalk8s_volumes.__pillar__, pillar_dict), patch.dict(
+            metalk8s_volumes.__utils__, utils_dict
+        ), patch("os.path.exists", exists_mock), patch("glob.glob") as glob_mock:
+            self.assertEqual(
+                metalk8s_volumes.device_name("/dev/nvme0n1p3"),
+                {"success": True, "result": "nvme0n1p3"},
+            )
+            volume = metalk8s_volumes._get_volume("my-volume")
+            self.assertEqual(volume.device_path, "/dev/nvme0n1")
+            self.assertEqual(volume.persistent_path, "/dev/disk/by-partuuid/my-uid")
+
+        # Nothing was resolved outside of the inventory
+        exists_mock.assert_not_called()
+        glob_mock.assert_not_called()
+
     @utils.parameterized_from_cases(YAML_TESTS_CASES["device_info"])
     def test_device_info(
         self,
@@ -304,6 +368,7 @@ class Metalk8sVolumesTestCase(TestCase, mixins.LoaderModuleMockMixin):
         exists_values=True,
         check_udevadm=False,
         pillar_volumes=None,
+        inventory=None,
     ):
         """
         Tests the return of `device_info` function
@@ -330,9 +395,17 @@ class Metalk8sVolumesTestCase(TestCase, mixins.LoaderModuleMockMixin):
         else:
             exists_mock.return_value = exists_values
 
+        utils_dict = {
+            "metalk8s_volumes.lookup_device": lambda path, refresh=False: (
+                (inventory or {}).get(path)
+            )
+        }
+
         with patch.dict(metalk8s_volumes.__pillar__, pillar_dict), patch.dict(
             metalk8s_volumes.__salt__, salt_dict
-        ), patch.object(metalk8s_volumes, "device_name", device_name_mock), patch(
+        ), patch.dict(metalk8s_volumes.__utils__, utils_dict), patch.object(
+            metalk8s_volumes, "device_name", device_name_mock
+        ), patch(
             "glob.glob", glob_mock
         ), patch(
             "os.path.exists", exists_mock
@@ -356,6 +429,142 @@ class Metalk8sVolumesTestCase(TestCase, mixins.LoaderModuleMockMixin):
             else:
                 cmd_mock.assert_not_called()
 
+    def test_prepare_volumes(self):
+        """
+        Tests the return of `prepare_volumes` function
+        """
+        events = []
+
+        def volume_mock(name, group, exists=True, is_prepared=False, error=None):
+            volume = MagicMock(device_group=group, exists=exists)
+            type(volume).is_prepared = is_prepared
+            volume.create.side_effect = lambda: events.append((name, "create"))
+            volume.prepare.side_effect = error or (
+                lambda: events.append((name, "prepare"))
+            )
+            return volume
+
+        volumes = {
+            "vol-1": volume_mock("vol-1", "sda"),
+            "vol-2": volume_mock("vol-2", "sda", exists=False),
+            "vol-3": volume_mock("vol-3", "sdb", is_prepared=True),
+            "vol-4": volume_mock("vol-4", "sdc", error=Exception("Banana")),
+        }
+
+        def get_volume_mock(name):
+            if name not in volumes:
+                raise ValueError("volume {} not found in pillar".format(name))
+            return volumes[name]
+
+        cmd_mock = MagicMock(return_value=utils.cmd_output())
+
+        with patch.object(metalk8s_volumes, "_get_volume", get_volume_mock), patch.dict(
+            metalk8s_volumes.__salt__, {"cmd.run_all": cmd_mock}
+        ):
+            result = metalk8s_volumes.prepare_volumes(
+                ["vol-1", "vol-2", "vol-3", "vol-4", "vol-5"]
+            )
+
+        no_change = {"created": False, "prepared": False, "error": None}
+        self.assertEqual(
+            result,
+            {
+                "vol-1": dict(no_change, prepared=True),
+                "vol-2": dict(no_change, created=True, prepared=True),
+                "vol-3": no_change,
+                "vol-4": dict(no_change, error="Banana"),
+                "vol-5": dict(no_change, error="volume vol-5 not found in pillar"),
+            },
+        )
+        # Volumes on the same device are handled one after the other
+        self.assertEqual(
+            [event for event in events if event[0] in ("vol-1", "vol-2")],
+            [("vol-1", "prepare"), ("vol-2", "create"), ("vol-2", "prepare")],
+        )
+        # Udev is settled once, at the end
+        cmd_mock.assert_called_once_with("udevadm settle --timeout=360")
+
+    @parameterized.expand(
+        [
+            ("disk", "/sys/devices/virtual/block/sda", False, "sda"),
+            ("partition", "/sys/devices/virtual/block/sda/sda1", True, "sda"),
+        ]
+    )
+    def test_get_parent_device(self, _, sys_path, is_partition, expected):
+        with patch("os.path.realpath", MagicMock(return_value=sys_path)), patch(
+            "os.path.exists", MagicMock(return_value=is_partition)
+        ):
+            self.assertEqual(
+                metalk8s_volumes._get_parent_device(os.path.basename(sys_path)),
+                expected,
+            )
+
+    def test_prepare_volumes_from_pillar(self):
+        """
+        Tests that `prepare_volumes` handles all the pillar volumes by default
+        and does not fail if udev events cannot be waited for
+        """
+        pillar_dict = {"metalk8s": {"volumes": {"vol-1": {}, "vol-2": {}}}}
+        volumes = {
+            "vol-1": MagicMock(device_group="sda", exists=True, is_prepared=False),
+            "vol-2": MagicMock(device_group="sdb", exists=True, is_prepared=True),
+        }
+        cmd_mock = MagicMock(
+            return_value=utils.cmd_output(retcode=1, stderr="timed out")
+        )
+
+        with patch.dict(metalk8s_volumes.__pillar__, pillar_dict), patch.object(
+            metalk8s_volumes, "_get_volume", volumes.get
+        ), patch.dict(metalk8s_volumes.__salt__, {"cmd.run_all": cmd_mock}):
+            result = metalk8s_volumes.prepare_volumes()
+
+        no_change = {"created": False, "prepared": False, "error": None}
+        self.assertEqual(
+            result, {"vol-1": dict(no_change, prepared=True), "vol-2": no_change}
+        )
+        cmd_mock.assert_called_once_with("udevadm settle --timeout=360")
+
+    @parameterized.expand(
+        [
+            ("sparse", "my-sparse-volume", None),
+            ("disk", "my-raw-block-device-block-disk-volume", "sdb"),
+            ("partition", "my-raw-block-device-volume", "sda"),
+            ("other-partition", "my-xfs-volume", "sda"),
+            ("lvm", "my-lvm-lv-volume", "lvm:my_vg"),
+            ("other-lvm", "my-lvm-lv-block-volume", "lvm:my_vg"),
+        ]
+    )
+    def test_device_group(self, _, name, expected):
+        """
+        Tests the `device_group` of volumes, partitions of a same disk and
+        LogicalVolumes of a same VolumeGroup sharing one
+        """
+        pillar_dict = {"metalk8s": {"volumes": YAML_TESTS_CASES["_volumes_details"]}}
+
+        def realpath_mock(path):
+            # /sys/class/block/sdXN -> /sys/devices/virtual/block/sdX/sdXN
+            name = os.path.basename(path)
+            disk = name.rstrip("0123456789")
+            if disk != name:
+                return "/sys/devices/virtual/block/{}/{}".format(disk, name)
+            return "/sys/devices/virtual/block/{}".format(name)
+
+        def exists_mock(path):
+            return path.endswith("/partition") and "/block/sd" in os.path.dirname(
+                os.path.dirname(path)
+            )
+
+        with patch.dict(metalk8s_volumes.__pillar__, pillar_dict), patch.object(
+            metalk8s_volumes, "device_name", device_name_mock
+        ), patch("os.path.realpath", realpath_mock), patch(
+            "os.path.exists", exists_mock
+        ):
+            volume = metalk8s_volumes._get_volume(name)
+            if expected is None:
+                # Volumes backed by a file are on their own
+                expected = volume.path
+            self.assertEqual(volume.device_group, expected)
+
 
 class RawBlockDeviceBlockTestCase(TestCase):
     @parameterized.expand(
@@ -372,3 +581,253 @@ class RawBlockDeviceBlockTestCase(TestCase):
     def test_get_partition(self, _, name, expected):
         partition = metalk8s_volumes.RawBlockDeviceBlock._get_partition(name)
         self.assertEqual(partition, expected)
+
+
+class DeviceInventoryTestCase(fake_filesystem_unittest.TestCase):
+    """
+    TestCase for the device inventory of the `metalk8s_volumes` utils
+    """
+
+    def setUp(self):
+        self.setUpPyfakefs()
+        volume_utils.invalidate_device_inventory()
+        self.addCleanup(volume_utils.invalidate_device_inventory)
+
+        sys_devices = "/sys/devices/pci0000:00/block"
+        for path, content in {
+            "sda/size": "4194304",
+            "sda/sda1/size": "2097152",
+            "sda/sda1/partition": "1",
+            "sda/sda2/size": "1048576",
+            "sda/sda2/partition": "2",
+        }.items():
+            self.fs.create_file(os.path.join(sys_devices, path), contents=content)
+        self.fs.create_dir(os.path.join(sys_devices, "sda/sda2/holders/dm-0"))
+        for path, content in {
+            "dm-0/size": "1048576",
+            "dm-0/dm/name": "my_vg-my_lv",
+            "dm-0/dm/uuid": "LVM-abcdef",
+            "dm-1/dm/name": "my-crypt",
+            "dm-1/dm/uuid": "CRYPT-LUKS2-abcdef",
+        }.items():
+            self.fs.create_file(
+                os.path.join("/sys/devices/virtual/block", path), contents=content
+            )
+
+        for name, target in {
+            "sda": sys_devices + "/sda",
+            "sda1": sys_devices + "/sda/sda1",
+            "sda2": sys_devices + "/sda/sda2",
+            "dm-0": "/sys/devices/virtual/block/dm-0",
+            "dm-1": "/sys/devices/virtual/block/dm-1",
+        }.items():
+            self.fs.create_symlink(os.path.join("/sys/class/block", name), target)
+            self.fs.create_file(os.path.join("/dev", name))
+
+        self.fs.create_symlink("/dev/disk/by-uuid/my-fs-uuid", "/dev/dm-0")
+        self.fs.create_symlink("/dev/disk/by-partuuid/my-part-uuid", "/dev/sda1")
+        self.fs.create_symlink("/dev/my_vg/my_lv", "/dev/dm-0")
+
+    def test_build_device_inventory(self):
+        """
+        Tests the inventory built from `/sys/class/block` and `/dev/disk`
+        """
+        self.assertEqual(
+            volume_utils.get_device_inventory(),
+            {
+                "devices": {
+                    "dm-0": {
+                        "name": "dm-0",
+                        "size": 536870912,
+                        "partition": None,
+                        "parent": None,
+                        "dm_name": "my_vg-my_lv",
+                        "lvm_path": "/dev/disk/by-id/dm-uuid-LVM-abcdef",
+                        "holders": [],
+                    },
+                    "dm-1": {
+                        "name": "dm-1",
+                        "size": None,
+                        "partition": None,
+                        "parent": None,
+                        "dm_name": "my-crypt",
+                        "lvm_path": None,
+                        "holders": [],
+                    },
+                    "sda": {
+                        "name": "sda",
+                        "size": 2147483648,
+                        "partition": None,
+                        "parent": None,
+                        "dm_name": None,
+                        "lvm_path": None,
+                        "holders": [],
+                    },
+                    "sda1": {
+                        "name": "sda1",
+                        "size": 1073741824,
+                        "partition": "1",
+                        "parent": "sda",
+                        "dm_name": None,
+                        "lvm_path": None,
+                        "holders": [],
+                    },
+                    "sda2": {
+                        "name": "sda2",
+                        "size": 536870912,
+                        "partition": "2",
+                        "parent": "sda",
+                        "dm_name": None,
+                        "lvm_path": None,
+                        "holders": ["dm-0"],
+                    },
+                },
+                "by_uuid": {"my-fs-uuid": "dm-0"},
+                "by_partuuid": {"my-part-uuid": "sda1"},
+            },
+        )
+
+    @parameterized.expand(
+        [
+            ("by-uuid", "/dev/disk/by-uuid/my-fs-uuid", "dm-0"),
+            ("by-partuuid", "/dev/disk/by-partuuid/my-part-uuid", "sda1"),
+            ("device", "/dev/sda2", "sda2"),
+            ("symlink", "/dev/my_vg/my_lv", "dm-0"),
+            ("unknown-uuid", "/dev/disk/by-uuid/unknown", None),
+            ("unknown-device", "/dev/sdz", None),
+        ]
+    )
+    def test_lookup_device(self, _, path, expected):
+        """
+        Tests the return of `lookup_device` function
+        """
+        device = volume_utils.lookup_device(path)
+        self.assertEqual(device and device["name"], expected)
+
+    def test_device_inventory_cache(self):
+        """
+        Tests that the inventory is reused until invalidated
+        """
+        inventory = volume_utils.get_device_inventory()
+        self.fs.create_file("/sys/devices/virtual/block/sdb/size", contents="8")
+        self.fs.create_symlink("/sys/class/block/sdb", "/sys/devices/virtual/block/sdb")
+
+        self.assertIs(volume_utils.get_device_inventory(), inventory)
+        self.assertIsNone(volume_utils.lookup_device("/dev/sdb"))
+        self.assertEqual(
+            volume_utils.lookup_device("/dev/sdb", refresh=True)["size"], 4096
+        )
+
+        volume_utils.invalidate_device_inventory()
+        self.assertIsNot(volume_utils.get_device_inventory(), inventory)
+
+
+class ProbeCacheTestCase(TestCase):
+    """
+    TestCase for the probe results cache of the `metalk8s_volumes` utils
+    """
+
+    def setUp(self):
+        volume_utils.invalidate_probe_cache()
+        self.addCleanup(volume_utils.invalidate_probe_cache)
+
+        self.stats = {
+            "/dev/sda": {"st_rdev": 2048, "st_mtime_ns": 1000, "st_size": 0},
+            "/dev/sdb": {"st_rdev": 2064, "st_mtime_ns": 1000, "st_size": 0},
+        }
+
+        def _stat(path):
+            if path not in self.stats:
+                raise FileNotFoundError(path)
+            return MagicMock(**self.stats[path])
+
+        self.probed = []
+
+        def _probe(filepath, *_):
+            probe = MagicMock()
+            probe.__enter__.return_value.probe.return_value = "<{} info #{}>".format(
+                filepath, len(self.probed)
+            )
+            self.probed.append(filepath)
+            return probe
+
+        for target, mock in [
+            ("os.stat", MagicMock(side_effect=_stat)),
+            ("os.path.realpath", MagicMock(side_effect=lambda path: path)),
+            (
+                "_utils.volume_utils.get_blkid_probe",
+                MagicMock(side_effect=_probe),
+            ),
+        ]:
+            patcher = patch(target, mock)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_probe_cache_hit(self):
+        """
+        Tests that a device is probed once while it does not change
+        """
+        info = volume_utils.probe_device("/dev/sda")
+        self.assertEqual(volume_utils.probe_device("/dev/sda"), info)
+        self.assertEqual(self.probed, ["/dev/sda"])
+
+        # Probe configuration is part of the cache key
+        volume_utils.probe_device("/dev/sda", use_partitions=True)
+        self.assertEqual(self.probed, ["/dev/sda", "/dev/sda"])
+
+    @parameterized.expand(
+        [
+            ("device number", "st_rdev", 2049),
+            ("modification time", "st_mtime_ns", 2000),
+            ("size", "st_size", 4096),
+        ]
+    )
+    def test_probe_cache_device_changed(self, _, attr, value):
+        """
+        Tests that a device is probed again once its `stat` changes
+        """
+        info = volume_utils.probe_device("/dev/sda")
+        self.stats["/dev/sda"][attr] = value
+
+        self.assertNotEqual(volume_utils.probe_device("/dev/sda"), info)
+        self.assertEqual(self.probed, ["/dev/sda", "/dev/sda"])
+
+    def test_probe_cache_refresh(self):
+        """
+        Tests that a device is always probed with `refresh`
+        """
+        volume_utils.probe_device("/dev/sda")
+        volume_utils.probe_device("/dev/sda", refresh=True)
+        self.assertEqual(self.probed, ["/dev/sda", "/dev/sda"])
+
+        # The refreshed result is cached
+        volume_utils.probe_device("/dev/sda")
+        self.assertEqual(len(self.probed), 2)
+
+    def test_probe_cache_missing_device(self):
+        """
+        Tests that results are not cached if the device cannot be `stat`-ed
+        """
+        for _ in range(2):
+            volume_utils.probe_device("/dev/sdz")
+        self.assertEqual(self.probed, ["/dev/sdz", "/dev/sdz"])
+
+    def test_invalidate_probe_cache(self):
+        """
+        Tests that `invalidate_probe_cache` only drops the given device results
+        """
+        for path in ["/dev/sda", "/dev/sdb"]:
+            volume_utils.probe_device(path)
+            volume_utils.probe_device(path, use_partitions=True)
+        self.assertEqual(len(self.probed), 4)
+
+        volume_utils.invalidate_probe_cache("/dev/sda")
+        for path in ["/dev/sda", "/dev/sdb"]:
+            volume_utils.probe_device(path)
+            volume_utils.probe_device(path, use_partitions=True)
+        self.assertEqual(self.probed[4:], ["/dev/sda", "/dev/sda"])
+
+        # Without a device, all results are dropped
+        volume_utils.invalidate_probe_cache()
+        volume_utils.probe_device("/dev/sdb")
+        self.assertEqual(self.probed[6:], ["/dev/sdb"])
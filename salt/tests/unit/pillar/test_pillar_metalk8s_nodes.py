@@ -0,0 +1,146 @@
+import os.path
+import shutil
+import tempfile
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+import salt.config
+from salt.exceptions import CommandExecutionError
+
+from _pillar import metalk8s_nodes
+from _utils import pillar_utils
+
+from tests.unit import mixins
+
+
+NODES = [
+    {
+        "metadata": {
+            "name": "my-node",
+            "labels": {
+                "metalk8s.scality.com/version": "2.8.0",
+                "node-role.kubernetes.io/master": "",
+            },
+        }
+    },
+]
+
+
+class Metalk8sNodesPillarTestCase(TestCase, mixins.LoaderModuleMockMixin):
+    """
+    TestCase for `metalk8s_nodes` ext_pillar
+    """
+
+    loader_module = metalk8s_nodes
+
+    def loader_module_globals(self):
+        self.cachedir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cachedir)
+
+        opts = salt.config.master_config(None)
+        opts["cachedir"] = self.cachedir
+
+        self.kubeconfig = os.path.join(self.cachedir, "admin.conf")
+        with open(self.kubeconfig, "w"):
+            pass
+
+        return {
+            "__opts__": opts,
+            "__utils__": {
+                "pillar_utils.errors_to_dict": pillar_utils.errors_to_dict,
+                "pillar_utils.promote_errors": pillar_utils.promote_errors,
+            },
+        }
+
+    def _ext_pillar(self, times, get_object=None, list_objects=None):
+        """Run `ext_pillar` at each of the given times, return the results
+        and the `list_objects` mock"""
+
+        def _list_objects(kind, **_):
+            return {"Node": NODES}.get(kind, [])
+
+        list_objects_mock = MagicMock(side_effect=list_objects or _list_objects)
+        get_object_mock = get_object or MagicMock(
+            return_value={
+                "metadata": {
+                    "annotations": {"metalk8s.scality.com/cluster-version": "2.8.0"}
+                }
+            }
+        )
+        salt_dict = {
+            "metalk8s_kubernetes.get_object": get_object_mock,
+            "metalk8s_kubernetes.list_objects": list_objects_mock,
+        }
+
+        results = []
+        with patch.dict(metalk8s_nodes.__salt__, salt_dict):
+            for now in times:
+                with patch("time.time", MagicMock(return_value=now)):
+                    results.append(
+                        metalk8s_nodes.ext_pillar("my-node", {}, self.kubeconfig)
+                    )
+
+        return results, list_objects_mock
+
+    def _node_lists(self, list_objects_mock):
+        return [
+            call
+            for call in list_objects_mock.call_args_list
+            if call[1]["kind"] == "Node"
+        ]
+
+    def test_snapshot_cache_hit(self):
+        """
+        Tests that the cluster snapshot is shared by the renders made within
+        `SNAPSHOT_TTL`
+        """
+        results, list_objects_mock = self._ext_pillar([1000, 1005])
+
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(
+            results[0]["metalk8s"]["nodes"],
+            {"my-node": {"roles": ["master"], "version": "2.8.0"}},
+        )
+        self.assertEqual(len(self._node_lists(list_objects_mock)), 1)
+
+    def test_snapshot_cache_expiry(self):
+        """
+        Tests that the cluster snapshot is rebuilt once older than
+        `SNAPSHOT_TTL`
+        """
+        _, list_objects_mock = self._ext_pillar([1000, 1000 + 10])
+
+        self.assertEqual(len(self._node_lists(list_objects_mock)), 2)
+
+    def test_snapshot_cache_nodes_changed(self):
+        """
+        Tests that the cluster snapshot is rebuilt after a Node write, even if
+        the write happened while the snapshot was being built
+        """
+        cache = metalk8s_nodes.salt.cache.Cache(metalk8s_nodes.__opts__)
+
+        self._ext_pillar([1000])
+        cache.store("metalk8s_nodes", "nodes-changed", {"time": 1000})
+        _, list_objects_mock = self._ext_pillar([1001, 1002])
+
+        self.assertEqual(len(self._node_lists(list_objects_mock)), 1)
+
+    def test_snapshot_cache_errors(self):
+        """
+        Tests that a cluster snapshot with errors is not stored
+        """
+        get_object_mock = MagicMock(side_effect=CommandExecutionError("Banana"))
+
+        results, list_objects_mock = self._ext_pillar(
+            [1000, 1001], get_object=get_object_mock
+        )
+
+        self.assertEqual(
+            results[1]["metalk8s"]["cluster_version"],
+            {"_errors": "Unable to read namespace information Banana"},
+        )
+        self.assertEqual(len(self._node_lists(list_objects_mock)), 2)
+
+        # The snapshot is stored again once successfully built
+        _, list_objects_mock = self._ext_pillar([1002, 1003])
+        self.assertEqual(len(self._node_lists(list_objects_mock)), 1)
@@ -1,12 +1,17 @@
 import os.path
+import shutil
+import tempfile
 from unittest import TestCase
 from unittest.mock import MagicMock, patch
 
 from parameterized import param, parameterized
-from salt.exceptions import CommandExecutionError
+import salt.cache
+import salt.config
+from salt.exceptions import CommandExecutionError, SaltCacheError
 import yaml
 
 from _runners import metalk8s_saltutil
+from _utils import wait_utils
 
 from tests.unit import mixins
 from tests.unit import utils
@@ -25,6 +30,9 @@ class Metalk8sSaltutilTestCase(TestCase, mixins.LoaderModuleMockMixin):
     """
 
     loader_module = metalk8s_saltutil
+    loader_module_globals = {
+        "__utils__": {"wait_utils.wait_for": wait_utils.wait_for},
+    }
 
     def test_sync_auth(self):
         """
@@ -41,6 +49,50 @@ class Metalk8sSaltutilTestCase(TestCase, mixins.LoaderModuleMockMixin):
                 {"saltenv": "my-salt-env"}, sync_mock.call_args[1]
             )
 
+    def test_auth_cache_stats(self):
+        """
+        Tests the return of `auth_cache_stats` function, only summing the
+        statistics of running processes
+        """
+        cachedir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cachedir)
+        opts = salt.config.master_config(None)
+        opts["cachedir"] = cachedir
+
+        cache = salt.cache.Cache(opts)
+        for pid, hits in [(1, 3), (2, 4), (3, 100)]:
+            cache.store(
+                "kubernetes_rbac",
+                "stats-{}".format(pid),
+                {"hits": hits, "misses": 1, "size": 2, "time": 1000},
+            )
+
+        with patch.dict(metalk8s_saltutil.__opts__, opts), patch(
+            "salt.utils.process.os_is_running",
+            MagicMock(side_effect=lambda pid: pid != 3),
+        ):
+            self.assertEqual(
+                metalk8s_saltutil.auth_cache_stats(),
+                {"hits": 7, "misses": 2, "size": 4, "processes": 2},
+            )
+
+        self.assertEqual(sorted(cache.list("kubernetes_rbac")), ["stats-1", "stats-2"])
+
+    def test_auth_cache_stats_error(self):
+        """
+        Tests the return of `auth_cache_stats` function, when the master
+        cache cannot be read
+        """
+        cache_mock = MagicMock()
+        cache_mock.return_value.list.side_effect = SaltCacheError("Banana")
+
+        with patch("salt.cache.Cache", cache_mock):
+            self.assertRaisesRegex(
+                CommandExecutionError,
+                "Unable to read review cache statistics: Banana",
+                metalk8s_saltutil.auth_cache_stats,
+            )
+
     @utils.parameterized_from_cases(YAML_TESTS_CASES["wait_minions"])
     def test_wait_minions(
         self, result, ping_ret=True, is_running_ret=False, raises=False
@@ -68,9 +120,11 @@ class Metalk8sSaltutilTestCase(TestCase, mixins.LoaderModuleMockMixin):
         salt_client_mock = MagicMock()
         salt_client_mock.return_value.cmd.side_effect = cmd_mock
 
-        with patch("salt.client.get_local_client", salt_client_mock), patch(
-            "time.sleep", MagicMock()
-        ), patch.dict(metalk8s_saltutil.__opts__, {"conf_file": "my-conf"}):
+        with patch(
+            "salt.client.get_local_client", salt_client_mock
+        ), utils.fake_clock() as sleep_mock, patch.dict(
+            metalk8s_saltutil.__opts__, {"conf_file": "my-conf"}
+        ):
             if raises:
                 self.assertRaisesRegex(
                     CommandExecutionError,
@@ -80,6 +134,12 @@ class Metalk8sSaltutilTestCase(TestCase, mixins.LoaderModuleMockMixin):
             else:
                 self.assertEqual(metalk8s_saltutil.wait_minions(), result)
 
+        # Running states are waited for 5 seconds per retry
+        if raises and "running state" in result:
+            self.assertAlmostEqual(
+                sum(call[0][0] for call in sleep_mock.call_args_list), 50
+            )
+
         # If we retry, check that we used all expected attempts
         if isinstance(ping_ret, list):
             self.assertEqual(len(ping_ret), 0)
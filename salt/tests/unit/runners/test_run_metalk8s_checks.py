@@ -39,9 +39,9 @@ class Metalk8sChecksTestCase(TestCase, mixins.LoaderModuleMockMixin):
         Tests the return of `nodes` function
         """
 
-        def cmd_mock(fun, name, **_kwargs):
-            if fun == "metalk8s_kubernetes.get_object":
-                return nodes.get(name)
+        def cmd_mock(fun, **_kwargs):
+            if fun == "metalk8s_kubernetes.list_objects":
+                return list((nodes or {}).values())
             return None
 
         salt_dict = {"salt.cmd": MagicMock(side_effect=cmd_mock)}
@@ -56,6 +56,9 @@ class Metalk8sChecksTestCase(TestCase, mixins.LoaderModuleMockMixin):
             else:
                 self.assertEqual(metalk8s_checks.nodes(**kwargs), result)
 
+            # All the Nodes are retrieved at once
+            salt_dict["salt.cmd"].assert_called_once()
+
     @utils.parameterized_from_cases(YAML_TESTS_CASES["minions"])
     def test_minions(
         self, result, pillar=None, expect_raise=False, ping_ret=None, **kwargs
@@ -75,6 +78,34 @@ class Metalk8sChecksTestCase(TestCase, mixins.LoaderModuleMockMixin):
             else:
                 self.assertEqual(metalk8s_checks.minions(**kwargs), result)
 
+    @utils.parameterized_from_cases(YAML_TESTS_CASES["node_checks"])
+    def test_node_checks(
+        self, result, pillar=None, expect_raise=False, checks_ret=None, **kwargs
+    ):
+        """
+        Tests the return of `node_checks` function
+        """
+        salt_dict = {"salt.execute": MagicMock(return_value=checks_ret)}
+
+        with patch.dict(metalk8s_checks.__pillar__, pillar or {}), patch.dict(
+            metalk8s_checks.__salt__, salt_dict
+        ):
+            if expect_raise:
+                self.assertRaisesRegex(
+                    CheckError, result, metalk8s_checks.node_checks, **kwargs
+                )
+            else:
+                ret = metalk8s_checks.node_checks(**kwargs)
+                if kwargs.get("timings"):
+                    self.assertIsInstance(ret.pop("duration"), float)
+                self.assertEqual(ret, result)
+
+            # All the minions are checked in a single job
+            salt_dict["salt.execute"].assert_called_once()
+            self.assertEqual(
+                salt_dict["salt.execute"].call_args[0][1], "metalk8s_checks.node"
+            )
+
     @utils.parameterized_from_cases(YAML_TESTS_CASES["upgrade"])
     def test_upgrade(
         self,
@@ -83,6 +114,7 @@ class Metalk8sChecksTestCase(TestCase, mixins.LoaderModuleMockMixin):
         expect_raise=False,
         nodes_ret=True,
         minions_ret=True,
+        node_checks_ret=True,
         **kwargs
     ):
         """
@@ -90,6 +122,7 @@ class Metalk8sChecksTestCase(TestCase, mixins.LoaderModuleMockMixin):
         """
         nodes_mock = MagicMock(return_value=nodes_ret)
         minions_mock = MagicMock(return_value=minions_ret)
+        node_checks_mock = MagicMock(return_value=node_checks_ret)
 
         def cmd_mock(fun, *args, **kwargs):
             if fun == "pkg.version_cmp":
@@ -100,7 +133,11 @@ class Metalk8sChecksTestCase(TestCase, mixins.LoaderModuleMockMixin):
 
         salt_dict = {"salt.cmd": MagicMock(side_effect=cmd_mock)}
 
-        module_mocks = {"nodes": nodes_mock, "minions": minions_mock}
+        module_mocks = {
+            "nodes": nodes_mock,
+            "minions": minions_mock,
+            "node_checks": node_checks_mock,
+        }
 
         with patch.multiple(metalk8s_checks, **module_mocks), patch.dict(
             metalk8s_checks.__pillar__, pillar or {}
@@ -114,6 +151,11 @@ class Metalk8sChecksTestCase(TestCase, mixins.LoaderModuleMockMixin):
 
             nodes_mock.assert_called_once()
             minions_mock.assert_called_once()
+            # Node checks are only run if all the minions answer
+            if minions_ret is True:
+                node_checks_mock.assert_called_once()
+            else:
+                node_checks_mock.assert_not_called()
 
     @utils.parameterized_from_cases(YAML_TESTS_CASES["downgrade"])
     def test_downgrade(
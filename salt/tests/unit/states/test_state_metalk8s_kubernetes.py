@@ -0,0 +1,300 @@
+import time
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+from salt.exceptions import CommandExecutionError
+
+from _states import metalk8s_kubernetes
+from _utils import wait_utils
+
+from tests.unit import mixins
+from tests.unit import utils
+
+
+OBJECT = {
+    "apiVersion": "v1",
+    "kind": "ConfigMap",
+    "metadata": {
+        "name": "my-config",
+        "namespace": "my-namespace",
+        "resourceVersion": "1",
+    },
+}
+
+
+class Metalk8sKubernetesStateTestCase(TestCase, mixins.LoaderModuleMockMixin):
+    """
+    TestCase for `metalk8s_kubernetes` state module
+    """
+
+    loader_module = metalk8s_kubernetes
+    loader_module_globals = {
+        "__env__": "base",
+        "__opts__": {"test": False},
+        "__utils__": {"wait_utils.wait_for": wait_utils.wait_for},
+    }
+
+    def _object_absent_wait(self, get_object_ret, watch_objects):
+        """Run `object_absent` with `wait`, return its result and the mocks"""
+        get_object_mock = MagicMock(side_effect=get_object_ret)
+        salt_dict = {
+            "metalk8s_kubernetes.get_object": get_object_mock,
+            "metalk8s_kubernetes.delete_object": MagicMock(return_value=OBJECT),
+            "metalk8s_kubernetes.watch_objects": watch_objects,
+        }
+
+        with patch.dict(metalk8s_kubernetes.__salt__, salt_dict), utils.fake_clock(
+            start=0
+        ) as sleep_mock:
+            ret = metalk8s_kubernetes.object_absent(
+                "my-config",
+                manifest=OBJECT,
+                wait={"attempts": 5, "sleep": 5},
+            )
+
+        return ret, get_object_mock, sleep_mock
+
+    def test_object_absent_wait_watch(self):
+        """
+        Tests that `object_absent` checks again as soon as an event is
+        received, watching from the last seen resourceVersion
+        """
+        watch_mock = MagicMock(return_value=iter([{"type": "DELETED"}]))
+
+        ret, get_object_mock, sleep_mock = self._object_absent_wait(
+            [
+                OBJECT,
+                dict(OBJECT, metadata=dict(OBJECT["metadata"], resourceVersion="2")),
+                None,
+            ],
+            watch_mock,
+        )
+
+        self.assertEqual(
+            ret,
+            {
+                "name": "my-config",
+                "changes": {"old": "present", "new": "absent"},
+                "result": True,
+                "comment": "The object was deleted and not present after 2 check attempts",
+            },
+        )
+        self.assertEqual(get_object_mock.call_count, 3)
+        watch_mock.assert_called_once()
+        self.assertDictContainsSubset(
+            {
+                "kind": "ConfigMap",
+                "apiVersion": "v1",
+                "namespace": "my-namespace",
+                "field_selector": "metadata.name=my-config",
+                "resource_version": "2",
+            },
+            watch_mock.call_args[1],
+        )
+        sleep_mock.assert_not_called()
+
+    def test_object_absent_wait_watch_no_event(self):
+        """
+        Tests that `object_absent` does not spin when the watch ends early
+        without any event
+        """
+        watch_mock = MagicMock(return_value=iter([]))
+
+        ret, get_object_mock, sleep_mock = self._object_absent_wait(
+            [OBJECT, OBJECT, None], watch_mock
+        )
+
+        self.assertTrue(ret["result"])
+        watch_mock.assert_called_once()
+        sleep_mock.assert_called_once()
+
+    def test_object_absent_wait_watch_failure(self):
+        """
+        Tests that `object_absent` falls back to polling when the watch fails
+        """
+        watch_mock = MagicMock(side_effect=CommandExecutionError("Banana"))
+
+        ret, get_object_mock, sleep_mock = self._object_absent_wait(
+            [OBJECT, OBJECT, OBJECT, None], watch_mock
+        )
+
+        self.assertEqual(
+            ret["comment"],
+            "The object was deleted and not present after 3 check attempts",
+        )
+        self.assertTrue(ret["result"])
+        # The watch is not used anymore once it failed
+        watch_mock.assert_called_once()
+        self.assertEqual(sleep_mock.call_count, 2)
+
+    def test_object_absent_wait_timeout(self):
+        """
+        Tests that `object_absent` gives up after `attempts * sleep` seconds
+        """
+        watch_mock = MagicMock(side_effect=CommandExecutionError("Banana"))
+
+        ret, _, sleep_mock = self._object_absent_wait(lambda **_: OBJECT, watch_mock)
+
+        self.assertFalse(ret["result"])
+        self.assertRegex(ret["comment"], "^The object is still present after")
+        self.assertAlmostEqual(
+            sum(call[0][0] for call in sleep_mock.call_args_list), 25
+        )
+
+    def test_objects_present_changes(self):
+        """
+        Tests that `objects_present` only reports the objects created or
+        actually changed by the apply, from the apply responses
+        """
+
+        def _config(name, created=None, applied=None):
+            obj = {
+                "apiVersion": "v1",
+                "kind": "ConfigMap",
+                "metadata": {"name": name, "namespace": "my-namespace"},
+            }
+            if created:
+                obj["metadata"]["creationTimestamp"] = created
+                obj["metadata"]["managedFields"] = [
+                    {"manager": "kubectl", "operation": "Update", "time": created},
+                    {"manager": "salt", "operation": "Apply", "time": applied},
+                ]
+            return obj
+
+        # Apply started at 1970-01-01T00:16:40Z
+        applied = {
+            "created": _config(
+                "created", "1970-01-01T00:16:40Z", "1970-01-01T00:16:40Z"
+            ),
+            "unchanged": _config(
+                "unchanged", "1970-01-01T00:00:00Z", "1970-01-01T00:10:00Z"
+            ),
+            "updated": _config(
+                "updated", "1970-01-01T00:00:00Z", "1970-01-01T00:16:41Z"
+            ),
+        }
+
+        def _apply_object(manifest, **_):
+            name = manifest["metadata"]["name"]
+            if name == "failed":
+                raise CommandExecutionError("Banana")
+            if name == "broken":
+                raise KeyError("metadata")
+            return applied[name]
+
+        get_object_mock = MagicMock()
+        salt_dict = {
+            "metalk8s_kubernetes.get_object": get_object_mock,
+            "metalk8s_kubernetes.apply_object": MagicMock(side_effect=_apply_object),
+        }
+
+        with patch.dict(metalk8s_kubernetes.__salt__, salt_dict), patch(
+            "time.gmtime", MagicMock(return_value=time.gmtime(1000))
+        ):
+            ret = metalk8s_kubernetes.objects_present(
+                "my-objects",
+                [
+                    _config(name)
+                    for name in ["created", "unchanged", "updated", "failed", "broken"]
+                ],
+            )
+
+        get_object_mock.assert_not_called()
+        self.assertFalse(ret["result"])
+        self.assertEqual(
+            ret["changes"],
+            {
+                "v1/ConfigMap 'my-namespace/created'": "created",
+                "v1/ConfigMap 'my-namespace/updated'": "updated",
+            },
+        )
+        self.assertEqual(
+            ret["comment"],
+            "3 object(s) applied, 2 changed, 2 failed:\n"
+            "- v1/ConfigMap 'my-namespace/failed': Banana\n"
+            "- v1/ConfigMap 'my-namespace/broken': 'metadata'",
+        )
+
+    def _objects_present_crd(self, conditions):
+        """Run `objects_present` with a CRD and a custom resource, the CRD
+        having the given conditions on each check, return its result and
+        the mocks"""
+        crd = {
+            "apiVersion": "apiextensions.k8s.io/v1",
+            "kind": "CustomResourceDefinition",
+            "metadata": {"name": "bananas.fruits.io"},
+        }
+        banana = {
+            "apiVersion": "fruits.io/v1",
+            "kind": "Banana",
+            "metadata": {"name": "my-banana"},
+        }
+
+        def _with_conditions(obj, conditions):
+            return dict(obj, status={"conditions": conditions})
+
+        apply_object_mock = MagicMock(
+            side_effect=lambda manifest, **_: _with_conditions(manifest, [])
+        )
+        get_object_mock = MagicMock(
+            side_effect=[_with_conditions(crd, c) for c in conditions]
+        )
+        salt_dict = {
+            "metalk8s_kubernetes.get_object": get_object_mock,
+            "metalk8s_kubernetes.apply_object": apply_object_mock,
+        }
+
+        with patch.dict(metalk8s_kubernetes.__salt__, salt_dict), utils.fake_clock(
+            start=0
+        ):
+            ret = metalk8s_kubernetes.objects_present("my-objects", [banana, crd])
+
+        return ret, apply_object_mock, get_object_mock
+
+    def test_objects_present_crd_established(self):
+        """
+        Tests that `objects_present` waits for CRDs to be established before
+        applying custom resources
+        """
+        established = [{"type": "Established", "status": "True"}]
+        ret, apply_object_mock, get_object_mock = self._objects_present_crd(
+            [[], [{"type": "Established", "status": "False"}], established]
+        )
+
+        self.assertTrue(ret["result"])
+        self.assertEqual(get_object_mock.call_count, 3)
+        self.assertEqual(
+            [call[1]["manifest"]["kind"] for call in apply_object_mock.call_args_list],
+            ["CustomResourceDefinition", "Banana"],
+        )
+
+    def test_objects_present_crd_not_established(self):
+        """
+        Tests that `objects_present` does not apply custom resources if their
+        CRD is not established in time
+        """
+        ret, apply_object_mock, _ = self._objects_present_crd([[]] * 100)
+
+        self.assertFalse(ret["result"])
+        self.assertEqual(
+            ret["comment"],
+            "1 object(s) applied, 0 changed, 1 failed:\n"
+            "- apiextensions.k8s.io/v1/CustomResourceDefinition "
+            "'bananas.fruits.io': Not established after 60 seconds",
+        )
+        apply_object_mock.assert_called_once()
+
+    def test_objects_present_crd_error(self):
+        """
+        Tests that `objects_present` reports errors while waiting for CRDs
+        """
+        with patch.object(
+            metalk8s_kubernetes,
+            "_is_established",
+            MagicMock(side_effect=[False, CommandExecutionError("Banana")]),
+        ):
+            ret, apply_object_mock, _ = self._objects_present_crd([[]])
+
+        self.assertFalse(ret["result"])
+        self.assertRegex(ret["comment"], "'bananas.fruits.io': Banana$")
+        apply_object_mock.assert_called_once()
@@ -0,0 +1,123 @@
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+from parameterized import parameterized
+
+from _states import metalk8s_volumes
+
+from tests.unit import mixins
+
+
+PREPARE_RESULTS = {
+    "my-volume": {"created": True, "prepared": True, "error": None},
+    "my-failed-volume": {"created": False, "prepared": False, "error": "Banana"},
+}
+
+
+class Metalk8sVolumesStateTestCase(TestCase, mixins.LoaderModuleMockMixin):
+    """
+    TestCase for `metalk8s_volumes` state module
+    """
+
+    loader_module = metalk8s_volumes
+    loader_module_globals = {"__opts__": {"test": False}}
+
+    @parameterized.expand([(True, False), (False, True)])
+    def test_volumes_prepared(self, fail_on_errors, result):
+        """
+        Tests the return of `volumes_prepared` function, keeping the result
+        of each volume for `batch_prepared`
+        """
+        prepare_volumes_mock = MagicMock(return_value=PREPARE_RESULTS)
+
+        with patch.dict(
+            metalk8s_volumes.__salt__,
+            {"metalk8s_volumes.prepare_volumes": prepare_volumes_mock},
+        ):
+            ret = metalk8s_volumes.volumes_prepared(
+                "my-volumes",
+                volumes=list(PREPARE_RESULTS),
+                fail_on_errors=fail_on_errors,
+            )
+
+        self.assertEqual(ret["result"], result)
+        self.assertEqual(ret["changes"], {"my-volume": "Prepared"})
+        self.assertIn(
+            "Failed to prepare volume my-failed-volume: Banana.", ret["comment"]
+        )
+        self.assertEqual(
+            metalk8s_volumes.__context__[metalk8s_volumes.BATCH_RESULTS_KEY],
+            PREPARE_RESULTS,
+        )
+
+    @parameterized.expand(
+        [
+            ("my-volume", True, "Volume my-volume prepared."),
+            (
+                "my-failed-volume",
+                False,
+                "Failed to prepare volume my-failed-volume: Banana.",
+            ),
+        ]
+    )
+    def test_batch_prepared(self, name, result, comment):
+        """
+        Tests the return of `batch_prepared` function, from the results of
+        `volumes_prepared`
+        """
+        salt_mock = MagicMock()
+
+        with patch.dict(
+            metalk8s_volumes.__context__,
+            {metalk8s_volumes.BATCH_RESULTS_KEY: PREPARE_RESULTS},
+        ), patch.dict(
+            metalk8s_volumes.__salt__, {"metalk8s_volumes.exists": salt_mock}
+        ):
+            self.assertEqual(
+                metalk8s_volumes.batch_prepared(name),
+                {"name": name, "changes": {}, "result": result, "comment": comment},
+            )
+
+        salt_mock.assert_not_called()
+
+    @parameterized.expand(
+        [
+            # Volume created and prepared
+            (
+                True,
+                True,
+                {"my-volume": "Prepared"},
+                "Storage for volume my-volume created.\nVolume my-volume prepared.",
+            ),
+            # Volume creation failed
+            (
+                False,
+                False,
+                {},
+                "Cannot create storage for volume my-volume: Banana.",
+            ),
+        ]
+    )
+    def test_batch_prepared_alone(self, create_ok, result, changes, comment):
+        """
+        Tests the return of `batch_prepared` function, for a volume not
+        handled by `volumes_prepared`
+        """
+        create_mock = MagicMock()
+        if not create_ok:
+            create_mock.side_effect = Exception("Banana")
+        prepare_mock = MagicMock()
+        salt_dict = {
+            "metalk8s_volumes.exists": MagicMock(return_value=False),
+            "metalk8s_volumes.create": create_mock,
+            "metalk8s_volumes.is_prepared": MagicMock(return_value=False),
+            "metalk8s_volumes.prepare": prepare_mock,
+        }
+
+        with patch.dict(metalk8s_volumes.__salt__, salt_dict):
+            ret = metalk8s_volumes.batch_prepared("my-volume")
+
+        self.assertEqual(ret["result"], result)
+        self.assertEqual(ret["changes"], changes)
+        self.assertEqual(ret["comment"], comment)
+        self.assertEqual(prepare_mock.call_count, int(create_ok))
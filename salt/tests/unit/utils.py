@@ -2,8 +2,10 @@
 Utils, helpers for testing
 """
 import builtins
+import contextlib
 import functools
 import operator
+from unittest.mock import patch
 
 from parameterized import param, parameterized
 
@@ -20,6 +22,22 @@ def cmd_output(retcode=0, stdout=None, stderr=None, pid=12345):
     }
 
 
+@contextlib.contextmanager
+def fake_clock(start=1000.0):
+    """
+    Simple helper to patch `time.time` and `time.sleep`, the clock only
+    moving forward when sleeping
+    """
+    now = [start]
+
+    def _sleep(seconds):
+        now[0] += seconds
+
+    with patch("time.time", lambda: now[0]), patch("time.sleep") as sleep_mock:
+        sleep_mock.side_effect = _sleep
+        yield sleep_mock
+
+
 def parameterized_from_cases(test_cases):
     return parameterized.expand(
         param.explicit(kwargs=test_case) for test_case in test_cases
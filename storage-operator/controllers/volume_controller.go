@@ -31,6 +31,7 @@ import (
 	metav1 "k8s.io/apimachinery/pkg/apis/meta/v1"
 	"k8s.io/apimachinery/pkg/runtime"
 	"k8s.io/apimachinery/pkg/types"
+	"k8s.io/apimachinery/pkg/util/validation"
 	"k8s.io/client-go/rest"
 	"k8s.io/client-go/tools/record"
 	ctrl "sigs.k8s.io/controller-runtime"
@@ -221,6 +222,9 @@ reclaim its storage and remove the finalizers to let the object be deleted.
 }}} */
 
 const VOLUME_PROTECTION = "storage.metalk8s.scality.com/volume-protection"
+
+// Label mirroring `spec.nodeName`, to select the Volumes of a given node.
+const VOLUME_NODE_LABEL = "storage.metalk8s.scality.com/node"
 const JOB_DONE_MARKER = "DONE"
 
 var log = logf.Log.WithName("volume-controller")
@@ -373,6 +377,20 @@ func (self *VolumeReconciler) removeVolumeFinalizer(
 	return self.Client.Update(ctx, volume)
 }
 
+// Set the node label on the volume (overwriting any previous value).
+func (self *VolumeReconciler) addVolumeNodeLabel(
+	ctx context.Context, volume *storagev1alpha1.Volume,
+) error {
+	nodeName := string(volume.Spec.NodeName)
+	labels := volume.GetLabels()
+	if labels == nil {
+		labels = make(map[string]string)
+	}
+	labels[VOLUME_NODE_LABEL] = nodeName
+	volume.SetLabels(labels)
+	return self.Client.Update(ctx, volume)
+}
+
 // Get the PersistentVolume associated to the given volume.
 //
 // Return `nil` if no such volume exists.
@@ -550,6 +568,16 @@ func (self *VolumeReconciler) Reconcile(ctx context.Context, req ctrl.Request) (
 			"invalid volume: %s", err.Error(),
 		)
 	}
+	// Label the volume with its node name, unless it cannot be used as a
+	// label value (consumers fall back on `spec.nodeName` in that case).
+	nodeName := string(volume.Spec.NodeName)
+	if volume.GetLabels()[VOLUME_NODE_LABEL] != nodeName &&
+		len(validation.IsValidLabelValue(nodeName)) == 0 {
+		if err := self.addVolumeNodeLabel(ctx, volume); err != nil {
+			reqLogger.Error(err, "cannot set node label on Volume: requeue")
+			return delayedRequeue(err)
+		}
+	}
 	saltenv, err := self.fetchSaltEnv(ctx, string(volume.Spec.NodeName))
 	if err != nil {
 		reqLogger.Error(err, "cannot compute saltenv")